@@ -21,13 +21,64 @@
 
 from robot.api.deco import library, keyword
 
-import aprslib
+from .lazyimports import timestr_to_secs, lazy_import
+from .acktracker import AckTracker, STATUS_PENDING
+from .clientfilter import ClientFilter
+from .headers import extract_header, HEADER_FIELDS
+from .capture import (
+    CaptureRecorder,
+    CaptureReplayThread,
+    DEFAULT_CAPTURE_MAX_BYTES,
+    DEFAULT_CAPTURE_BACKUP_COUNT,
+)
+from .logconfig import configure_logging, packet_logger
+from .msgno import (
+    MsgNoAllocator,
+    resolve_alphabet,
+    DEFAULT_MSGNO_ALPHABET,
+    DEFAULT_MSGNO_LENGTH,
+)
+from .metrics import (
+    METRICS,
+    MetricsExporterThread,
+    export_metrics,
+    EXPORT_FORMAT_PROMETHEUS,
+)
+from .connection import AprsIsSession, CONNECTION_POOL, DEFAULT_ALIAS
+from .duplicates import DuplicateFilter
+from .stations import (
+    StationIndex,
+    DEFAULT_MAX_STATIONS,
+    DEFAULT_GRID_CELL_SIZE,
+)
+from .dispatcher import PacketDispatcher
+from .bulkparser import (
+    parse_packets_from_file,
+    ParserPool,
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_MAX_ERRORS,
+)
+from .packetcache import ParsedPacketCache, copy_packet
+from .parsing import parse_packet
+from .sender import AprsSenderThread, new_send_report, send_packets
+from .receiver import (
+    AprsIsLineReader,
+    AprsReceiverThread,
+    BoundedPacketQueue,
+    OVERFLOW_DROP_OLDEST,
+    OVERFLOW_BLOCK,
+)
 import re
 import logging
+import queue
+import time
+
+# aprslib and the modules for the local server and the async sessions are
+# only loaded when a keyword needs them
+aprslib = lazy_import("aprslib")
+localserver = lazy_import(f"{__package__}.localserver")
+asyncclient = lazy_import(f"{__package__}.asyncclient")
 
-logging.basicConfig(
-    level=logging.DEBUG, format="%(asctime)s %(module)s -%(levelname)s- %(message)s"
-)
 logger = logging.getLogger(__name__)
 
 __version__ = "0.9.1"
@@ -51,22 +102,87 @@ class AprsLibrary:
     DEFAULT_FILTER = ""
     DEFAULT_APRS_MSGNO = 0
 
+    # Default settings for the (optional) background receiver
+    DEFAULT_RECEIVE_QUEUE_SIZE = 1000
+    DEFAULT_OVERFLOW_POLICY = OVERFLOW_DROP_OLDEST
+
+    # Default number of packets for batch receive operations
+    DEFAULT_MAX_PACKETS = 100
+
+    # Max number of reconnect attempts after a connection loss (0 = unlimited)
+    DEFAULT_MAX_RECONNECT_ATTEMPTS = 0
+
+    # Default number of parsed packets which are kept in the parse cache
+    DEFAULT_PARSE_CACHE_SIZE = 256
+
+    # Max time (in seconds) for writing queued packets when disconnecting
+    SEND_QUEUE_DISCONNECT_TIMEOUT = 5.0
+
+    # Default retry settings for messages with ack tracking
+    DEFAULT_ACK_RETRIES = 3
+    DEFAULT_ACK_RETRY_INTERVAL = "30s"
+    DEFAULT_ACK_BACKOFF = 2.0
+
+    # Default interval for the (optional) statistics file exporter
+    DEFAULT_EXPORT_INTERVAL = "15s"
+
+    # Default settings for the (optional) duplicate suppression
+    DEFAULT_DUPLICATE_TTL = "30s"
+    DEFAULT_DUPLICATE_CACHE_SIZE = 10000
+
+    # Max number of received lines which the APRS-IS broker queues per worker
+    DEFAULT_BROKER_QUEUE_SIZE = 10000
+
+    # Default settings for the (optional) station index
+    DEFAULT_STATION_TTL = "1h"
+
     # Class-internal APRS-IS connection parameters
     __aprsis_server = None
     __aprsis_port = None
     __aprsis_callsign = None
     __aprsis_passcode = None
     __aprsis_filter = None
-    __aprsis_msgno = None
+    __aprsis_failover_servers = None
 
     # A packet which was received through APRS-IS connection
     __aprs_packet = None
 
-    # This is the actual APRS-IS connection object to the server
-    __ais = None
+    # Alias of the APRS-IS connection which is used by default. The actual
+    # connection objects are kept in the (process-wide) connection pool
+    __active_alias = None
+
+    # LRU cache for packets which were parsed by the Get/Check keywords
+    __parse_cache = None
+
+    # Worker processes for 'Parse APRS Packets From File' (started on demand)
+    __parser_pool = None
+
+    # Outgoing messages which are waiting for an ack
+    __ack_tracker = None
+
+    # Optional client-side filter for received packets
+    __client_filter = None
+
+    # Optional cache of recently received packets for suppressing duplicates
+    __duplicate_filter = None
 
-    # This is the maximum numeric message number boundary (numeric 675 = alpha "ZZ")
-    MAX_MSGNO_BOUNDARY = 675
+    # Optional index of the stations which have been heard on the receive path
+    __station_index = None
+
+    # Local APRS-IS stand-in server (only present while it is running)
+    __local_server = None
+
+    # Background thread which exports the statistics to a file
+    __metrics_exporter = None
+
+    # APRS-IS broker which shares our connection with other local processes
+    __broker = None
+
+    # asyncio-based APRS-IS sessions (alias / AsyncAprsIsClient)
+    __async_clients = None
+
+    # Allocator for the message numbers (holds the APRS msgno counter)
+    __msgno_allocator = None
 
     def __init__(
         self,
@@ -76,15 +192,43 @@ class AprsLibrary:
         aprsis_passcode: int = DEFAULT_PASSCODE,
         aprsis_filter: str = DEFAULT_FILTER,
         aprsis_msgno: int = DEFAULT_APRS_MSGNO,
+        parse_cache_size: int = DEFAULT_PARSE_CACHE_SIZE,
+        log_level: str = None,
+        log_sample_rate: int = 1,
+        log_queue: bool = False,
+        log_configure_root: bool = False,
     ):
         self.__aprsis_server = aprsis_server
         self.__aprsis_port = aprsis_port
         self.__aprsis_callsign = aprsis_callsign
         self.__aprsis_passcode = aprsis_passcode
         self.__aprsis_filter = aprsis_filter
-        self.__aprsis_msgno = aprsis_msgno
-        self.__ais = None
+        self.__aprsis_failover_servers = []
         self.__aprs_packet = None
+        self.__active_alias = DEFAULT_ALIAS
+        self.__parse_cache = ParsedPacketCache(maxsize=parse_cache_size)
+        self.__parser_pool = ParserPool()
+        self.__ack_tracker = AckTracker()
+        self.__client_filter = None
+        self.__duplicate_filter = None
+        self.__station_index = None
+        self.__local_server = None
+        self.__metrics_exporter = None
+        self.__broker = None
+        self.__async_clients = {}
+        # msgnos which are still awaiting an ack are never handed out again
+        self.__msgno_allocator = MsgNoAllocator(
+            counter=aprsis_msgno, pending=self.__ack_tracker.pending_msgnos
+        )
+
+        # Logging is left alone unless the library has been asked to change it
+        if log_level or log_sample_rate != 1 or log_queue or log_configure_root:
+            configure_logging(
+                level=log_level,
+                sample_rate=log_sample_rate,
+                use_queue=log_queue,
+                configure_root=log_configure_root,
+            )
 
     # Python "Getter" methods
     #
@@ -113,11 +257,16 @@ class AprsLibrary:
 
     @property
     def aprsis_msgno(self):
-        return self.__aprsis_msgno
+        return self.__msgno_allocator.counter
+
+    @property
+    def aprsis_failover_servers(self):
+        return self.__aprsis_failover_servers
 
     @property
     def ais(self):
-        return self.__ais
+        session = CONNECTION_POOL.get(self.__active_alias)
+        return session.ais if session else None
 
     @property
     def aprs_packet(self):
@@ -167,17 +316,27 @@ class AprsLibrary:
 
     @aprsis_msgno.setter
     def aprsis_msgno(self, aprsis_msgno: int):
-        if not isinstance(aprsis_msgno, int):
-            raise ValueError(
-                "This function only accepts numeric values for the APRS-IS MsgNo"
-            )
-        self.__aprsis_msgno = aprsis_msgno
+        self.__msgno_allocator.set_counter(aprsis_msgno)
+
+    @aprsis_failover_servers.setter
+    def aprsis_failover_servers(self, aprsis_failover_servers: list):
+        servers = []
+        for server in aprsis_failover_servers or []:
+            host, separator, port = str(server).rpartition(":")
+            if not separator or not host or not port.isdigit():
+                raise ValueError(
+                    f"Invalid APRS-IS failover server '{server}'; expected 'host:port'"
+                )
+            servers.append((host, int(port)))
+        self.__aprsis_failover_servers = servers
 
     @ais.setter
     def ais(self, ais: object):
-        # Value can be "None" if we reset the connection. Therefore,
-        # we simply accept the value "as is"
-        self.__ais = ais
+        # Value can be "None" if we reset the connection. In that case, we
+        # simply remove the active connection from the connection pool
+        CONNECTION_POOL.remove(self.__active_alias)
+        if ais:
+            CONNECTION_POOL.add(AprsIsSession(alias=self.__active_alias, ais=ais))
 
     @aprs_packet.setter
     def aprs_packet(self, aprs_packet: object):
@@ -208,13 +367,17 @@ class AprsLibrary:
     def get_aprsis_filter(self):
         return self.aprsis_filter
 
+    @keyword("Get APRS-IS Failover Servers")
+    def get_aprsis_failover_servers(self):
+        return [f"{host}:{port}" for host, port in self.aprsis_failover_servers]
+
     @keyword("Get APRS MsgNo")
     def get_aprsis_msgno(self):
         return self.aprsis_msgno
 
     @keyword("Get APRS MsgNo As Alphanumeric Value")
     def get_aprsis_msgno_alpha(self):
-        return get_alphanumeric_counter_value(self.aprsis_msgno)
+        return self.__msgno_allocator.msgno
 
     #
     # Robot-specific "setter" keywords
@@ -244,6 +407,15 @@ class AprsLibrary:
         logger.debug(msg="Setting custom filter value")
         self.aprsis_filter = aprsis_filter
 
+    @keyword("Set APRS-IS Failover Servers")
+    def set_aprsis_failover_servers(self, aprsis_failover_servers: list = None):
+        logger.debug(msg="Setting custom failover server values")
+        self.aprsis_failover_servers = aprsis_failover_servers
+
+    # The msgno needs to be within the range of the msgno format (default:
+    # 0..675 = AA..ZZ, see 'Configure APRS MsgNo Allocator'). Other values are
+    # rejected; previous versions accepted them and reset the counter to zero
+    # with the next 'Increment APRS MsgNo'
     @keyword("Set APRS MsgNo")
     def set_aprsis_msgno(self, aprsis_msgno: int = None):
         logger.debug(msg="Setting custom APRS msgno value")
@@ -252,29 +424,47 @@ class AprsLibrary:
     @keyword("Increment APRS MsgNo")
     def increment_aprsis_msgno(self):
         logger.debug(msg="Incrementing APRS message number")
-        self.aprsis_msgno = self.aprsis_msgno + 1
-        # The message counter needs to support both old and new formats
-        # old format = 5 digits, numeric 00000...99999
-        # new format = 2 characters, alpha AA...ZZ
-        # ZZ equals 675 which means that we will reset the counter once
-        # that threshold has been reached
-        if self.aprsis_msgno > self.MAX_MSGNO_BOUNDARY:
-            logger.debug(
-                msg=f"MsgNo exceeds max threshold of {self.MAX_MSGNO_BOUNDARY}; resetting value to zero"
-            )
-            self.aprsis_msgno = 0
-        return self.get_aprsis_msgno()
-
-    # This is the APRS library's callback function which will receive
-    # content from APRS-IS. Dependent on the user's selection parameters,
-    # 'received_aprs_packet' is either of type 'dict' (when decoded) or
-    # 'bytes' in case the packet. In any case, it simply sets the value of our
-    # global variable, thus allowing the AprsLibrary class to capture it and
-    # return it to the user
-    # The StopIteration exception causes the library to terminate the consumer
-    def aprscallback(self, received_aprs_packet):
-        self.aprs_packet = received_aprs_packet
-        raise StopIteration
+        # The allocator increments atomically and resets the counter to zero
+        # once its last value (default: 675 = ZZ) has been reached. Message
+        # numbers which are still awaiting an ack are skipped. The returned
+        # value belongs to this allocation, even with concurrent callers
+        return self.__msgno_allocator.increment()
+
+    # Changes the msgno format: 'alphabet' is 'alpha' (A..Z, the default),
+    # 'numeric' (0..9), 'base36' (0..9, A..Z) or a custom set of characters;
+    # 'length' is the number of characters (1..5). 'alpha' with a length of 5
+    # offers ~11.8 million msgnos before the counter wraps. The current counter
+    # is kept if it fits the new format. If 'state_file' is given, the counter
+    # is persisted to that file and picked up again after a restart
+    @keyword("Configure APRS MsgNo Allocator")
+    def configure_msgno_allocator(
+        self,
+        alphabet: str = DEFAULT_MSGNO_ALPHABET,
+        length: int = DEFAULT_MSGNO_LENGTH,
+        state_file: str = None,
+    ):
+        counter = self.__msgno_allocator.counter
+        if counter >= len(resolve_alphabet(alphabet)) ** length:
+            counter = 0
+        self.__msgno_allocator = MsgNoAllocator(
+            alphabet=alphabet,
+            length=length,
+            counter=counter,
+            state_file=state_file,
+            pending=self.__ack_tracker.pending_msgnos,
+        )
+        return self.__msgno_allocator.state()
+
+    # Allocates 'count' msgnos in a single atomic step (e.g. for a batch of
+    # messages which is sent with 'Send APRS Packets') and returns them as
+    # a list. The APRS msgno counter points to the last of them afterwards
+    @keyword("Allocate APRS MsgNos")
+    def allocate_msgnos(self, count: int = 1):
+        return self.__msgno_allocator.allocate(count)
+
+    @keyword("Get APRS MsgNo Allocator State")
+    def get_msgno_allocator_state(self):
+        return self.__msgno_allocator.state()
 
     # aprslib specific keywords
     # Despite the fact that the passcode is numeric, APRS-IS expects a string
@@ -287,21 +477,96 @@ class AprsLibrary:
             return str(aprslib.passcode(aprsis_callsign))
 
     # parse the APRS packet and return its result as a dictionary
+    # The result is taken from the parse cache (if present) and returned
+    # as a copy, meaning that you can modify it without side effects
     @keyword("Parse APRS Packet")
     def parse_aprs_packet(self, aprs_packet: str = None):
+        return copy_packet(self._get_parsed_packet(aprs_packet=aprs_packet))
+
+    # Returns the parsed packet from the parse cache. The returned dictionary
+    # is shared with the cache and must not be modified or returned to the user
+    def _get_parsed_packet(self, aprs_packet):
         if not aprs_packet:
             raise ValueError("No input APRS packet specified")
-        try:
-            packet = aprslib.parse(aprs_packet)
-        except aprslib.ParseError:
-            raise ValueError("This APRS packet is invalid")
-        except aprslib.UnknownFormat:
-            raise ValueError("Unknown APRS format")
-        return packet
+        return self.__parse_cache.get(aprs_packet, parse_function=parse_packet)
+
+    # Parse a (potentially huge) capture file with one raw APRS packet per line.
+    # The file is streamed and parsed by a pool of 'workers' processes (default:
+    # one per CPU); the pool is kept for subsequent calls. Parsed packets are
+    # written to 'output_file' (JSON Lines) if specified. Returns a summary with packet counts per format and a list of
+    # (up to 'max_errors') unparseable lines
+    @keyword("Parse APRS Packets From File")
+    def parse_aprs_packets_from_file(
+        self,
+        input_file: str,
+        output_file: str = None,
+        workers: int = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_errors: int = DEFAULT_MAX_ERRORS,
+    ):
+        if not input_file:
+            raise ValueError("No input file specified")
+        return parse_packets_from_file(
+            input_file=input_file,
+            output_file=output_file,
+            workers=workers,
+            batch_size=batch_size,
+            max_errors=max_errors,
+            pool=self.__parser_pool,
+        )
+
+    # Returns size, max size and hit/miss counters of the parse cache
+    @keyword("Get APRS Parse Cache Statistics")
+    def get_parse_cache_statistics(self):
+        return self.__parse_cache.statistics()
+
+    # Changes the max number of entries in the parse cache. A value of
+    # zero disables the cache
+    @keyword("Set APRS Parse Cache Size")
+    def set_parse_cache_size(self, parse_cache_size: int):
+        logger.debug(msg="Setting custom parse cache size")
+        self.__parse_cache.resize(maxsize=parse_cache_size)
+
+    # Removes all entries from the parse cache and resets its counters
+    @keyword("Clear APRS Parse Cache")
+    def clear_parse_cache(self):
+        self.__parse_cache.clear()
 
     # Build up the connection parameters and create the connection
+    # Every connection has an 'alias'; you can open several connections with
+    # different aliases (e.g. with different filters or servers) and address
+    # them via the 'alias' parameter of the send/receive keywords. The most
+    # recently opened connection becomes the active (default) connection.
+    # If 'reuse' is enabled and a healthy connection with the same alias is
+    # already open (e.g. from a previous suite), that connection is reused.
+    # If 'background_receive' is enabled, a background thread will continuously
+    # read from APRS-IS and store all packets in a bounded queue. Once that queue
+    # is full, the 'overflow_policy' (drop_oldest, drop_newest, block) decides
+    # what happens to new packets. 'Receive APRS Packet' will then take its
+    # packets from that queue rather than from the socket.
+    # If 'background_send' is enabled, 'Send APRS Packet' and 'Send APRS Packets'
+    # only queue their packets; a background thread writes them to APRS-IS.
+    # Use 'Flush APRS Send Queue' for waiting until everything has been sent.
+    # If 'auto_reconnect' is enabled, a lost connection is re-established with
+    # a jittered exponential backoff, failing over to the servers from 'Set
+    # APRS-IS Failover Servers' (after 'max_reconnect_attempts', 0 = unlimited)
+    # With 'use_broker', the connection is made to a running APRS-IS broker
+    # of our own user (see 'Start APRS-IS Broker') rather than to the APRS-IS
+    # server; without a broker, the server is connected directly
     @keyword("Connect to APRS-IS")
-    def connect_aprsis(self):
+    def connect_aprsis(
+        self,
+        background_receive: bool = False,
+        receive_queue_size: int = DEFAULT_RECEIVE_QUEUE_SIZE,
+        overflow_policy: str = DEFAULT_OVERFLOW_POLICY,
+        immortal: bool = True,
+        background_send: bool = False,
+        alias: str = DEFAULT_ALIAS,
+        reuse: bool = False,
+        auto_reconnect: bool = True,
+        max_reconnect_attempts: int = DEFAULT_MAX_RECONNECT_ATTEMPTS,
+        use_broker: bool = False,
+    ):
         # Enforce default passcode if we're dealing with a read-only request
         if self.aprsis_callsign == "N0CALL":
             logger.debug(
@@ -309,44 +574,510 @@ class AprsLibrary:
             )
             self.aprsis_passcode = "-1"
 
-        if self.ais:
+        session = CONNECTION_POOL.get(alias)
+        if session:
+            if reuse and session.is_alive():
+                logger.debug(msg=f"Reusing APRS-IS connection '{alias}'")
+                self.__active_alias = alias
+                return session.ais
             raise ValueError(
                 "An APRS-IS connection is still open; please close it first"
             )
 
-        # Create the connection
-        self.ais = aprslib.IS(
+        # Share the broker's connection if there is one
+        ais = self._attach_to_broker() if use_broker else None
+
+        if ais is None:
+            # Create the connection
+            ais = aprslib.IS(
+                callsign=self.aprsis_callsign,
+                passwd=self.aprsis_passcode,
+                host=self.aprsis_server,
+                port=self.aprsis_port,
+            )
+
+            # Set the filter if the string is not empty
+            if self.aprsis_filter != "":
+                ais.set_filter(self.aprsis_filter)
+
+            # Finally, connect to APRS-IS
+            ais.connect(blocking=True)
+
+            # Are we connected? If not, then properly destroy what we
+            # may have gathered as data and raise an error
+            if not ais._connected:
+                ais.close()
+                raise ConnectionError(
+                    f"Cannot connect to APRS-IS with server {self.aprsis_server} port {self.aprsis_port} callsign {self.aprsis_callsign}"
+                )
+
+        session = AprsIsSession(
+            alias=alias,
+            ais=ais,
+            servers=self.aprsis_failover_servers,
+            auto_reconnect=auto_reconnect,
+            max_reconnect_attempts=max_reconnect_attempts,
+        )
+        reconnect = session.reconnect if auto_reconnect else None
+
+        # Start the background receiver if the user has asked for it
+        if background_receive:
+            packet_queue = BoundedPacketQueue(
+                maxsize=receive_queue_size, overflow_policy=overflow_policy
+            )
+            session.receiver = AprsReceiverThread(
+                ais=ais,
+                packet_queue=packet_queue,
+                immortal=immortal,
+                reconnect=reconnect,
+            )
+            session.receiver.start()
+            logger.debug(msg="Started APRS-IS background receiver")
+
+        # Start the background sender if the user has asked for it
+        if background_send:
+            session.sender = AprsSenderThread(ais=ais, reconnect=reconnect)
+            session.sender.start()
+            logger.debug(msg="Started APRS-IS background sender")
+
+        CONNECTION_POOL.add(session)
+        self.__active_alias = alias
+
+        # Yay - we made it. Return the object to the user.
+        logger.debug(msg=f"Successfully connected to APRS-IS (alias '{alias}')")
+        return ais
+
+    # Close the connection and destroy the AIS object. Without an alias,
+    # the active connection is closed
+    @keyword("Disconnect from APRS-IS")
+    def disconnect_aprsis(self, alias: str = None):
+        session = CONNECTION_POOL.remove(alias or self.__active_alias)
+        if session:
+            session.close(send_timeout=self.SEND_QUEUE_DISCONNECT_TIMEOUT)
+
+    # Close all APRS-IS connections in the connection pool
+    @keyword("Disconnect All APRS-IS Connections")
+    def disconnect_all_aprsis(self):
+        for alias in CONNECTION_POOL.aliases():
+            self.disconnect_aprsis(alias=alias)
+
+    # Returns an aprslib.IS object which is connected to the APRS-IS broker
+    # or 'None' if no broker is running. Sockets which are not ours (e.g. of
+    # another user on a shared host) are ignored. Our login (callsign, passcode and
+    # filter) is sent to the broker, which applies the filter for us
+    def _attach_to_broker(self):
+        # Imported here rather than lazily at module level; the broker
+        # module is also run as a script ('python -m AprsLibrary.broker')
+        from . import broker
+
+        socket_path = broker.default_broker_socket()
+        if not broker.broker_available(socket_path):
+            return None
+        ais = broker.BrokerIS(
             callsign=self.aprsis_callsign,
             passwd=self.aprsis_passcode,
+            host=socket_path,
+            port=0,
+        )
+        if self.aprsis_filter != "":
+            ais.set_filter(self.aprsis_filter)
+        try:
+            ais.connect(blocking=False)
+        except (aprslib.ConnectionError, aprslib.LoginError) as exp:
+            # e.g. a socket file which a crashed broker has left behind
+            ais.close()
+            logger.debug(
+                msg=f"Cannot attach to APRS-IS broker '{socket_path}' ({exp}); connecting directly"
+            )
+            return None
+        logger.debug(msg=f"Attached to APRS-IS broker '{socket_path}'")
+        return ais
+
+    # Share one APRS-IS connection with all processes of this machine (e.g.
+    # the pabot workers): the broker connects to APRS-IS with the current
+    # server, port, callsign, passcode, filter and failover settings and
+    # listens on a Unix domain socket. 'Connect to APRS-IS' with 'use_broker'
+    # attaches to the running broker. Only processes of our own user may
+    # attach. Every worker keeps its own filter (budlist,
+    # prefix, group message and type filters are applied by the broker) and
+    # its own queue of up to 'worker_queue_size' lines; a worker which does not
+    # keep up loses its oldest lines. Packets from the workers are sent upstream
+    # through the broker's connection. The socket path defaults to the
+    # APRSLIB_BROKER_SOCKET environment variable or a file in a per-user
+    # directory ($XDG_RUNTIME_DIR or a 0700 directory in the temp directory);
+    # the workers have to use the same path. Returns the path
+    @keyword("Start APRS-IS Broker")
+    def start_broker(
+        self,
+        socket_path: str = None,
+        worker_queue_size: int = DEFAULT_BROKER_QUEUE_SIZE,
+    ):
+        if self.__broker and self.__broker.running:
+            raise ValueError("APRS-IS broker is already running")
+        from . import broker
+
+        # Enforce default passcode if we're dealing with a read-only request
+        if self.aprsis_callsign == "N0CALL":
+            self.aprsis_passcode = "-1"
+        self.__broker = broker.AprsIsBroker(
+            callsign=self.aprsis_callsign,
+            passcode=self.aprsis_passcode,
             host=self.aprsis_server,
             port=self.aprsis_port,
+            aprsis_filter=self.aprsis_filter,
+            socket_path=socket_path,
+            worker_queue_size=worker_queue_size,
+            servers=self.aprsis_failover_servers,
+        )
+        return self.__broker.start()
+
+    # Stops the broker; the connections of the attached workers are dropped
+    @keyword("Stop APRS-IS Broker")
+    def stop_broker(self):
+        if self.__broker:
+            self.__broker.stop()
+            self.__broker = None
+
+    # Returns the broker's upstream state plus the number of workers, logins
+    # and dropped packets; 'per_worker' lists the queue size and the number of
+    # delivered, dropped and forwarded (upstream) packets per worker
+    @keyword("Get APRS-IS Broker Statistics")
+    def get_broker_statistics(self):
+        if not self.__broker or not self.__broker.running:
+            raise ValueError("APRS-IS broker is not running")
+        return self.__broker.statistics()
+
+    # Make another open connection the active (default) connection.
+    # Returns the alias of the previously active connection
+    @keyword("Switch APRS-IS Connection")
+    def switch_aprsis_connection(self, alias: str):
+        if alias not in CONNECTION_POOL:
+            raise ValueError(f"No APRS-IS connection with alias '{alias}'")
+        previous_alias = self.__active_alias
+        self.__active_alias = alias
+        return previous_alias
+
+    # Returns the aliases of all open connections
+    @keyword("Get APRS-IS Connection Aliases")
+    def get_aprsis_connection_aliases(self):
+        return CONNECTION_POOL.aliases()
+
+    # Checks whether a connection is still alive and returns a dictionary
+    # with its state (server, peer, age, background thread states, ...)
+    @keyword("Check APRS-IS Connection Health")
+    def check_aprsis_connection_health(self, alias: str = None):
+        return self._get_session(alias=alias).health()
+
+    # Returns the number of reconnects, failed reconnect attempts, the
+    # accumulated downtime (seconds) and the uptime since the last (re)connect
+    @keyword("Get APRS-IS Connection Statistics")
+    def get_aprsis_connection_statistics(self, alias: str = None):
+        return self._get_session(alias=alias).statistics()
+
+    # Returns the session for the given alias (or the active session)
+    def _get_session(self, alias: str = None):
+        alias = alias or self.__active_alias
+        session = CONNECTION_POOL.get(alias)
+        if not session:
+            raise ConnectionError(f"Not connected to APRS-IS (connection '{alias}')")
+        return session
+
+    # Changes the library's logging at runtime (see the library's import
+    # parameters). 'log_level' applies to the library's and aprslib's loggers;
+    # with 'log_sample_rate' set to n, only every n-th per-packet debug message
+    # is logged. 'log_queue' moves the formatting and writing of log messages
+    # to a background thread. The root logger is only configured (with a
+    # stream handler) if 'log_configure_root' is set
+    @keyword("Configure APRS Logging")
+    def configure_aprs_logging(
+        self,
+        log_level: str = None,
+        log_sample_rate: int = 1,
+        log_queue: bool = False,
+        log_configure_root: bool = False,
+    ):
+        configure_logging(
+            level=log_level,
+            sample_rate=log_sample_rate,
+            use_queue=log_queue,
+            configure_root=log_configure_root,
         )
 
-        # Set the filter if the string is not empty
-        if self.aprsis_filter != "":
-            self.ais.set_filter(self.aprsis_filter)
+    # Returns the library's statistics: counters (received/sent packets and
+    # bytes, parse failures by type, reconnects, ...), gauges (queue depths per
+    # connection) and latency histograms (parse time, socket write time). The
+    # statistics are collected for all library instances of the current process
+    @keyword("Get APRS Statistics")
+    def get_aprs_statistics(self):
+        return METRICS.snapshot()
+
+    # Resets all counters and histograms
+    @keyword("Reset APRS Statistics")
+    def reset_aprs_statistics(self):
+        METRICS.reset()
+
+    # Write the current statistics to 'output_file', either in the Prometheus
+    # text format (e.g. for node_exporter's textfile collector) or as JSON
+    @keyword("Export APRS Statistics")
+    def export_aprs_statistics(
+        self, output_file: str, file_format: str = EXPORT_FORMAT_PROMETHEUS
+    ):
+        export_metrics(METRICS, output_file=output_file, file_format=file_format)
 
-        # Finally, connect to APRS-IS
-        self.ais.connect(blocking=True)
+    # Export the statistics to 'output_file' every 'interval' (Robot time
+    # string) in the background until 'Stop APRS Statistics Exporter' is called
+    @keyword("Start APRS Statistics Exporter")
+    def start_aprs_statistics_exporter(
+        self,
+        output_file: str,
+        file_format: str = EXPORT_FORMAT_PROMETHEUS,
+        interval: str = DEFAULT_EXPORT_INTERVAL,
+    ):
+        if self.__metrics_exporter:
+            raise ValueError("APRS statistics exporter is already running")
+        exporter = MetricsExporterThread(
+            metrics=METRICS,
+            output_file=output_file,
+            file_format=file_format,
+            interval=timestr_to_secs(interval),
+        )
+        exporter.start()
+        self.__metrics_exporter = exporter
+
+    # Stop the statistics exporter; the statistics are exported one last time
+    @keyword("Stop APRS Statistics Exporter")
+    def stop_aprs_statistics_exporter(self):
+        if self.__metrics_exporter:
+            self.__metrics_exporter.stop()
+            self.__metrics_exporter = None
+
+    # Record every packet which is received on the APRS-IS connection to
+    # 'output_file', prefixed with its (monotonic) receive time. The file is
+    # rotated after 'max_bytes' (uncompressed) bytes; 'backup_count' rotated
+    # files are kept. If 'compress' is set, the capture is gzip-compressed.
+    # The packets are written by a background thread
+    @keyword("Start APRS Capture Recording")
+    def start_capture_recording(
+        self,
+        output_file: str,
+        max_bytes: int = DEFAULT_CAPTURE_MAX_BYTES,
+        backup_count: int = DEFAULT_CAPTURE_BACKUP_COUNT,
+        compress: bool = False,
+        alias: str = None,
+    ):
+        session = self._get_session(alias=alias)
+        if session.recorder:
+            raise ValueError("APRS capture recording is already active")
+        recorder = CaptureRecorder(
+            output_file=output_file,
+            max_bytes=max_bytes,
+            backup_count=backup_count,
+            compress=compress,
+        )
+        recorder.start()
+        session.set_recorder(recorder)
+        logger.debug(msg=f"Recording received packets to '{output_file}'")
+
+    # Stop the capture recording; all buffered packets are written to the
+    # capture file. Returns the number of recorded packets/bytes and rotations
+    @keyword("Stop APRS Capture Recording")
+    def stop_capture_recording(self, alias: str = None):
+        session = self._get_session(alias=alias)
+        recorder = session.recorder
+        if not recorder:
+            raise ValueError("APRS capture recording is not active")
+        session.set_recorder(None)
+        recorder.stop()
+        return recorder.statistics()
+
+    # Replay a capture file instead of connecting to APRS-IS. The receive
+    # keywords deliver the captured packets with their original timing
+    # ('speed' 1.0; e.g. 10.0 is ten times faster, 0 is as fast as possible);
+    # no network connection is made. Once the capture has been consumed,
+    # the receive keywords return immediately, just like after a timeout
+    @keyword("Connect to APRS Capture Replay")
+    def connect_capture_replay(
+        self,
+        input_file: str,
+        speed: float = 1.0,
+        receive_queue_size: int = DEFAULT_RECEIVE_QUEUE_SIZE,
+        alias: str = DEFAULT_ALIAS,
+    ):
+        if CONNECTION_POOL.get(alias):
+            raise ValueError(
+                "An APRS-IS connection is still open; please close it first"
+            )
 
-        # Are we connected? If not, then properly destroy what we
-        # may have gathered as data and raise an error
-        if not self.ais._connected:
-            self.disconnect_aprsis(self)
-            raise ConnectionError(
-                f"Cannot connect to APRS-IS with server {self.aprsis_server} port {self.aprsis_port} callsign {self.aprsis_callsign}"
+        # The aprslib object never connects; sending packets will fail
+        ais = aprslib.IS(
+            callsign=self.aprsis_callsign,
+            passwd=self.aprsis_passcode,
+            host=input_file,
+            port=0,
+        )
+        session = AprsIsSession(alias=alias, ais=ais, auto_reconnect=False)
+        packet_queue = BoundedPacketQueue(
+            maxsize=receive_queue_size, overflow_policy=OVERFLOW_BLOCK
+        )
+        session.receiver = CaptureReplayThread(
+            input_file=input_file, packet_queue=packet_queue, speed=speed
+        )
+        session.receiver.start()
+
+        CONNECTION_POOL.add(session)
+        self.__active_alias = alias
+        logger.debug(msg=f"Replaying capture file '{input_file}' (alias '{alias}')")
+
+    # Open 'count' asyncio-based APRS-IS sessions with the library's server,
+    # port, callsign, passcode and filter settings. All async sessions share
+    # a single event loop thread, meaning that hundreds of sessions do not
+    # need hundreds of threads. The sessions are connected concurrently and
+    # named '<alias_prefix>-0', '<alias_prefix>-1', ...; returns their aliases
+    @keyword("Open Async APRS-IS Sessions")
+    def open_async_sessions(self, count: int = 1, alias_prefix: str = "async"):
+        if count < 1:
+            raise ValueError("count needs to be a positive integer")
+        aliases = [f"{alias_prefix}-{index}" for index in range(count)]
+        for alias in aliases:
+            if alias in self.__async_clients:
+                raise ValueError(f"Async APRS-IS session '{alias}' is still open")
+
+        clients = [
+            asyncclient.AsyncAprsIsClient(
+                callsign=self.aprsis_callsign,
+                passcode=self.aprsis_passcode,
+                host=self.aprsis_server,
+                port=self.aprsis_port,
+                aprsis_filter=self.aprsis_filter,
+            )
+            for _ in aliases
+        ]
+        try:
+            asyncclient.EVENT_LOOP.run(
+                asyncclient.run_concurrently([client.connect() for client in clients])
             )
+        except ConnectionError:
+            asyncclient.EVENT_LOOP.run(
+                asyncclient.run_concurrently([client.close() for client in clients])
+            )
+            raise
+        self.__async_clients.update(zip(aliases, clients))
+        logger.debug(msg=f"Opened {count} async APRS-IS sessions")
+        return aliases
+
+    # Send a list of packets through an async session - or, without an alias,
+    # through all async sessions concurrently. Returns the total number of
+    # packets, bytes and socket writes
+    @keyword("Send Async APRS Packets")
+    def send_async_packets(self, packets: list, alias: str = None):
+        clients = self._get_async_clients(alias=alias)
+        reports = asyncclient.EVENT_LOOP.run(
+            asyncclient.run_concurrently(
+                [client.send_packets(packets) for client in clients]
+            )
+        )
+        return {
+            field: sum(report[field] for report in reports)
+            for field in ("packets", "bytes", "writes")
+        }
 
-        # Yay - we made it. Return the object to the user.
-        logger.debug(msg="Successfully connected to APRS-IS")
-        return self.ais
+    # Receive up to 'max_packets' packets through an async session before the
+    # 'timeout' (Robot time string) has been reached
+    @keyword("Receive Async APRS Packets")
+    def receive_async_packets(
+        self,
+        alias: str,
+        max_packets: int = DEFAULT_MAX_PACKETS,
+        timeout: str = None,
+        raw: bool = False,
+    ):
+        client = self._get_async_clients(alias=alias)[0]
+        if timeout is not None:
+            timeout = timestr_to_secs(timeout)
+        return asyncclient.EVENT_LOOP.run(
+            client.receive_packets(max_packets=max_packets, timeout=timeout, raw=raw)
+        )
 
-    # Close the connection and destroy the AIS object
-    @keyword("Disconnect from APRS-IS")
-    def disconnect_aprsis(self):
-        if self.ais:
-            self.ais.close()
-            self.ais = None
+    # Close an async session - or, without an alias, all of them
+    @keyword("Close Async APRS-IS Sessions")
+    def close_async_sessions(self, alias: str = None):
+        aliases = [alias] if alias else list(self.__async_clients)
+        clients = [self.__async_clients.pop(alias, None) for alias in aliases]
+        clients = [client for client in clients if client]
+        if clients:
+            asyncclient.EVENT_LOOP.run(
+                asyncclient.run_concurrently([client.close() for client in clients])
+            )
+
+    # Returns the aliases of all open async sessions
+    @keyword("Get Async APRS-IS Sessions")
+    def get_async_sessions(self):
+        return list(self.__async_clients)
+
+    def _get_async_clients(self, alias: str = None):
+        if alias is None:
+            clients = list(self.__async_clients.values())
+            if not clients:
+                raise ConnectionError("No async APRS-IS sessions are open")
+            return clients
+        client = self.__async_clients.get(alias)
+        if not client:
+            raise ConnectionError(f"Async APRS-IS session '{alias}' is not open")
+        return [client]
+
+    # Start a local APRS-IS stand-in server for offline (load) tests. The server
+    # speaks the APRS-IS login handshake, honors basic server filters (b/, p/,
+    # g/ and t/), replays 'capture_file' (one raw packet per line) to every
+    # client after its login - with 'rate' packets per second or as fast as
+    # possible - and echoes packets from verified clients to all other clients
+    # (if 'echo' is enabled; like APRS-IS, a sender never gets its own packet
+    # back). Captures from 'Start APRS Capture Recording' are
+    # replayed with their original timing if 'speed' is set (2.0 = twice as
+    # fast). Returns the TCP port that the server listens on; use it with
+    # 'Set APRS-IS Server' (127.0.0.1) and 'Set APRS-IS Port'
+    @keyword("Start Local APRS-IS Server")
+    def start_local_aprsis_server(
+        self,
+        port: int = 0,
+        capture_file: str = None,
+        rate: float = None,
+        echo: bool = True,
+        speed: float = None,
+    ):
+        if self.__local_server:
+            raise ValueError("Local APRS-IS server is already running")
+        server = localserver.LocalAprsIsServer(
+            port=port, capture_file=capture_file, rate=rate, echo=echo, speed=speed
+        )
+        port = server.start()
+        self.__local_server = server
+        return port
+
+    # Stop the local APRS-IS stand-in server and disconnect all of its clients
+    @keyword("Stop Local APRS-IS Server")
+    def stop_local_aprsis_server(self):
+        if self.__local_server:
+            self.__local_server.stop()
+            self.__local_server = None
+
+    # Returns the local server's port and its connection/login/packet counters
+    @keyword("Get Local APRS-IS Server Statistics")
+    def get_local_aprsis_server_statistics(self):
+        return self._get_local_server().statistics()
+
+    # Returns the (raw) packets that the local server has received from its
+    # clients, e.g. for checking what a test has sent
+    @keyword("Get Packets Received By Local APRS-IS Server")
+    def get_local_aprsis_server_packets(self):
+        return [
+            packet.decode("utf-8", errors="replace")
+            for packet in self._get_local_server().received
+        ]
+
+    def _get_local_server(self):
+        if not self.__local_server:
+            raise ValueError("Local APRS-IS server is not running")
+        return self.__local_server
 
     # Get a (complete) copy of the current configuration.
     # A value of ais different to 'None' indicates that a connection
@@ -360,44 +1091,693 @@ class AprsLibrary:
             "passcode": self.aprsis_passcode,
             "filter": self.aprsis_filter,
             "ais": self.ais,
+            "alias": self.__active_alias,
         }
         return myvalues
 
     # Send an APRS-packet to APRS-IS. There is no sanity check
     # on the data provided to this function - everything
-    # is sent 'as is'
+    # is sent 'as is'. A send rate which has been set for the
+    # connection (see 'Send APRS Packets') applies to this keyword, too
     @keyword("Send APRS Packet")
-    def send_aprs_packet(self, packet: str):
+    def send_aprs_packet(self, packet: str, alias: str = None):
         # Are we connected?
-        if not self.ais:
-            raise ConnectionError("Not connected to APRS-IS; cannot send packet")
+        session = self._get_session(alias=alias)
+
+        # Background sender active? Then simply queue the packet
+        if session.sender:
+            packet_logger.debug("Queueing message '%s' for APRS-IS", packet)
+            session.sender.enqueue(packets=[packet], bucket=session.send_limiter)
+            return
 
         # We seem to be connected
-        logger.debug(msg=f"Sending message '{packet}' to APRS-IS")
+        packet_logger.debug("Sending message '%s' to APRS-IS", packet)
+
+        # Stay within the connection's send rate
+        if session.send_limiter:
+            session.send_limiter.take(1)
 
-        # Try to send data to the socket
+        # Try to send data to the socket. If that fails, reconnect (if enabled)
+        # and try once more
+        send_start = time.perf_counter()
         try:
-            self.ais.sendall(packet)
+            self._send_with_reconnect(session, session.ais.sendall, packet)
         except:
             raise ConnectionError(f"Error while sending message '{packet}' to APRS-IS")
+        METRICS.observe("aprs_send_write_seconds", time.perf_counter() - send_start)
+        METRICS.inc("aprs_sent_packets_total")
+        METRICS.inc("aprs_sent_bytes_total", len(packet.encode("utf-8")) + 2)
+
+    # Send a list of APRS packets to APRS-IS. The packets are coalesced into
+    # as few socket writes as possible. If 'rate' (packets per second) is
+    # specified, the connection's token bucket limits the send rate; 'burst'
+    # is the max number of packets which can be sent at once. That limit
+    # applies to all later 'Send APRS Packet(s)' calls for this connection
+    # (including queued packets) until another rate is set. Returns a
+    # dictionary with the number of packets, bytes and socket writes plus
+    # the time spent
+    @keyword("Send APRS Packets")
+    def send_aprs_packets(
+        self, packets: list, rate: float = None, burst: int = 1, alias: str = None
+    ):
+        # Are we connected?
+        session = self._get_session(alias=alias)
+
+        # The rate limit belongs to the connection, meaning that it also
+        # covers consecutive keyword calls and queued packets
+        if rate:
+            session.set_send_rate(rate=rate, burst=burst)
+
+        # Background sender active? Then simply queue the packets
+        if session.sender:
+            logger.debug(msg=f"Queueing {len(packets)} packets for APRS-IS")
+            session.sender.enqueue(packets=packets, bucket=session.send_limiter)
+            return {"packets": len(packets), "bytes": 0, "writes": 0, "seconds": 0.0}
+
+        logger.debug(msg=f"Sending {len(packets)} packets to APRS-IS")
+
+        # After a reconnect, send_packets resumes with the first packet that
+        # has not been written before the connection failed
+        try:
+            return self._send_with_reconnect(
+                session,
+                send_packets,
+                ais=session.ais,
+                packets=packets,
+                bucket=session.send_limiter,
+                report=new_send_report(),
+            )
+        except (ValueError, TypeError):
+            raise
+        except:
+            raise ConnectionError("Error while sending packets to APRS-IS")
 
+    # Calls a send function. If it fails and the session is supposed to
+    # reconnect automatically, we reconnect and call it once more
+    def _send_with_reconnect(self, session: AprsIsSession, function, *args, **kwargs):
+        try:
+            return function(*args, **kwargs)
+        except (ValueError, TypeError):
+            raise
+        except Exception as exp:
+            if not session.auto_reconnect:
+                raise
+            logger.debug(msg=f"Error while sending to APRS-IS ({exp}); reconnecting")
+            session.reconnect()
+            return function(*args, **kwargs)
+
+    # Wait until the background sender has written all queued packets. Raises
+    # an error if the queue could not be flushed within 'timeout' (Robot time
+    # string) or if any errors occurred while writing to APRS-IS
+    @keyword("Flush APRS Send Queue")
+    def flush_send_queue(self, timeout: str = None, alias: str = None):
+        sender = self._get_session(alias=alias).sender
+        if not sender:
+            raise ValueError("APRS-IS background sender is not active")
+
+        if timeout is not None:
+            timeout = timestr_to_secs(timeout)
+
+        flushed = sender.flush(timeout=timeout)
+        errors = sender.take_errors()
+        if errors:
+            raise ConnectionError(
+                f"Error while sending packets to APRS-IS: {'; '.join(str(error) for error in errors)}"
+            )
+        if not flushed:
+            raise TimeoutError(
+                f"APRS-IS send queue still contains {sender.pending} packets"
+            )
+
+    # Receive a packet from APRS-IS. By default, this keyword waits until a
+    # packet has been received. If a 'timeout' (Robot time string, e.g. '30s')
+    # is specified, the keyword will return 'None' if no packet has been
+    # received within that time frame.
+    # If 'max_packets' is specified, the keyword returns a list with up to
+    # 'max_packets' packets which have been received before the timeout
+    # (which can also be an empty list)
     @keyword("Receive APRS Packet")
-    def receive_aprs_packet(self, immortal: bool = True, raw: bool = False):
+    def receive_aprs_packet(
+        self,
+        immortal: bool = True,
+        raw: bool = False,
+        timeout: str = None,
+        max_packets: int = None,
+        alias: str = None,
+    ):
+        # Are we connected?
+        session = self._get_session(alias=alias)
+
+        if timeout is not None:
+            timeout = timestr_to_secs(timeout)
+
+        if max_packets is not None:
+            return self._receive_packets(
+                session=session,
+                max_packets=max_packets,
+                timeout=timeout,
+                immortal=immortal,
+                raw=raw,
+            )
+
+        packets = self._receive_packets(
+            session=session, max_packets=1, timeout=timeout, immortal=immortal, raw=raw
+        )
+        return packets[0] if packets else None
+
+    # Receive a batch of packets from APRS-IS in one call and return them as
+    # a list. The keyword returns as soon as 'max_packets' packets have been
+    # collected or the 'timeout' (Robot time string) has been reached. With a
+    # timeout of zero, the keyword only drains what has already been received.
+    @keyword("Receive APRS Packets")
+    def receive_aprs_packets(
+        self,
+        max_packets: int = DEFAULT_MAX_PACKETS,
+        timeout: str = None,
+        immortal: bool = True,
+        raw: bool = False,
+        alias: str = None,
+    ):
+        # Are we connected?
+        session = self._get_session(alias=alias)
+
+        if timeout is not None:
+            timeout = timestr_to_secs(timeout)
+
+        return self._receive_packets(
+            session=session,
+            max_packets=max_packets,
+            timeout=timeout,
+            immortal=immortal,
+            raw=raw,
+        )
+
+    # Collects up to 'max_packets' packets from APRS-IS or until 'timeout'
+    # (seconds) has been reached. Packets which cannot be decoded are skipped
+    # - which is the same behavior that aprslib's consumer offers for
+    # non-raw packets
+    def _receive_packets(
+        self,
+        session: AprsIsSession,
+        max_packets: int,
+        timeout: float = None,
+        immortal: bool = True,
+        raw: bool = False,
+    ):
+        if max_packets < 1:
+            raise ValueError("max_packets needs to be a positive integer")
+
+        packets = []
+        stream = self._packet_stream(
+            session=session, timeout=timeout, immortal=immortal, raw=raw
+        )
+        try:
+            for packet in stream:
+                packets.append(packet)
+                if len(packets) >= max_packets:
+                    break
+        finally:
+            stream.close()
+        return packets
+
+    # Generator for received packets which have passed the duplicate and
+    # client filters; terminates once 'timeout' (seconds) has been reached.
+    # All packets (decoded or raw) are also handed to the ack tracker. With
+    # 'deliver' disabled, the caller decides which packets count as delivered
+    # (and become the current 'aprs_packet')
+    def _packet_stream(
+        self,
+        session: AprsIsSession,
+        timeout: float = None,
+        immortal: bool = True,
+        raw: bool = False,
+        deliver: bool = True,
+    ):
+        client_filter = self.__client_filter
+        duplicate_filter = self.__duplicate_filter
+        station_index = self.__station_index
+        # Raw packets only need to be parsed for an exact format check
+        # or for the station index
+        parse_raw = (
+            bool(client_filter and client_filter.formats) or station_index is not None
+        )
+
+        stream = self._raw_packet_stream(
+            session=session, timeout=timeout, immortal=immortal
+        )
+        try:
+            for raw_packet in stream:
+                # Copies of the same packet (received via other igates/digis)
+                if duplicate_filter and duplicate_filter.is_duplicate(raw_packet):
+                    METRICS.inc("aprs_suppressed_duplicates_total")
+                    continue
+                # Discard what the client filter does not want before parsing
+                if client_filter and not client_filter.prescreen(raw_packet):
+                    METRICS.inc("aprs_filtered_packets_total")
+                    continue
+                if raw and not parse_raw:
+                    # The ack tracker only parses the acks it is waiting for
+                    self.__ack_tracker.process_raw_packet(raw_packet)
+                    packet = raw_packet
+                else:
+                    parse_start = time.perf_counter()
+                    try:
+                        packet = aprslib.parse(raw_packet)
+                    except (aprslib.ParseError, aprslib.UnknownFormat) as exp:
+                        packet_logger.debug(
+                            "Skipping undecodable packet %s", raw_packet
+                        )
+                        METRICS.inc(
+                            "aprs_parse_failures_total",
+                            labels=f'type="{type(exp).__name__}"',
+                        )
+                        continue
+                    METRICS.observe(
+                        "aprs_parse_seconds", time.perf_counter() - parse_start
+                    )
+                    self.__ack_tracker.process_packet(packet)
+                    if station_index is not None:
+                        station_index.update(packet)
+                    if client_filter and not client_filter.accept(packet):
+                        METRICS.inc("aprs_filtered_packets_total")
+                        continue
+                    if raw:
+                        packet = raw_packet
+                if deliver:
+                    self.aprs_packet = packet
+                    METRICS.inc("aprs_delivered_packets_total")
+                yield packet
+        finally:
+            stream.close()
+
+    # Generator for raw packets from APRS-IS which terminates once 'timeout'
+    # (seconds; 'None' = wait forever) has been reached. Packets are either
+    # taken from the background receiver's queue or read from the socket.
+    def _raw_packet_stream(
+        self, session: AprsIsSession, timeout: float = None, immortal: bool = True
+    ):
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        # Deliver packets which were read earlier but have not been consumed
+        while session.pushback:
+            yield session.pushback.popleft()
+
+        # Background receiver active? Then get our packets from its queue
+        receiver = session.receiver
+        if receiver:
+            while True:
+                remaining = None
+                if deadline is not None:
+                    remaining = max(deadline - time.monotonic(), 0)
+                try:
+                    yield receiver.packet_queue.get(timeout=remaining)
+                except queue.Empty:
+                    # A replayed capture ends like a receive timeout
+                    if isinstance(receiver.error, EOFError):
+                        return
+                    if receiver.packet_queue.closed:
+                        raise ConnectionError(
+                            f"APRS-IS background receiver has terminated: {receiver.error}"
+                        )
+                    return
+
+        # Otherwise, read directly from the socket
+        ais = session.ais
+        reader = AprsIsLineReader(ais, recorder=session.recorder)
+        while True:
+            remaining = None
+            if deadline is not None:
+                remaining = max(deadline - time.monotonic(), 0)
+            try:
+                yield from reader.read_lines(timeout=remaining)
+                return
+            except (aprslib.ConnectionDrop, aprslib.ConnectionError) as exp:
+                if not immortal or not session.auto_reconnect:
+                    ais.close()
+                    raise ConnectionError(f"Lost connection to APRS-IS: {exp}")
+                logger.debug(msg=f"Lost APRS-IS connection ({exp}); reconnecting")
+                session.reconnect()
+
+    # Only deliver received packets which match the given criteria to the
+    # receive keywords. Unlike the APRS-IS server filter, this filter is
+    # applied locally: 'sources' and 'addressees' are lists of callsigns
+    # (a trailing '*' matches a prefix), 'addressee_pattern' and 'pattern'
+    # are regular expressions for the addressee (case-insensitive) / the raw
+    # packet and 'formats' is a list of aprslib formats (e.g. 'message', 'mic-e').
+    # All criteria need to match. Packets are pre-screened on their raw
+    # bytes, meaning that discarded packets are never parsed
+    @keyword("Set APRS Client Filter")
+    def set_client_filter(
+        self,
+        sources: list = None,
+        addressees: list = None,
+        addressee_pattern: str = None,
+        formats: list = None,
+        pattern: str = None,
+    ):
+        logger.debug(msg="Setting client-side packet filter")
+        self.__client_filter = ClientFilter(
+            sources=sources,
+            addressees=addressees,
+            addressee_pattern=addressee_pattern,
+            formats=formats,
+            pattern=pattern,
+        )
+
+    # Removes the client-side filter; all received packets are delivered again
+    @keyword("Clear APRS Client Filter")
+    def clear_client_filter(self):
+        self.__client_filter = None
+
+    # Returns the number of packets which were checked by the client-side
+    # filter and the number of packets which it has discarded before and
+    # after parsing
+    @keyword("Get APRS Client Filter Statistics")
+    def get_client_filter_statistics(self):
+        if not self.__client_filter:
+            raise ValueError("No APRS client filter has been set")
+        return self.__client_filter.statistics()
+
+    # Suppress duplicate packets on the receive path. APRS-IS delivers the
+    # same packet several times via different igates/paths; a packet is a
+    # duplicate if a packet with the same source and payload (the path is
+    # ignored) has been received within 'ttl' (Robot time string). At most
+    # 'max_entries' packets are remembered
+    @keyword("Enable APRS Duplicate Suppression")
+    def enable_duplicate_suppression(
+        self,
+        ttl: str = DEFAULT_DUPLICATE_TTL,
+        max_entries: int = DEFAULT_DUPLICATE_CACHE_SIZE,
+    ):
+        logger.debug(msg="Enabling duplicate packet suppression")
+        self.__duplicate_filter = DuplicateFilter(
+            ttl=timestr_to_secs(ttl), maxsize=max_entries
+        )
+
+    # Deliver all received packets again, including duplicates
+    @keyword("Disable APRS Duplicate Suppression")
+    def disable_duplicate_suppression(self):
+        self.__duplicate_filter = None
+
+    # Returns the number of remembered packets, the number of checked and
+    # suppressed packets and the number of entries which had to be evicted
+    # before their TTL had expired
+    @keyword("Get APRS Duplicate Suppression Statistics")
+    def get_duplicate_suppression_statistics(self):
+        if not self.__duplicate_filter:
+            raise ValueError("APRS duplicate suppression is not enabled")
+        return self.__duplicate_filter.statistics()
+
+    # Keep track of the stations which are heard on the receive path: for
+    # every station (objects are indexed by their object name), the index
+    # holds its last packet, position, status and the time when it has been
+    # heard last. Stations which have not been heard for 'ttl' (Robot time
+    # string) are removed; at most 'max_stations' stations are kept. The
+    # positions are kept in a grid of 'cell_size' degree cells for the
+    # radius / bounding box queries. Enabling the index again clears it
+    @keyword("Enable APRS Station Index")
+    def enable_station_index(
+        self,
+        ttl: str = DEFAULT_STATION_TTL,
+        max_stations: int = DEFAULT_MAX_STATIONS,
+        cell_size: float = DEFAULT_GRID_CELL_SIZE,
+    ):
+        logger.debug(msg="Enabling station index")
+        self.__station_index = StationIndex(
+            ttl=timestr_to_secs(ttl), max_stations=max_stations, cell_size=cell_size
+        )
+
+    @keyword("Disable APRS Station Index")
+    def disable_station_index(self):
+        self.__station_index = None
+
+    # Returns the last packet which has been received from a station (decoded
+    # or - with 'raw' - as raw packet) or 'None' if the station has not been
+    # heard within the index's TTL
+    @keyword("Get Last Packet From Station")
+    def get_last_packet_from_station(self, callsign: str, raw: bool = False):
+        record = self._get_station_index().get(callsign)
+        if record is None or record.raw is None:
+            return None
+        if raw:
+            return record.raw
+        return self.parse_aprs_packet(aprs_packet=record.raw)
+
+    # Returns the state of a station (last position, status, last heard time
+    # (epoch seconds), number of packets, ...) or 'None' if it is unknown
+    @keyword("Get APRS Station State")
+    def get_station_state(self, callsign: str):
+        record = self._get_station_index().get(callsign)
+        return record.as_dict() if record else None
+
+    # Returns the states of all stations whose last position is within
+    # 'radius' km of the given position, nearest first. Every state
+    # contains the station's distance ('distance_km')
+    @keyword("Get Stations Within Radius")
+    def get_stations_within_radius(
+        self, latitude: float, longitude: float, radius: float
+    ):
+        stations = []
+        for distance, record in self._get_station_index().within_radius(
+            latitude=latitude, longitude=longitude, radius_km=radius
+        ):
+            state = record.as_dict()
+            state["distance_km"] = round(distance, 3)
+            stations.append(state)
+        return stations
+
+    # Returns the states of all stations whose last position is within the
+    # bounding box. A box with min_longitude > max_longitude crosses the
+    # 180th meridian
+    @keyword("Get Stations Within Bounding Box")
+    def get_stations_within_bounding_box(
+        self,
+        min_latitude: float,
+        min_longitude: float,
+        max_latitude: float,
+        max_longitude: float,
+    ):
+        return [
+            record.as_dict()
+            for record in self._get_station_index().within_bounding_box(
+                min_latitude=min_latitude,
+                min_longitude=min_longitude,
+                max_latitude=max_latitude,
+                max_longitude=max_longitude,
+            )
+        ]
+
+    @keyword("Get APRS Station Index Statistics")
+    def get_station_index_statistics(self):
+        return self._get_station_index().statistics()
+
+    @keyword("Clear APRS Station Index")
+    def clear_station_index(self):
+        self._get_station_index().clear()
+
+    def _get_station_index(self):
+        if self.__station_index is None:
+            raise ValueError("APRS station index is not enabled")
+        return self.__station_index
+
+    # Returns the current state of the background receiver's queue
+    @keyword("Get APRS Receive Queue Statistics")
+    def get_receive_queue_statistics(self, alias: str = None):
+        receiver = self._get_session(alias=alias).receiver
+        if not receiver:
+            raise ValueError("APRS-IS background receiver is not active")
+        packet_queue = receiver.packet_queue
+        return {
+            "size": len(packet_queue),
+            "maxsize": packet_queue.maxsize,
+            "overflow_policy": packet_queue.overflow_policy,
+            "dropped": packet_queue.dropped,
+            "alive": receiver.is_alive(),
+        }
+
+    # Send an APRS message (which needs to contain a message number) and track
+    # it until it gets acknowledged. If no ack/rej has been received, the
+    # message is resent up to 'retries' times; the interval between these
+    # retries starts with 'retry_interval' and is multiplied by 'backoff'
+    # after each retry. Retries are sent while 'Wait For APRS Ack' is active.
+    # Returns the message number of the message.
+    @keyword("Send APRS Message With Ack Tracking")
+    def send_tracked_aprs_message(
+        self,
+        packet: str,
+        retries: int = DEFAULT_ACK_RETRIES,
+        retry_interval: str = DEFAULT_ACK_RETRY_INTERVAL,
+        backoff: float = DEFAULT_ACK_BACKOFF,
+        alias: str = None,
+    ):
+        session = self._get_session(alias=alias)
+        parsed_packet = self._get_parsed_packet(aprs_packet=packet)
+        if parsed_packet.get("format") != "message" or "msgNo" not in parsed_packet:
+            raise ValueError("This APRS packet is not a message with a message number")
+
+        message = self.__ack_tracker.register(
+            packet=packet,
+            addressee=parsed_packet["addresse"],
+            msgno=parsed_packet["msgNo"],
+            retries=retries,
+            interval=timestr_to_secs(retry_interval),
+            backoff=backoff,
+            alias=session.alias,
+        )
+        # A message which has never been sent must not be retried
+        try:
+            self.send_aprs_packet(packet=packet, alias=session.alias)
+        except:
+            self.__ack_tracker.remove(message)
+            raise
+        return parsed_packet["msgNo"]
+
+    # Wait until a tracked message has been acknowledged or rejected, its
+    # retries have been used up or 'timeout' (Robot time string) has been
+    # reached. Packets which are received while waiting and which are not
+    # related to our tracked messages are returned by the next receive keyword.
+    # Returns a dictionary with the message's status ('ack', 'rej', 'expired'
+    # or 'pending' if the timeout was reached), the number of send attempts
+    # and the ack latency in seconds
+    @keyword("Wait For APRS Ack")
+    def wait_for_aprs_ack(
+        self, msgno: str, addressee: str = None, timeout: str = None, alias: str = None
+    ):
+        # Are we connected?
+        session = self._get_session(alias=alias)
+
+        if addressee:
+            message = self.__ack_tracker.get(addressee=addressee, msgno=msgno)
+        else:
+            message = self.__ack_tracker.find(msgno=msgno)
+        if not message:
+            raise ValueError(f"MsgNo '{msgno}' is not tracked")
+
+        deadline = None
+        if timeout is not None:
+            deadline = time.monotonic() + timestr_to_secs(timeout)
+
+        unclaimed = []
+        try:
+            while message.status == STATUS_PENDING:
+                for retry in self.__ack_tracker.due_retries():
+                    logger.debug(
+                        msg=f"Resending message '{retry.msgno}' to {retry.addressee} (attempt {retry.attempts})"
+                    )
+                    self.send_aprs_packet(packet=retry.packet, alias=retry.alias)
+                if message.status != STATUS_PENDING:
+                    break
+
+                # Read packets until the next retry is due or we have run out of time
+                now = time.monotonic()
+                wait_time = max(self.__ack_tracker.next_retry_at() - now, 0)
+                if deadline is not None:
+                    if now >= deadline:
+                        break
+                    wait_time = min(wait_time, deadline - now)
+
+                stream = self._raw_packet_stream(session=session, timeout=wait_time)
+                try:
+                    for raw_packet in stream:
+                        try:
+                            packet = aprslib.parse(raw_packet)
+                        except (aprslib.ParseError, aprslib.UnknownFormat):
+                            continue
+                        if not self.__ack_tracker.process_packet(packet):
+                            unclaimed.append(raw_packet)
+                        if message.status != STATUS_PENDING:
+                            break
+                finally:
+                    stream.close()
+        finally:
+            # Make the unrelated packets available to the receive keywords again
+            session.pushback.extendleft(reversed(unclaimed))
+
+        if message.status != STATUS_PENDING:
+            self.__ack_tracker.remove(message)
+        return message.as_dict()
+
+    # Returns the number of tracked messages per status
+    @keyword("Get APRS Ack Tracker Statistics")
+    def get_ack_tracker_statistics(self):
+        return self.__ack_tracker.statistics()
+
+    # Removes all messages from the ack tracker
+    @keyword("Clear APRS Ack Tracker")
+    def clear_ack_tracker(self):
+        self.__ack_tracker.clear()
+
+    # Wait for a packet which matches all given criteria: 'source' (callsign),
+    # 'addressee', 'format' (aprslib format, e.g. 'message'), 'msgno' and
+    # 'ack_msgno' (replyack). Received packets are read once and routed to the
+    # waiting keyword through hash indexes. Packets which do not match are kept
+    # in a bounded backlog (per callsign, msgno, ...) and can be claimed by a
+    # later call of this keyword. Returns the decoded (or, with 'raw', the
+    # raw) packet or 'None' if no matching packet arrived within 'timeout'
+    @keyword("Wait For APRS Packet Matching")
+    def wait_for_packet_matching(
+        self,
+        source: str = None,
+        addressee: str = None,
+        format: str = None,
+        msgno: str = None,
+        ack_msgno: str = None,
+        timeout: str = None,
+        raw: bool = False,
+        immortal: bool = True,
+        alias: str = None,
+    ):
         # Are we connected?
-        if not self.ais:
-            raise ConnectionError("Not connected to APRS-IS")
+        session = self._get_session(alias=alias)
+
+        criteria = {
+            field: value
+            for field, value in (
+                ("from", source),
+                ("addresse", addressee),
+                ("format", format),
+                ("msgNo", msgno),
+                ("ackMsgNo", ack_msgno),
+            )
+            if value is not None
+        }
 
-        # We seem to be connected. Hey-ho, let's go.
-        logger.debug(msg="Start the APRS-IS consumer")
-        # Start the consumer. We still use the aprslib's "Blocking" parameter as standard but
-        # break the cansumer's digestion process after one record has been received as otherwise,
-        # we cannot communicate the results back to the Robot Framework
-        # So if you want to receive more than one record, you need to re-call this keyword
-        # from your Robot Framework script in order to receive a subsequential APRS-IS packet
-        self.ais.consumer(
-            callback=self.aprscallback, blocking=True, immortal=immortal, raw=raw
+        if timeout is not None:
+            timeout = timestr_to_secs(timeout)
+
+        if not session.dispatcher:
+            session.dispatcher = PacketDispatcher()
+
+        # Packets which only end up in the backlog are not delivered yet
+        stream = self._packet_stream(
+            session=session, timeout=timeout, immortal=immortal, deliver=False
+        )
+        try:
+            packet = session.dispatcher.wait(criteria=criteria, packets=stream)
+        finally:
+            stream.close()
+
+        if packet is None:
+            return None
+        self.aprs_packet = packet
+        METRICS.inc("aprs_delivered_packets_total")
+        return packet["raw"] if raw else packet
+
+    # Returns the number of waiters and backlog packets plus the dispatcher's
+    # counters for the 'Wait For APRS Packet Matching' keyword
+    @keyword("Get APRS Packet Backlog Statistics")
+    def get_packet_backlog_statistics(self, alias: str = None):
+        dispatcher = self._get_session(alias=alias).dispatcher
+        return (
+            dispatcher.statistics() if dispatcher else PacketDispatcher().statistics()
         )
-        return self.aprs_packet
+
+    # Removes all packets from the backlog of 'Wait For APRS Packet Matching'
+    @keyword("Clear APRS Packet Backlog")
+    def clear_packet_backlog(self, alias: str = None):
+        dispatcher = self._get_session(alias=alias).dispatcher
+        if dispatcher:
+            dispatcher.clear()
 
     # Getter methods for the APRS message(s), mainly targeting APRS 'message' types
     # You can call the generic method get_value_from_aprs_message along with your
@@ -458,6 +1838,36 @@ class AprsLibrary:
             aprs_packet=aprs_packet, field_name="ackMsgNo"
         )
 
+    @keyword("Get Path Value from APRS Packet")
+    def get_message_path(self, aprs_packet):
+        return self.get_value_from_aprs_packet(
+            aprs_packet=aprs_packet, field_name="path"
+        )
+
+    @keyword("Get Via Value from APRS Packet")
+    def get_message_via(self, aprs_packet):
+        return self.get_value_from_aprs_packet(
+            aprs_packet=aprs_packet, field_name="via"
+        )
+
+    # Returns 'from', 'to', 'path', 'via' and (for messages) 'addresse' of
+    # a raw packet (str, bytes or memoryview) without parsing the whole
+    # packet. Use this keyword for relay/echo scenarios where the payload
+    # itself is of no interest. Note that the callsigns are not validated
+    @keyword("Get Header Values from APRS Packet")
+    def get_header_values_from_aprs_packet(self, aprs_packet):
+        if isinstance(aprs_packet, dict):
+            return {
+                field_name: copy_packet(aprs_packet[field_name])
+                for field_name in HEADER_FIELDS
+                if field_name in aprs_packet
+            }
+        if not isinstance(aprs_packet, (str, bytes, memoryview)):
+            raise TypeError(
+                f"This packet does not look like a valid APRS message type: {type(aprs_packet)}"
+            )
+        return extract_header(aprs_packet)
+
     # This is the core function which will extract the requested
     # field name from our packet(s). The packet can either be in
     # raw format (str or bytes) OR decoded. If you try to access
@@ -472,10 +1882,11 @@ class AprsLibrary:
             )
 
         if isinstance(aprs_packet, (str, bytes)):
-            packet = self.parse_aprs_packet(aprs_packet=aprs_packet)
+            packet = self._get_parsed_packet(aprs_packet=aprs_packet)
             if isinstance(packet, dict):
                 if field_name in packet:
-                    return packet[field_name]
+                    # Copy the value as it is shared with the parse cache
+                    return copy_packet(packet[field_name])
                 else:
                     raise TypeError(
                         f"Attribute '{field_name}' is not present in this APRS message"
@@ -488,6 +1899,50 @@ class AprsLibrary:
                     f"Attribute '{field_name}' is not present in this APRS message"
                 )
 
+    # Extracts several fields from our packet in one pass. 'field_names' is a
+    # list of field names; 'defaults' is an optional dictionary with values for
+    # fields which are not present in the packet. If a field is neither present
+    # in the packet nor in 'defaults', this function will raise an exception.
+    # The result is returned as a dictionary (field name / value) or - if
+    # 'as_list' is set - as a list of values in the order of 'field_names'
+    @keyword("Get Values From APRS Packet")
+    def get_values_from_aprs_packet(
+        self,
+        aprs_packet,
+        field_names: list,
+        defaults: dict = None,
+        as_list: bool = False,
+    ):
+        if not isinstance(aprs_packet, (str, dict, bytes)):
+            raise TypeError(
+                f"This packet does not look like a valid APRS message type: {type(aprs_packet)}"
+            )
+
+        if isinstance(aprs_packet, (str, bytes)):
+            packet = self._get_parsed_packet(aprs_packet=aprs_packet)
+        else:
+            packet = aprs_packet
+
+        if defaults is None:
+            defaults = {}
+
+        values = {}
+        for field_name in field_names:
+            if field_name in packet:
+                value = packet[field_name]
+            elif field_name in defaults:
+                value = defaults[field_name]
+            else:
+                raise TypeError(
+                    f"Attribute '{field_name}' is not present in this APRS message"
+                )
+            # Copy the value as it may be shared with the parse cache
+            values[field_name] = copy_packet(value)
+
+        if as_list:
+            return [values[field_name] for field_name in field_names]
+        return values
+
     # Check methods for the APRS message(s), mainly targeting APRS 'message' types
     # You can call the generic method check_if_field_exists_in_packet along with your
     # key in order to retrieve its value if your attribute is not listed here
@@ -559,36 +2014,12 @@ class AprsLibrary:
             raise TypeError("This does not look like a valid APRS message type")
 
         if isinstance(aprs_packet, (str, bytes)):
-            packet = self.parse_aprs_packet(aprs_packet=aprs_packet)
+            packet = self._get_parsed_packet(aprs_packet=aprs_packet)
             if isinstance(packet, dict):
                 return True if field_name in packet else False
         else:
             return True if field_name in aprs_packet else False
 
 
-#
-# Internal functions that are not to be called as Robot keywords
-#
-def get_alphanumeric_counter_value(numeric_counter: int):
-    """
-    Calculates the alphanumeric two-character APRS-IS message counter
-    based on the numeric value
-
-    Parameters
-    ==========
-    numeric_counter: 'int'
-        numeric counter that is used for calculating the start value
-
-    Returns
-    =======
-    alphanumeric_counter: 'str'
-        alphanumeric counter that is based on the numeric counter
-    """
-    first_char = int(numeric_counter / 26)
-    second_char = int(numeric_counter % 26)
-    alphanumeric_counter = chr(first_char + 65) + chr(second_char + 65)
-    return alphanumeric_counter
-
-
 if __name__ == "__main__":
     pass
@@ -0,0 +1,288 @@
+#
+# Robot Framework Keyword library wrapper for
+# https://github.com/rossengeorgiev/aprs-python
+# Message retry and ack tracking for APRS messages
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+import threading
+import time
+
+from .headers import extract_header
+from .parsing import parse_packet
+
+# Status values of a tracked message
+STATUS_PENDING = "pending"
+STATUS_ACK = "ack"
+STATUS_REJ = "rej"
+STATUS_EXPIRED = "expired"
+
+
+class TrackedMessage:
+    """
+    An outgoing APRS message which is waiting for an ack/rej
+    """
+
+    __slots__ = (
+        "packet",
+        "addressee",
+        "msgno",
+        "retries",
+        "interval",
+        "backoff",
+        "attempts",
+        "status",
+        "sent_at",
+        "next_retry_at",
+        "resolved_at",
+        "alias",
+    )
+
+    def __init__(
+        self,
+        packet: str,
+        addressee: str,
+        msgno: str,
+        retries: int,
+        interval: float,
+        backoff: float,
+        alias: str,
+    ):
+        self.packet = packet
+        self.addressee = addressee
+        self.msgno = msgno
+        self.retries = retries
+        self.interval = interval
+        self.backoff = backoff
+        self.attempts = 1
+        self.status = STATUS_PENDING
+        self.sent_at = time.monotonic()
+        self.next_retry_at = self.sent_at + interval
+        self.resolved_at = None
+        self.alias = alias
+
+    def as_dict(self):
+        latency = None
+        if self.resolved_at is not None and self.status != STATUS_EXPIRED:
+            latency = self.resolved_at - self.sent_at
+        return {
+            "addressee": self.addressee,
+            "msgno": self.msgno,
+            "status": self.status,
+            "attempts": self.attempts,
+            "latency": latency,
+        }
+
+
+class AckTracker:
+    """
+    Table of outgoing APRS messages, keyed by addressee and msgno.
+    Incoming acks/rejs (including replyack 'ackMsgNo' values) are
+    matched in O(1). Unacknowledged messages are retried with an
+    exponential backoff until their retries have been used up.
+    """
+
+    def __init__(self):
+        self.__messages = {}
+        # addressee -> number of tracked messages; acks come from these stations
+        self.__addressees = {}
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__messages)
+
+    def register(
+        self,
+        packet: str,
+        addressee: str,
+        msgno: str,
+        retries: int,
+        interval: float,
+        backoff: float,
+        alias: str = None,
+    ):
+        if retries < 0:
+            raise ValueError("Number of retries cannot be negative")
+        if interval <= 0:
+            raise ValueError("Retry interval needs to be a positive value")
+        if backoff < 1:
+            raise ValueError("Backoff factor needs to be at least 1")
+        message = TrackedMessage(
+            packet=packet,
+            addressee=addressee.upper(),
+            msgno=msgno,
+            retries=retries,
+            interval=interval,
+            backoff=backoff,
+            alias=alias,
+        )
+        key = (message.addressee, msgno)
+        with self.__lock:
+            if key not in self.__messages:
+                self.__addressees[message.addressee] = (
+                    self.__addressees.get(message.addressee, 0) + 1
+                )
+            self.__messages[key] = message
+        return message
+
+    def get(self, addressee: str, msgno: str):
+        return self.__messages.get((addressee.upper(), msgno))
+
+    def find(self, msgno: str):
+        """
+        Returns the tracked message for a msgno if the addressee is
+        unknown. Raises a ValueError if that msgno is ambiguous
+        """
+        with self.__lock:
+            messages = [
+                message
+                for message in self.__messages.values()
+                if message.msgno == msgno
+            ]
+        if len(messages) > 1:
+            raise ValueError(
+                f"MsgNo '{msgno}' is tracked for more than one addressee; please specify the addressee"
+            )
+        return messages[0] if messages else None
+
+    def pending_msgnos(self):
+        with self.__lock:
+            return {
+                message.msgno
+                for message in self.__messages.values()
+                if message.status == STATUS_PENDING
+            }
+
+    def process_packet(self, packet: dict):
+        """
+        Checks if a decoded APRS packet acknowledges (or rejects) one of
+        our tracked messages
+
+        Parameters
+        ==========
+        packet: 'dict'
+            decoded APRS packet
+
+        Returns
+        =======
+        matched: 'bool'
+            True if the packet has resolved a tracked message
+        """
+        if not self.__messages or packet.get("format") != "message":
+            return False
+        sender = packet.get("from", "").upper()
+        matched = False
+        with self.__lock:
+            response = packet.get("response")
+            if response in (STATUS_ACK, STATUS_REJ):
+                matched |= self.__resolve(sender, packet.get("msgNo"), response)
+            # replyack scheme: the ack is piggybacked on a regular message
+            if "ackMsgNo" in packet:
+                matched |= self.__resolve(sender, packet["ackMsgNo"], STATUS_ACK)
+        return matched
+
+    def process_raw_packet(self, raw_packet: object):
+        """
+        Same as 'process_packet' for a raw packet. The header is checked
+        first; only messages from the addressees of our tracked messages
+        are parsed
+
+        Parameters
+        ==========
+        raw_packet: 'bytes' or 'str'
+            raw APRS packet
+
+        Returns
+        =======
+        matched: 'bool'
+            True if the packet has resolved a tracked message
+        """
+        if not self.__messages:
+            return False
+        try:
+            header = extract_header(raw_packet)
+        except ValueError:
+            return False
+        if "addresse" not in header or header["from"].upper() not in self.__addressees:
+            return False
+        try:
+            packet = parse_packet(raw_packet)
+        except ValueError:
+            return False
+        return self.process_packet(packet)
+
+    def __resolve(self, addressee: str, msgno: str, status: str):
+        message = self.__messages.get((addressee, msgno))
+        if not message or message.status != STATUS_PENDING:
+            return False
+        message.status = status
+        message.resolved_at = time.monotonic()
+        return True
+
+    def due_retries(self):
+        """
+        Returns all messages whose next retry is due and advances their
+        retry schedule. Messages which have used up all of their retries
+        are marked as expired instead
+        """
+        now = time.monotonic()
+        due = []
+        with self.__lock:
+            for message in self.__messages.values():
+                if message.status != STATUS_PENDING or message.next_retry_at > now:
+                    continue
+                if message.attempts > message.retries:
+                    message.status = STATUS_EXPIRED
+                    message.resolved_at = now
+                    continue
+                message.attempts += 1
+                message.interval *= message.backoff
+                message.next_retry_at = now + message.interval
+                due.append(message)
+        return due
+
+    def next_retry_at(self):
+        with self.__lock:
+            pending = [
+                message.next_retry_at
+                for message in self.__messages.values()
+                if message.status == STATUS_PENDING
+            ]
+        return min(pending) if pending else None
+
+    def remove(self, message: TrackedMessage):
+        with self.__lock:
+            if self.__messages.pop((message.addressee, message.msgno), None):
+                count = self.__addressees.pop(message.addressee) - 1
+                if count:
+                    self.__addressees[message.addressee] = count
+
+    def clear(self):
+        with self.__lock:
+            self.__messages.clear()
+            self.__addressees.clear()
+
+    def statistics(self):
+        with self.__lock:
+            statistics = {
+                STATUS_PENDING: 0,
+                STATUS_ACK: 0,
+                STATUS_REJ: 0,
+                STATUS_EXPIRED: 0,
+            }
+            for message in self.__messages.values():
+                statistics[message.status] += 1
+            return statistics
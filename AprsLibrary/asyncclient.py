@@ -0,0 +1,353 @@
+#
+# Robot Framework Keyword library wrapper for
+# https://github.com/rossengeorgiev/aprs-python
+# asyncio-based APRS-IS client and the event loop for the Robot keywords
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Usage (plain Python):
+#
+#   async with AsyncAprsIsClient("N0CALL-1", "13023", "127.0.0.1", 14580) as client:
+#       await client.send_packets(["N0CALL-1>APRS:>Hello"])
+#       async for packet in client.packets():
+#           ...
+#
+
+import threading
+import asyncio
+import logging
+import time
+
+from .lazyimports import lazy_import, load_lazy_module
+from .metrics import METRICS
+from .sender import coalesce_packets, MAX_WRITE_SIZE
+
+aprslib = lazy_import("aprslib")
+
+logger = logging.getLogger(__name__)
+
+# Max time (in seconds) for receiving the server banner and login response
+LOGIN_TIMEOUT = 5.0
+
+# Max length of a line from APRS-IS (the StreamReader's buffer limit)
+MAX_LINE_LENGTH = 64 * 1024
+
+
+class AsyncAprsIsClient:
+    """
+    asyncio counterpart to the aprslib.IS connection object: connects and
+    logs in (including the server filter), provides async iteration over
+    the received lines and decoded packets and sends batches of packets
+    with as few socket writes as possible. Many clients can share a
+    single event loop (and thread)
+    """
+
+    def __init__(
+        self,
+        callsign: str,
+        passcode: str = "-1",
+        host: str = "euro.aprs2.net",
+        port: int = 14580,
+        aprsis_filter: str = "",
+    ):
+        self.callsign = callsign
+        self.passcode = str(passcode)
+        self.host = host
+        self.port = port
+        self.aprsis_filter = aprsis_filter
+        self.verified = False
+        self.server_name = None
+        self.__reader = None
+        self.__writer = None
+
+    @property
+    def connected(self):
+        return self.__writer is not None and not self.__writer.is_closing()
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def connect(self, timeout: float = LOGIN_TIMEOUT):
+        """
+        Connects to APRS-IS and logs in. Raises a ConnectionError if the
+        server does not respond or rejects the login
+        """
+        if self.connected:
+            raise ValueError("Async APRS-IS client is already connected")
+        try:
+            self.__reader, self.__writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port, limit=MAX_LINE_LENGTH),
+                timeout,
+            )
+            banner = await asyncio.wait_for(self.__reader.readline(), timeout)
+            if banner[0:1] != b"#":
+                raise ConnectionError("Invalid banner from APRS-IS server")
+
+            login = f"user {self.callsign} pass {self.passcode} vers aprslib {aprslib.__version__}"
+            if self.aprsis_filter:
+                login += f" filter {self.aprsis_filter}"
+            self.__writer.write(login.encode("utf-8") + b"\r\n")
+            await self.__writer.drain()
+
+            # '# logresp CALLSIGN verified, server NAME'
+            response = await asyncio.wait_for(self.__reader.readline(), timeout)
+            fields = response.decode("latin-1").split()
+        except (OSError, asyncio.TimeoutError) as exp:
+            await self.close()
+            raise ConnectionError(
+                f"Cannot connect to APRS-IS with server {self.host} port {self.port}: {exp!r}"
+            )
+        except ConnectionError:
+            await self.close()
+            raise
+
+        if (
+            len(fields) < 4
+            or fields[1] != "logresp"
+            or fields[2].upper() != self.callsign.upper()
+        ):
+            await self.close()
+            raise ConnectionError(f"APRS-IS login failed: {' '.join(fields)}")
+        self.verified = fields[3] == "verified,"
+        if not self.verified and self.passcode != "-1":
+            await self.close()
+            raise ConnectionError("APRS-IS passcode is incorrect")
+        if len(fields) > 5:
+            self.server_name = fields[5]
+        logger.debug(msg=f"Async client {self.callsign} connected to {self.host}")
+
+    async def set_filter(self, aprsis_filter: str):
+        """
+        Changes the server filter of the existing connection
+        """
+        self.aprsis_filter = aprsis_filter
+        await self.__write(f"#filter {aprsis_filter}".encode("utf-8") + b"\r\n")
+
+    async def read_line(self, timeout: float = None):
+        """
+        Returns the next raw line from APRS-IS (without CR/LF). Server
+        comments are skipped
+
+        Parameters
+        ==========
+        timeout: 'float'
+            max time in seconds; 'None' waits forever
+
+        Returns
+        =======
+        line: 'bytes'
+            raw APRS packet or 'None' if the timeout has been reached
+        """
+        if not self.connected:
+            raise ConnectionError("Async APRS-IS client is not connected")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                if deadline is None:
+                    line = await self.__reader.readline()
+                else:
+                    line = await asyncio.wait_for(
+                        self.__reader.readline(), max(deadline - time.monotonic(), 0)
+                    )
+            except asyncio.TimeoutError:
+                return None
+            except (OSError, asyncio.IncompleteReadError) as exp:
+                raise ConnectionError(f"Lost connection to APRS-IS: {exp}")
+            if not line:
+                raise ConnectionError("Lost connection to APRS-IS")
+            METRICS.inc("aprs_received_bytes_total", len(line))
+            line = line.rstrip(b"\r\n")
+            if line and line[0:1] != b"#":
+                METRICS.inc("aprs_received_lines_total")
+                return line
+
+    async def lines(self, timeout: float = None):
+        """
+        Async generator for raw lines; ends once no line has been received
+        for 'timeout' seconds ('None' = never)
+        """
+        while True:
+            line = await self.read_line(timeout=timeout)
+            if line is None:
+                return
+            yield line
+
+    def __aiter__(self):
+        return self.lines()
+
+    async def packets(self, timeout: float = None):
+        """
+        Async generator for decoded packets (see 'lines'). Packets which
+        aprslib cannot decode are skipped
+        """
+        async for line in self.lines(timeout=timeout):
+            try:
+                packet = aprslib.parse(line)
+            except (aprslib.ParseError, aprslib.UnknownFormat) as exp:
+                METRICS.inc(
+                    "aprs_parse_failures_total", labels=f'type="{type(exp).__name__}"'
+                )
+                continue
+            yield packet
+
+    async def receive_packets(
+        self, max_packets: int, timeout: float = None, raw: bool = False
+    ):
+        """
+        Collects up to 'max_packets' packets which are received before
+        'timeout' (seconds) has been reached
+
+        Returns
+        =======
+        packets: 'list'
+            decoded (or raw) packets
+        """
+        if max_packets < 1:
+            raise ValueError("max_packets needs to be a positive integer")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        packets = []
+        while len(packets) < max_packets:
+            remaining = None
+            if deadline is not None:
+                remaining = max(deadline - time.monotonic(), 0)
+            line = await self.read_line(timeout=remaining)
+            if line is None:
+                break
+            if raw:
+                packets.append(line)
+                continue
+            try:
+                packets.append(aprslib.parse(line))
+            except (aprslib.ParseError, aprslib.UnknownFormat):
+                continue
+        return packets
+
+    async def send_packets(self, packets: list):
+        """
+        Sends a list of APRS packets. The packets are coalesced into as
+        few writes as possible; the call returns once the data has been
+        handed over to the socket
+
+        Returns
+        =======
+        report: 'dict'
+            number of packets, bytes and writes
+        """
+        packets = [packet.rstrip("\r\n") for packet in packets if packet]
+        packets = [packet for packet in packets if packet]
+        report = {"packets": 0, "bytes": 0, "writes": 0}
+        while report["packets"] < len(packets):
+            remaining = packets[report["packets"] :]
+            count, payload = coalesce_packets(
+                remaining, max_count=len(remaining), max_write_size=MAX_WRITE_SIZE
+            )
+            data = payload.encode("utf-8") + b"\r\n"
+            await self.__write(data)
+            METRICS.inc("aprs_sent_packets_total", count)
+            METRICS.inc("aprs_sent_bytes_total", len(data))
+            report["packets"] += count
+            report["bytes"] += len(data)
+            report["writes"] += 1
+        return report
+
+    async def send_packet(self, packet: str):
+        await self.send_packets([packet])
+
+    async def close(self):
+        writer = self.__writer
+        self.__reader = None
+        self.__writer = None
+        if writer:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    async def __write(self, data: bytes):
+        if not self.connected:
+            raise ConnectionError("Async APRS-IS client is not connected")
+        try:
+            self.__writer.write(data)
+            await self.__writer.drain()
+        except OSError as exp:
+            raise ConnectionError(f"Error while sending to APRS-IS: {exp}")
+
+
+async def run_concurrently(coroutines: list):
+    """
+    Runs the coroutines concurrently and returns their results. If any
+    of them fails, its error is raised once all of them have finished
+    """
+    results = await asyncio.gather(*coroutines, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
+
+
+class EventLoopThread:
+    """
+    Runs an asyncio event loop in a background thread, meaning that
+    synchronous code (the Robot keywords) can run coroutines on it
+    """
+
+    def __init__(self):
+        self.__loop = None
+        self.__thread = None
+        self.__lock = threading.Lock()
+
+    def __start(self):
+        with self.__lock:
+            if self.__thread and self.__thread.is_alive():
+                return self.__loop
+            # The sessions parse their packets with aprslib on the loop thread
+            load_lazy_module(aprslib)
+            self.__loop = asyncio.new_event_loop()
+            self.__thread = threading.Thread(
+                target=self.__loop.run_forever, name="AsyncAprsIsLoop", daemon=True
+            )
+            self.__thread.start()
+            return self.__loop
+
+    def run(self, coroutine, timeout: float = None):
+        """
+        Runs 'coroutine' on the event loop and returns its result
+        """
+        loop = self.__start()
+        future = asyncio.run_coroutine_threadsafe(coroutine, loop)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    def stop(self):
+        with self.__lock:
+            if not self.__thread:
+                return
+            self.__loop.call_soon_threadsafe(self.__loop.stop)
+            self.__thread.join()
+            self.__loop.close()
+            self.__loop = None
+            self.__thread = None
+
+
+# Event loop which is shared by all async sessions of the Robot keywords
+EVENT_LOOP = EventLoopThread()
@@ -0,0 +1,421 @@
+#
+# Robot Framework Keyword library wrapper for
+# https://github.com/rossengeorgiev/aprs-python
+# Benchmarks for the library's parse, extract, send and receive paths
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Usage: python -m AprsLibrary.benchmark [--iterations N] [--output FILE]
+#                                        [--baseline FILE] [--tolerance 0.2]
+#                                        [--import-budget-ms 100]
+#
+# All network benchmarks run against the local APRS-IS stand-in server,
+# meaning that no network access is required
+#
+
+import tracemalloc
+import subprocess
+import argparse
+import tempfile
+import logging
+import json
+import time
+import sys
+import os
+
+import aprslib
+
+from .AprsLibrary import AprsLibrary
+from .clientfilter import ClientFilter
+from .headers import extract_header
+from .localserver import LocalAprsIsServer
+from .parsing import parse_packet
+
+# Synthetic packet corpus which covers all formats that aprslib decodes
+SYNTHETIC_PACKETS = [
+    "DF1JSL-1>APRS,TCPIP*,qAC,T2TEST:=5150.34N/00819.60E-Test position",
+    "DF1JSL-1>APRS,TCPIP*,qAC,T2TEST:!/5L!!<*e7>7P[Compressed position",
+    "DF1JSL-1>APRS,TCPIP*,qAC,T2TEST:!5150.34N/00819.60E_220/004g005t077r000p000P000h50b09900",
+    'DF1JSL-9>T2SP0W,WIDE1-1,qAR,DB0XX:`c5Il!<>/]"4V}=',
+    "DF1JSL>APRS,TCPIP*,qAC,T2TEST:;LEADER   *092345z4903.50N/07201.75W>088/036",
+    "DF1JSL-1>APRS,TCPIP*,qAC,T2TEST::WXBOT    :tomorrow{AB}",
+    "WXBOT>APRS,TCPIP*,qAC,T2TEST::DF1JSL-1 :ackAB",
+    "DF1JSL>APRS,TCPIP*,qAC,T2TEST::BLN1     :Test bulletin",
+    "DF1JSL>APRS,TCPIP*,qAC,T2TEST::BLN1WX   :Test group bulletin",
+    "DF1JSL>APRS,TCPIP*,qAC,T2TEST::BLNA     :Test announcement",
+    "DF1JSL>APRS,TCPIP*,qAC,T2TEST::DF1JSL   :PARM.Battery,Temp",
+    "DF1JSL>APRS,TCPIP*,qAC,T2TEST:>Test status",
+    "DF1JSL>APRS,TCPIP*,qAC,T2TEST:_10090556c220s004g005t077r000p000P000h50b09900wRSW",
+    "DF1JSL>APRS,TCPIP*,qAC,T2TEST:}DF1JSL-1>APRS,TCPIP,DF1JSL*:>Third party status",
+    "DF1JSL>BEACON,TCPIP*,qAC,T2TEST:Beacon text",
+    "DF1JSL>APRS,TCPIP*,qAC,T2TEST:{Q1qwerty",
+    "DF1JSL>APRS,TCPIP*,qAC,T2TEST:,Invalid data",
+]
+
+# Call sign for the network benchmarks (the local server verifies passcodes)
+BENCHMARK_CALLSIGN = "N0CALL-1"
+BENCHMARK_ALIAS = "benchmark"
+
+# Number of calls which are traced for the allocation figures
+ALLOCATION_SAMPLE_SIZE = 100
+
+DEFAULT_ITERATIONS = 2000
+DEFAULT_TOLERANCE = 0.2
+
+# Import time check: number of interpreter starts (the fastest one counts)
+# and the modules which a plain 'import AprsLibrary' must not load. Robot
+# Framework imports the library after it has loaded itself, meaning that
+# Robot Framework is imported before the measurement starts
+IMPORT_TIME_RUNS = 5
+IMPORT_TIME_PRELOAD = "robot.api.deco"
+LAZY_MODULES = (
+    "aprslib",
+    "asyncio",
+    "socketserver",
+    "gzip",
+    "logging.handlers",
+    "concurrent.futures.process",
+)
+
+
+def corpus(count: int):
+    """
+    Returns 'count' packets from the synthetic corpus. Every packet gets
+    a unique payload suffix, meaning that caches do not see repetitions
+    unless the caller repeats the packets on purpose
+    """
+    return [
+        f"{SYNTHETIC_PACKETS[index % len(SYNTHETIC_PACKETS)]} {index}"
+        for index in range(count)
+    ]
+
+
+def measure(function, arguments: list):
+    """
+    Calls 'function' once per entry of 'arguments' and measures the
+    latency of every call. A subset of the calls is repeated with
+    tracemalloc enabled for the allocation figures
+
+    Parameters
+    ==========
+    function: 'function'
+        function which takes a single argument
+    arguments: 'list'
+        arguments for the individual calls
+
+    Returns
+    =======
+    result: 'dict'
+        number of calls, total time, calls per second, p50/p99 latency
+        (microseconds) and the mean peak of the memory which a single
+        call allocates (bytes)
+    """
+    latencies = []
+    clock = time.perf_counter_ns
+    start = clock()
+    for argument in arguments:
+        call_start = clock()
+        function(argument)
+        latencies.append(clock() - call_start)
+    seconds = (clock() - start) / 1e9
+
+    # The peak is taken per call; memory which a call keeps (e.g. a cache
+    # entry) does not count towards the peak of the following calls
+    sample = arguments[:ALLOCATION_SAMPLE_SIZE]
+    peaks = []
+    tracemalloc.start()
+    try:
+        for argument in sample:
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            function(argument)
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+    finally:
+        tracemalloc.stop()
+
+    latencies.sort()
+    count = len(latencies)
+    return {
+        "calls": count,
+        "seconds": seconds,
+        "per_second": count / seconds if seconds else 0.0,
+        "p50_us": latencies[count // 2] / 1e3 if count else 0.0,
+        "p99_us": latencies[min(count - 1, int(count * 0.99))] / 1e3 if count else 0.0,
+        "peak_alloc_bytes": sum(peaks) // max(len(peaks), 1),
+    }
+
+
+def measure_batch(function, batch_size: int):
+    """
+    Measures a single call which processes 'batch_size' packets
+    """
+    start = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - start
+    return {
+        "calls": batch_size,
+        "seconds": seconds,
+        "per_second": batch_size / seconds if seconds else 0.0,
+        "p50_us": None,
+        "p99_us": None,
+        "peak_alloc_bytes": None,
+    }
+
+
+def ignore_errors(function):
+    def wrapper(argument):
+        try:
+            function(argument)
+        except (ValueError, TypeError):
+            pass
+
+    return wrapper
+
+
+def run_offline_benchmarks(iterations: int):
+    packets = corpus(iterations)
+    raw_packets = [packet.encode("utf-8") for packet in packets]
+    library = AprsLibrary()
+    # Cached lookups: the same (small) set of packets is used over and over
+    cached_packets = [
+        SYNTHETIC_PACKETS[index % len(SYNTHETIC_PACKETS)] for index in range(iterations)
+    ]
+    client_filter = ClientFilter(sources=["DF1JSL*"], formats=["message"])
+
+    return {
+        "aprslib.parse": measure(ignore_errors(aprslib.parse), packets),
+        "parse_packet": measure(ignore_errors(parse_packet), packets),
+        "Parse APRS Packet (cached)": measure(
+            library.parse_aprs_packet, cached_packets
+        ),
+        "Get Value From APRS Packet (cached)": measure(
+            lambda packet: library.get_value_from_aprs_packet(packet, "format"),
+            cached_packets,
+        ),
+        "Check If APRS Packet Contains": measure(
+            lambda packet: library.check_if_field_exists_in_packet(packet, "msgNo"),
+            cached_packets,
+        ),
+        "extract_header": measure(extract_header, raw_packets),
+        "ClientFilter.prescreen": measure(client_filter.prescreen, raw_packets),
+    }
+
+
+def run_network_benchmarks(iterations: int):
+    results = {}
+    packets = corpus(iterations)
+
+    with tempfile.TemporaryDirectory() as directory:
+        capture_file = os.path.join(directory, "benchmark_capture.txt")
+        with open(capture_file, "w", encoding="utf-8") as f:
+            # Single packet receive (plus its allocation sample) and batch receive
+            f.write("\n".join(packets * 3))
+            f.write("\n")
+
+        server = LocalAprsIsServer(capture_file=capture_file, echo=False)
+        port = server.start()
+        library = AprsLibrary(
+            aprsis_server="127.0.0.1",
+            aprsis_port=port,
+            aprsis_callsign=BENCHMARK_CALLSIGN,
+            aprsis_passcode=str(aprslib.passcode(BENCHMARK_CALLSIGN)),
+        )
+        try:
+            library.connect_aprsis(alias=BENCHMARK_ALIAS, auto_reconnect=False)
+            results["Receive APRS Packet"] = measure(
+                lambda _: library.receive_aprs_packet(timeout="5s"),
+                range(iterations),
+            )
+            results["Receive APRS Packets"] = measure_batch(
+                lambda: library.receive_aprs_packets(
+                    max_packets=iterations, timeout="5s"
+                ),
+                iterations,
+            )
+            results["Send APRS Packet"] = measure(library.send_aprs_packet, packets)
+            results["Send APRS Packets"] = measure_batch(
+                lambda: library.send_aprs_packets(packets=packets), iterations
+            )
+        finally:
+            library.disconnect_aprsis(alias=BENCHMARK_ALIAS)
+            server.stop()
+    return results
+
+
+def run_benchmarks(iterations: int = DEFAULT_ITERATIONS, network: bool = True):
+    """
+    Runs all benchmarks
+
+    Parameters
+    ==========
+    iterations: 'int'
+        number of packets per benchmark
+    network: 'bool'
+        also run the send/receive benchmarks against the local server
+
+    Returns
+    =======
+    results: 'dict'
+        benchmark name / result dictionary (see 'measure')
+    """
+    results = run_offline_benchmarks(iterations)
+    if network:
+        results.update(run_network_benchmarks(iterations))
+    return results
+
+
+def measure_import_time(runs: int = IMPORT_TIME_RUNS):
+    """
+    Measures the time for 'import AprsLibrary' in fresh interpreters
+    (python -X importtime) which have already loaded Robot Framework and
+    lists the modules which should have been loaded lazily but were
+    imported
+
+    Returns
+    =======
+    result: 'dict'
+        fastest cumulative import time in milliseconds and the list of
+        eagerly imported lazy modules
+    """
+    # Measure this very copy of the library, even if it is not installed
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    python_path = os.environ.get("PYTHONPATH")
+    environment = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join(filter(None, [package_root, python_path])),
+    )
+    import_ms = None
+    eager_modules = set()
+    for _ in range(runs):
+        process = subprocess.run(
+            [
+                sys.executable,
+                "-X",
+                "importtime",
+                "-c",
+                f"import {IMPORT_TIME_PRELOAD}; import AprsLibrary",
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+            env=environment,
+        )
+        # 'import time: self [us] | cumulative | imported package'
+        preloaded = False
+        for line in process.stderr.splitlines():
+            fields = line.split("|")
+            if len(fields) != 3 or not fields[1].strip().isdigit():
+                continue
+            module = fields[2].strip()
+            if not preloaded:
+                preloaded = module == IMPORT_TIME_PRELOAD
+                continue
+            if module == "AprsLibrary":
+                cumulative_ms = int(fields[1]) / 1000
+                if import_ms is None or cumulative_ms < import_ms:
+                    import_ms = cumulative_ms
+            elif module.split(".")[0] in LAZY_MODULES or module in LAZY_MODULES:
+                eager_modules.add(module)
+    return {"import_ms": import_ms, "eager_modules": sorted(eager_modules)}
+
+
+def compare_results(results: dict, baseline: dict, tolerance: float):
+    """
+    Returns the benchmarks whose throughput has dropped by more than
+    'tolerance' (e.g. 0.2 = 20%) compared to the baseline
+    """
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if not reference or not reference.get("per_second"):
+            continue
+        ratio = result["per_second"] / reference["per_second"]
+        if ratio < 1 - tolerance:
+            regressions.append((name, ratio))
+    return regressions
+
+
+def format_results(results: dict):
+    def number(value, digits):
+        return "-" if value is None else f"{value:.{digits}f}"
+
+    lines = [
+        f"{'Benchmark':<40}{'calls':>8}{'calls/s':>12}{'p50 us':>10}{'p99 us':>10}{'peak B':>10}"
+    ]
+    for name, result in results.items():
+        lines.append(
+            f"{name:<40}{result['calls']:>8}{number(result['per_second'], 0):>12}"
+            f"{number(result['p50_us'], 1):>10}{number(result['p99_us'], 1):>10}"
+            f"{'-' if result['peak_alloc_bytes'] is None else result['peak_alloc_bytes']:>10}"
+        )
+    return "\n".join(lines)
+
+
+def main(arguments: list = None):
+    parser = argparse.ArgumentParser(
+        description="Benchmarks for robotframework-aprslib"
+    )
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON file from a previous run")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument(
+        "--offline-only",
+        action="store_true",
+        help="skip the send/receive benchmarks",
+    )
+    parser.add_argument(
+        "--import-budget-ms",
+        type=float,
+        help="only check that 'import AprsLibrary' stays within this budget",
+    )
+    args = parser.parse_args(arguments)
+
+    if args.import_budget_ms is not None:
+        result = measure_import_time()
+        print(
+            f"import AprsLibrary: {result['import_ms']:.1f} ms "
+            f"(budget {args.import_budget_ms:.1f} ms)"
+        )
+        for module in result["eager_modules"]:
+            print(f"REGRESSION: '{module}' is imported by 'import AprsLibrary'")
+        if result["eager_modules"] or result["import_ms"] > args.import_budget_ms:
+            return 1
+        return 0
+
+    # Per-packet debug output would dominate the measurements
+    logging.disable(logging.INFO)
+
+    results = run_benchmarks(iterations=args.iterations, network=not args.offline_only)
+    print(format_results(results))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.tolerance)
+        for name, ratio in regressions:
+            print(f"REGRESSION: {name} runs at {ratio:.0%} of the baseline throughput")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
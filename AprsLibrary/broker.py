@@ -0,0 +1,582 @@
+#
+# Robot Framework Keyword library wrapper for
+# https://github.com/rossengeorgiev/aprs-python
+# APRS-IS broker: one upstream connection, shared by local worker processes
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Usage (standalone, e.g. before starting pabot):
+#
+#   python -m AprsLibrary.broker --callsign DF1JSL-1 --passcode 12345
+#                                [--server euro.aprs2.net] [--port 14580]
+#                                [--filter "g/DF1JSL*"] [--socket PATH]
+#
+# The broker speaks the APRS-IS protocol on a Unix domain socket. Workers
+# log in as if it was an APRS-IS server (including their own filter); the
+# broker fans the lines from its upstream connection out to them and
+# multiplexes their packets back upstream. Workers attach with
+# 'Connect to APRS-IS' and 'use_broker=True'; only processes of the
+# broker's own user are accepted
+#
+
+import socketserver
+import threading
+import tempfile
+import argparse
+import logging
+import signal
+import socket
+import struct
+import queue
+import stat
+import time
+import sys
+import os
+
+from .lazyimports import lazy_import
+from .connection import AprsIsSession
+from .localserver import (
+    LocalAprsIsClient,
+    LOGIN_GRACE_PERIOD,
+    LOGIN_TIMEOUT,
+    LISTEN_BACKLOG,
+)
+from .receiver import AprsReceiverThread, BoundedPacketQueue, OVERFLOW_DROP_OLDEST
+from .sender import AprsSenderThread, MAX_WRITE_SIZE
+
+aprslib = lazy_import("aprslib")
+
+logger = logging.getLogger(__name__)
+
+# Environment variable with the path of the broker's socket. Without it,
+# all workers of a user use the same default path in a per-user directory
+BROKER_SOCKET_ENV = "APRSLIB_BROKER_SOCKET"
+DEFAULT_BROKER_SOCKET_NAME = "robotframework-aprslib-broker.sock"
+BROKER_DIRECTORY_PREFIX = "robotframework-aprslib-"
+
+# Name which the broker reports in its banner and login response
+BROKER_NAME = "APRSIS-BROKER"
+
+# Max number of lines which are queued per worker. A worker that does not
+# keep up loses its oldest lines; the other workers are not affected
+DEFAULT_WORKER_QUEUE_SIZE = 10000
+
+# Max time (in seconds) for writing the workers' queued packets upstream
+# when the broker is stopped
+BROKER_SEND_TIMEOUT = 5.0
+
+
+def default_broker_socket():
+    """
+    Returns the path of the broker's socket: APRSLIB_BROKER_SOCKET or a
+    file in $XDG_RUNTIME_DIR or - without it - in a per-user directory
+    in the temp directory
+    """
+    socket_path = os.environ.get(BROKER_SOCKET_ENV)
+    if socket_path:
+        return socket_path
+    directory = os.environ.get("XDG_RUNTIME_DIR")
+    if not directory:
+        user = os.getuid() if hasattr(os, "getuid") else "user"
+        directory = os.path.join(
+            tempfile.gettempdir(), f"{BROKER_DIRECTORY_PREFIX}{user}"
+        )
+    return os.path.join(directory, DEFAULT_BROKER_SOCKET_NAME)
+
+
+def prepare_socket_directory(socket_path: str):
+    """
+    Creates the directory of the broker's socket (mode 0700) if needed.
+    The directory needs to be ours, and other users must not be able to
+    replace our socket file (no write permission or sticky bit)
+    """
+    directory = os.path.dirname(os.path.abspath(socket_path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode):
+        raise ValueError(f"Broker socket directory '{directory}' is not a directory")
+    if info.st_uid != os.getuid() and info.st_uid != 0:
+        raise ValueError(f"Broker socket directory '{directory}' is not owned by us")
+    if info.st_mode & 0o022 and not info.st_mode & stat.S_ISVTX:
+        raise ValueError(
+            f"Broker socket directory '{directory}' is writable by other users"
+        )
+
+
+def is_own_socket(socket_path: str):
+    """
+    True if 'socket_path' is a Unix domain socket which belongs to us
+    """
+    try:
+        info = os.lstat(socket_path)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(info.st_mode) and info.st_uid == os.getuid()
+
+
+def peer_uid(sock: socket.socket):
+    """
+    Returns the user id of the process at the other end of a Unix domain
+    socket or 'None' if the platform cannot tell (no SO_PEERCRED)
+    """
+    if not hasattr(socket, "SO_PEERCRED"):
+        return None
+    credentials = sock.getsockopt(
+        socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")
+    )
+    return struct.unpack("3i", credentials)[1]
+
+
+def broker_available(socket_path: str):
+    """
+    Checks if there is a broker socket that we could attach to. Only
+    sockets which belong to us are accepted; another user's socket at
+    the same path is ignored. A stale socket file (left behind by a
+    crashed broker) is only detected by the connection attempt itself
+    """
+    if not hasattr(socketserver, "ThreadingUnixStreamServer"):
+        return False
+    if not os.path.exists(socket_path):
+        return False
+    if not is_own_socket(socket_path):
+        logger.debug(
+            msg=f"Ignoring broker socket '{socket_path}'; it is not a socket of ours"
+        )
+        return False
+    return True
+
+
+class BrokerIS(aprslib.IS):
+    """
+    aprslib.IS object which is connected to the broker's Unix domain
+    socket: 'host' is the socket path and 'port' is 0. Servers with a
+    port (e.g. failover servers) are connected via TCP as usual. The
+    broker needs to run with our user id
+    """
+
+    def _open_socket(self):
+        socket_path, port = self.server
+        if port:
+            return super()._open_socket()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(15)
+        try:
+            sock.connect(socket_path)
+            uid = peer_uid(sock)
+            if uid is not None and uid != os.getuid():
+                raise ConnectionError(
+                    f"Broker socket '{socket_path}' belongs to another user"
+                )
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+
+class BrokerWorker(LocalAprsIsClient):
+    """
+    A worker which is connected to the broker. Lines for the worker are
+    queued and written by the worker's own thread, meaning that a slow
+    worker never holds up the upstream connection or the other workers
+    """
+
+    def __init__(self, sock: socket.socket, address: object, queue_size: int):
+        super().__init__(sock=sock, address=address)
+        self.packet_queue = BoundedPacketQueue(
+            maxsize=queue_size, overflow_policy=OVERFLOW_DROP_OLDEST
+        )
+        self.delivered = 0
+        self.forwarded = 0
+
+    def write_lines(self):
+        # Everything that has been queued in the meantime goes into one write
+        packet_queue = self.packet_queue
+        try:
+            while True:
+                lines = [packet_queue.get()]
+                size = len(lines[0])
+                while size < MAX_WRITE_SIZE:
+                    try:
+                        line = packet_queue.get(timeout=0)
+                    except queue.Empty:
+                        break
+                    lines.append(line)
+                    size += len(line) + 2
+                self.send(b"\r\n".join(lines) + b"\r\n")
+                self.delivered += len(lines)
+        except queue.Empty:
+            # queue has been closed
+            return
+        except OSError as exp:
+            logger.debug(msg=f"Broker worker {self.callsign} dropped: {exp}")
+            packet_queue.close()
+
+
+class WorkerFanOut:
+    """
+    Takes the place of the upstream receiver's packet queue: every line
+    is handed to the queues of all workers whose filter matches
+    """
+
+    def __init__(self):
+        self.closed = False
+        # Replaced (never modified) on changes, meaning that 'put' does
+        # not need a lock
+        self.__workers = ()
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__workers)
+
+    @property
+    def workers(self):
+        return self.__workers
+
+    def add(self, worker: BrokerWorker):
+        with self.__lock:
+            self.__workers += (worker,)
+
+    def remove(self, worker: BrokerWorker):
+        with self.__lock:
+            self.__workers = tuple(
+                item for item in self.__workers if item is not worker
+            )
+
+    def put(self, line: bytes, sender: BrokerWorker = None):
+        for worker in self.__workers:
+            if worker is not sender and worker.wants(line):
+                worker.packet_queue.put(line)
+        return True
+
+    def close(self):
+        # Called by the upstream receiver if it has terminated: the workers'
+        # connections are dropped, meaning that they notice the loss
+        self.closed = True
+        for worker in self.__workers:
+            worker.packet_queue.close()
+            try:
+                worker.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class BrokerRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        self.server.broker.handle_worker(self.request, self.client_address)
+
+
+# Unix domain sockets are not available on every platform
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+
+    class BrokerUnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+        request_queue_size = LISTEN_BACKLOG
+
+
+class AprsIsBroker:
+    """
+    Holds a single upstream APRS-IS connection and shares it with local
+    workers (e.g. pabot processes) via a Unix domain socket. Each worker
+    has its own APRS-IS filter (budlist, prefix, group message and type
+    filters are applied by the broker) and its own bounded queue. Packets
+    from verified workers are sent upstream through a single sender and
+    are also delivered to the other workers whose filter matches - just
+    like APRS-IS would do with separate connections
+    """
+
+    def __init__(
+        self,
+        callsign: str,
+        passcode: str = "-1",
+        host: str = "euro.aprs2.net",
+        port: int = 14580,
+        aprsis_filter: str = "",
+        socket_path: str = None,
+        worker_queue_size: int = DEFAULT_WORKER_QUEUE_SIZE,
+        servers: list = None,
+    ):
+        if not hasattr(socketserver, "ThreadingUnixStreamServer"):
+            raise ValueError("The APRS-IS broker needs Unix domain socket support")
+        if not isinstance(worker_queue_size, int) or worker_queue_size < 1:
+            raise ValueError("Worker queue size needs to be a positive integer")
+        self.callsign = callsign
+        self.passcode = str(passcode)
+        self.host = host
+        self.port = port
+        self.aprsis_filter = aprsis_filter
+        self.socket_path = socket_path or default_broker_socket()
+        self.worker_queue_size = worker_queue_size
+        self.servers = servers
+        self.connections = 0
+        self.logins = 0
+        self.packets_dropped = 0
+        self.__fan_out = WorkerFanOut()
+        self.__session = None
+        self.__server = None
+        self.__thread = None
+        self.__lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self.__server is not None
+
+    def start(self):
+        """
+        Connects to APRS-IS and starts listening for workers
+
+        Returns
+        =======
+        socket_path: 'str'
+            path of the broker's Unix domain socket
+        """
+        if self.__server:
+            raise ValueError("APRS-IS broker is already running")
+        prepare_socket_directory(self.socket_path)
+        self.__remove_stale_socket()
+
+        ais = aprslib.IS(
+            callsign=self.callsign, passwd=self.passcode, host=self.host, port=self.port
+        )
+        if self.aprsis_filter:
+            ais.set_filter(self.aprsis_filter)
+        try:
+            ais.connect(blocking=False)
+        except (aprslib.ConnectionError, aprslib.LoginError) as exp:
+            ais.close()
+            raise ConnectionError(
+                f"Cannot connect to APRS-IS with server {self.host} port {self.port}: {exp}"
+            )
+
+        session = AprsIsSession(alias=BROKER_NAME, ais=ais, servers=self.servers)
+        session.receiver = AprsReceiverThread(
+            ais=ais,
+            packet_queue=self.__fan_out,
+            immortal=True,
+            reconnect=session.reconnect,
+        )
+        session.sender = AprsSenderThread(ais=ais, reconnect=session.reconnect)
+        self.__session = session
+
+        try:
+            self.__server = BrokerUnixServer(self.socket_path, BrokerRequestHandler)
+        except OSError as exp:
+            session.close()
+            self.__session = None
+            raise ConnectionError(
+                f"Cannot listen on broker socket '{self.socket_path}': {exp}"
+            )
+        self.__server.broker = self
+        # Only our own user may attach (and send with our login)
+        os.chmod(self.socket_path, 0o600)
+
+        session.receiver.start()
+        session.sender.start()
+        self.__thread = threading.Thread(
+            target=self.__server.serve_forever, name="AprsIsBroker", daemon=True
+        )
+        self.__thread.start()
+        logger.debug(
+            msg=f"APRS-IS broker for {self.host}:{self.port} listens on {self.socket_path}"
+        )
+        return self.socket_path
+
+    def stop(self):
+        if not self.__server:
+            return
+        self.__server.shutdown()
+        self.__server.server_close()
+        self.__thread.join()
+        try:
+            os.unlink(self.socket_path)
+        except OSError:
+            pass
+        self.__fan_out.close()
+        self.__session.close(send_timeout=BROKER_SEND_TIMEOUT)
+        self.__server = None
+        self.__thread = None
+        self.__session = None
+
+    def statistics(self):
+        session = self.__session
+        workers = self.__fan_out.workers
+        statistics = {
+            "socket_path": self.socket_path,
+            "server": "%s:%s" % session.ais.server if session else None,
+            "upstream_alive": session.is_alive() if session else False,
+            "reconnects": session.reconnects if session else 0,
+            "connections": self.connections,
+            "logins": self.logins,
+            "workers": len(workers),
+            "packets_dropped": self.packets_dropped,
+            "send_queue_pending": session.sender.pending if session else 0,
+            "per_worker": [
+                {
+                    "callsign": worker.callsign,
+                    "queue_size": len(worker.packet_queue),
+                    "delivered": worker.delivered,
+                    "dropped": worker.packet_queue.dropped,
+                    "forwarded": worker.forwarded,
+                }
+                for worker in workers
+            ],
+        }
+        return statistics
+
+    def handle_worker(self, sock: socket.socket, address: object):
+        # The socket's mode is set after it has been created; processes of
+        # other users which have connected in the meantime are turned away
+        uid = peer_uid(sock)
+        if uid is not None and uid != os.getuid():
+            logger.debug(msg=f"Rejecting broker connection from user id {uid}")
+            sock.close()
+            return
+        worker = BrokerWorker(
+            sock=sock, address=address, queue_size=self.worker_queue_size
+        )
+        with self.__lock:
+            self.connections += 1
+        writer = None
+        try:
+            reader = sock.makefile("rb")
+            worker.send(f"# {BROKER_NAME} for {self.host}:{self.port}\r\n".encode())
+            if self.__fan_out.closed:
+                worker.send(b"# upstream APRS-IS connection has been lost\r\n")
+                return
+            if not self.__login(worker, reader):
+                return
+            self.__fan_out.add(worker)
+            writer = threading.Thread(
+                target=worker.write_lines, name="AprsIsBrokerWorker", daemon=True
+            )
+            writer.start()
+
+            for line in reader:
+                line = line.rstrip(b"\r\n")
+                if not line:
+                    continue
+                if line[0:1] == b"#":
+                    # Filter changes only apply to this worker
+                    command = line[1:].decode("utf-8", errors="replace").strip()
+                    if command.lower().startswith("filter"):
+                        worker.set_filter(command[6:].strip())
+                    continue
+                self.__forward(worker, line)
+        except OSError as exp:
+            logger.debug(msg=f"Broker worker {worker.callsign} dropped: {exp}")
+        finally:
+            self.__fan_out.remove(worker)
+            worker.packet_queue.close()
+            if writer:
+                writer.join()
+            sock.close()
+
+    def __login(self, worker: BrokerWorker, reader):
+        worker.sock.settimeout(LOGIN_TIMEOUT)
+        login = reader.readline().decode("utf-8", errors="replace").split()
+        worker.sock.settimeout(None)
+
+        # user CALLSIGN pass PASSCODE vers SOFTWARE VERSION filter ...
+        if len(login) < 4 or login[0].lower() != "user":
+            worker.send(b"# invalid login\r\n")
+            return False
+        worker.callsign = login[1].upper()
+        passcode = login[3] if login[2].lower() == "pass" else "-1"
+        worker.verified = passcode == str(aprslib.passcode(worker.callsign))
+        if "filter" in login:
+            worker.set_filter(" ".join(login[login.index("filter") + 1 :]))
+
+        status = "verified" if worker.verified else "unverified"
+        worker.send(
+            f"# logresp {worker.callsign} {status}, server {BROKER_NAME}\r\n".encode()
+        )
+        with self.__lock:
+            self.logins += 1
+        # aprslib reads the login response with a single recv call, meaning
+        # that lines which arrive together with the response would get lost
+        time.sleep(LOGIN_GRACE_PERIOD)
+        return True
+
+    def __forward(self, worker: BrokerWorker, line: bytes):
+        # Packets from unverified (read-only) workers are dropped, just
+        # like APRS-IS does
+        if not worker.verified:
+            with self.__lock:
+                self.packets_dropped += 1
+            return
+        self.__session.sender.enqueue([line.decode("utf-8", errors="replace")])
+        worker.forwarded += 1
+        self.__fan_out.put(line, sender=worker)
+
+    def __remove_stale_socket(self):
+        if not os.path.lexists(self.socket_path):
+            return
+        if not is_own_socket(self.socket_path):
+            raise ValueError(
+                f"'{self.socket_path}' exists and is not a broker socket of ours"
+            )
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except OSError:
+            # Nobody listens; the file has been left behind by a dead broker
+            os.unlink(self.socket_path)
+            return
+        finally:
+            probe.close()
+        raise ValueError(
+            f"Another APRS-IS broker is already listening on '{self.socket_path}'"
+        )
+
+
+def main(arguments: list = None):
+    parser = argparse.ArgumentParser(
+        description="APRS-IS broker for parallel robotframework-aprslib workers"
+    )
+    parser.add_argument("--callsign", required=True)
+    parser.add_argument("--passcode", default="-1")
+    parser.add_argument("--server", default="euro.aprs2.net")
+    parser.add_argument("--port", type=int, default=14580)
+    parser.add_argument("--filter", default="", help="APRS-IS filter (upstream)")
+    parser.add_argument(
+        "--socket", help=f"Unix domain socket path (default: {default_broker_socket()})"
+    )
+    parser.add_argument(
+        "--worker-queue-size", type=int, default=DEFAULT_WORKER_QUEUE_SIZE
+    )
+    args = parser.parse_args(arguments)
+
+    broker = AprsIsBroker(
+        callsign=args.callsign.upper(),
+        passcode=args.passcode,
+        host=args.server,
+        port=args.port,
+        aprsis_filter=args.filter,
+        socket_path=args.socket,
+        worker_queue_size=args.worker_queue_size,
+    )
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopped.set())
+    print(f"APRS-IS broker listens on {broker.start()}")
+    try:
+        stopped.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        broker.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,289 @@
+#
+# Robot Framework Keyword library wrapper for
+# https://github.com/rossengeorgiev/aprs-python
+# Bulk offline parser for APRS-IS capture files
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+import concurrent.futures
+from collections import deque
+from itertools import islice
+import threading
+import logging
+import json
+import time
+import os
+
+from .parsing import parse_packet
+
+logger = logging.getLogger(__name__)
+
+# Number of lines which are sent to a worker process in one go
+DEFAULT_BATCH_SIZE = 1000
+
+# Max number of unparseable lines which are returned to the user
+DEFAULT_MAX_ERRORS = 1000
+
+# Read buffer size for the capture file
+READ_BUFFER_SIZE = 1024 * 1024
+
+
+def iter_packet_lines(input_file: str):
+    """
+    Streams a capture file line by line without loading it into memory.
+    Empty lines and APRS-IS server comments (starting with '#') are skipped
+
+    Parameters
+    ==========
+    input_file: 'str'
+        path to the capture file (one raw APRS packet per line)
+
+    Returns
+    =======
+    line_number: 'int'
+        line number (1-based) in the capture file
+    line: 'bytes'
+        raw APRS packet (without CR/LF)
+    """
+    with open(input_file, "rb", buffering=READ_BUFFER_SIZE) as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.rstrip(b"\r\n")
+            if not line or line[0:1] == b"#":
+                continue
+            yield line_number, line
+
+
+def parse_batch(batch: list):
+    """
+    Parses a batch of raw APRS packets. This is the worker function
+    for the process pool; it uses the very same parser as the
+    'Parse APRS Packet' keyword
+
+    Parameters
+    ==========
+    batch: 'list'
+        list of (line_number, raw packet) tuples
+
+    Returns
+    =======
+    results: 'list'
+        list of (line_number, raw packet, packet, error) tuples. Either
+        'packet' (dict) or 'error' (str) is 'None'
+    """
+    results = []
+    for line_number, line in batch:
+        try:
+            results.append((line_number, line, parse_packet(line), None))
+        except ValueError as exp:
+            results.append((line_number, line, None, str(exp)))
+    return results
+
+
+class ParserPool:
+    """
+    Process pool for the bulk parser which is kept across calls, meaning
+    that the worker processes are only started once. The workers are
+    started via 'forkserver' (or 'spawn' where 'forkserver' is not
+    available) rather than 'fork': the library's process runs receiver,
+    sender and logging threads whose locks a forked worker would inherit
+    """
+
+    def __init__(self):
+        self.__executor = None
+        self.__workers = 0
+        self.__lock = threading.Lock()
+
+    def executor(self, workers: int):
+        """
+        Returns a process pool with 'workers' processes. The pool is
+        replaced if the number of workers has changed
+        """
+        with self.__lock:
+            if self.__executor is not None and self.__workers == workers:
+                return self.__executor
+            if self.__executor is not None:
+                self.__executor.shutdown(cancel_futures=True)
+            # multiprocessing is only imported if a pool is needed
+            import multiprocessing
+
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context("forkserver")
+            else:
+                context = multiprocessing.get_context("spawn")
+            self.__executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers, mp_context=context
+            )
+            self.__workers = workers
+            return self.__executor
+
+    def shutdown(self):
+        with self.__lock:
+            if self.__executor is not None:
+                self.__executor.shutdown(cancel_futures=True)
+            self.__executor = None
+            self.__workers = 0
+
+
+def iter_parsed_packets(
+    input_file: str,
+    workers: int = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    pool: ParserPool = None,
+):
+    """
+    Parses a capture file and yields the results in file order. With
+    more than one worker, the lines are parsed in a process pool. Only
+    a limited number of batches is in flight at any time, meaning that
+    memory consumption does not depend on the size of the file
+
+    Parameters
+    ==========
+    input_file: 'str'
+        path to the capture file (one raw APRS packet per line)
+    workers: 'int'
+        number of worker processes. 'None' uses one process per CPU,
+        '1' parses everything in the current process
+    batch_size: 'int'
+        number of lines per worker task
+    pool: 'ParserPool'
+        pool which provides the worker processes; without a pool, a
+        temporary pool is used for this call
+
+    Returns
+    =======
+    result: 'tuple'
+        (line_number, raw packet, packet, error) - see parse_batch
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size needs to be a positive integer")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError("workers needs to be a positive integer")
+
+    lines = iter_packet_lines(input_file)
+    batches = iter(lambda: list(islice(lines, batch_size)), [])
+
+    if workers == 1:
+        for batch in batches:
+            yield from parse_batch(batch)
+        return
+
+    temporary_pool = pool is None
+    if temporary_pool:
+        pool = ParserPool()
+    executor = pool.executor(workers)
+    pending = deque()
+    try:
+        for batch in batches:
+            pending.append(executor.submit(parse_batch, batch))
+            # Keep our workers busy but do not read ahead any further
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    except concurrent.futures.BrokenExecutor:
+        # e.g. a worker process has been killed; start over next time
+        pool.shutdown()
+        raise
+    finally:
+        # The caller may stop early; the pool's other users do not need
+        # our remaining batches
+        for future in pending:
+            future.cancel()
+        if temporary_pool:
+            pool.shutdown()
+
+
+def parse_packets_from_file(
+    input_file: str,
+    output_file: str = None,
+    workers: int = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_errors: int = DEFAULT_MAX_ERRORS,
+    pool: ParserPool = None,
+):
+    """
+    Parses a capture file and (optionally) writes the parsed packets
+    to a JSON Lines file
+
+    Parameters
+    ==========
+    input_file: 'str'
+        path to the capture file (one raw APRS packet per line)
+    output_file: 'str'
+        optional path to the JSON Lines output file
+    workers: 'int'
+        number of worker processes, see iter_parsed_packets
+    batch_size: 'int'
+        number of lines per worker task
+    max_errors: 'int'
+        max number of unparseable lines which are listed in the result
+    pool: 'ParserPool'
+        optional pool which provides the worker processes
+
+    Returns
+    =======
+    summary: 'dict'
+        line/packet/error counters, packet counts per APRS format,
+        the list of unparseable lines and the processing time
+    """
+    summary = {
+        "lines": 0,
+        "parsed": 0,
+        "failed": 0,
+        "formats": {},
+        "errors": [],
+        "seconds": 0.0,
+    }
+    formats = summary["formats"]
+    errors = summary["errors"]
+    start_time = time.monotonic()
+
+    output = None
+    if output_file:
+        output = open(output_file, "w", encoding="utf-8")
+    try:
+        for line_number, line, packet, error in iter_parsed_packets(
+            input_file=input_file, workers=workers, batch_size=batch_size, pool=pool
+        ):
+            summary["lines"] += 1
+            if error:
+                summary["failed"] += 1
+                if len(errors) < max_errors:
+                    errors.append(
+                        {
+                            "line": line_number,
+                            "packet": line.decode("utf-8", errors="replace"),
+                            "error": error,
+                        }
+                    )
+                continue
+            summary["parsed"] += 1
+            packet_format = packet.get("format", "unknown")
+            formats[packet_format] = formats.get(packet_format, 0) + 1
+            if output:
+                output.write(json.dumps(packet, ensure_ascii=False, default=str))
+                output.write("\n")
+    finally:
+        if output:
+            output.close()
+
+    summary["seconds"] = time.monotonic() - start_time
+    logger.debug(
+        msg=f"Parsed {summary['parsed']} of {summary['lines']} packets from '{input_file}'"
+    )
+    return summary
@@ -0,0 +1,315 @@
+#
+# Robot Framework Keyword library wrapper for
+# https://github.com/rossengeorgiev/aprs-python
+# Capture recorder and replay for received APRS-IS traffic
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Capture file format: one packet per line, prefixed with the time (in
+# seconds, monotonic clock) since the start of the recording and a blank:
+#
+#   # aprs-capture started 2021-05-01T12:00:00+00:00
+#   0.000 DF1JSL-1>APRS,TCPIP*,qAC,T2TEST:>Test status
+#   0.153 DF1JSL-1>APRS,TCPIP*,qAC,T2TEST::WXBOT    :tomorrow{AB}
+#
+# Plain capture files (raw packets without a time prefix) are accepted for
+# replay as well; their packets are replayed as fast as possible
+#
+
+from collections import deque
+import datetime
+import threading
+import logging
+import time
+import os
+
+from .bulkparser import READ_BUFFER_SIZE
+from .lazyimports import lazy_import, load_lazy_module
+from .receiver import BoundedPacketQueue
+
+gzip = lazy_import("gzip")
+
+logger = logging.getLogger(__name__)
+
+# Rotation defaults: max (uncompressed) size of a capture file in bytes and
+# the number of rotated files which are kept (capture.txt.1, .2, ...)
+DEFAULT_CAPTURE_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_CAPTURE_BACKUP_COUNT = 5
+
+# Max time (in seconds) between two writes of the capture buffer
+CAPTURE_FLUSH_INTERVAL = 1.0
+
+# Number of buffered packets which wake up the writer before its interval ends
+CAPTURE_WAKEUP_LINES = 5000
+
+# Write buffer size for the capture file
+WRITE_BUFFER_SIZE = 256 * 1024
+
+# gzip files start with these bytes
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def open_capture_file(input_file: str):
+    """
+    Opens a (plain or gzip-compressed) capture file for reading
+    """
+    with open(input_file, "rb") as f:
+        compressed = f.read(2) == GZIP_MAGIC
+    if compressed:
+        return gzip.open(input_file, "rb")
+    return open(input_file, "rb", buffering=READ_BUFFER_SIZE)
+
+
+def split_capture_line(line: bytes):
+    """
+    Splits a capture line into its timestamp and the raw packet
+
+    Parameters
+    ==========
+    line: 'bytes'
+        line from a capture file (without CR/LF)
+
+    Returns
+    =======
+    timestamp: 'float'
+        seconds since the start of the recording or 'None' if the line
+        has no time prefix
+    packet: 'bytes'
+        raw APRS packet
+    """
+    prefix, separator, packet = line.partition(b" ")
+    # A raw packet's first blank comes after its header ('>' and ':')
+    if separator and b">" not in prefix:
+        try:
+            return float(prefix), packet
+        except ValueError:
+            pass
+    return None, line
+
+
+def iter_capture(input_file: str):
+    """
+    Streams the packets of a capture file. Empty lines and comments
+    (starting with '#') are skipped
+
+    Parameters
+    ==========
+    input_file: 'str'
+        path to the capture file; gzip-compressed files are detected
+        automatically
+
+    Returns
+    =======
+    timestamp: 'float'
+        seconds since the start of the recording (or 'None')
+    packet: 'bytes'
+        raw APRS packet (without CR/LF)
+    """
+    with open_capture_file(input_file) as f:
+        for line in f:
+            line = line.rstrip(b"\r\n")
+            if not line or line[0:1] == b"#":
+                continue
+            yield split_capture_line(line)
+
+
+class CaptureRecorder:
+    """
+    Records received packets to a rotating (optionally gzip-compressed)
+    capture file. 'record' only appends the packet and its timestamp to
+    an in-memory buffer; formatting, compression and file I/O happen in
+    a background writer thread, meaning that the receive loop is not
+    slowed down by the recording
+    """
+
+    def __init__(
+        self,
+        output_file: str,
+        max_bytes: int = DEFAULT_CAPTURE_MAX_BYTES,
+        backup_count: int = DEFAULT_CAPTURE_BACKUP_COUNT,
+        compress: bool = False,
+    ):
+        if not isinstance(max_bytes, int) or max_bytes < 1:
+            raise ValueError("Max capture file size needs to be a positive integer")
+        if not isinstance(backup_count, int) or backup_count < 0:
+            raise ValueError(
+                "Capture backup count needs to be zero or a positive integer"
+            )
+        self.output_file = output_file
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.compress = compress
+        self.packets = 0
+        self.bytes = 0
+        self.rotations = 0
+        self.error = None
+        self.__buffer = deque()
+        self.__file = None
+        self.__file_size = 0
+        self.__started_at = None
+        self.__wakeup = threading.Event()
+        self.__stopped = threading.Event()
+        self.__thread = None
+
+    def start(self):
+        self.__started_at = time.monotonic()
+        self.__open()
+        self.__thread = threading.Thread(
+            target=self.__run, name="CaptureRecorder", daemon=True
+        )
+        self.__thread.start()
+
+    def record(self, line: bytes):
+        # deque.append is atomic, meaning that the receiver does not need a lock
+        self.__buffer.append((time.monotonic(), line))
+        if len(self.__buffer) >= CAPTURE_WAKEUP_LINES:
+            self.__wakeup.set()
+
+    def stop(self):
+        """
+        Writes all buffered packets and closes the capture file
+        """
+        if not self.__thread:
+            return
+        self.__stopped.set()
+        self.__wakeup.set()
+        self.__thread.join()
+        self.__thread = None
+
+    def statistics(self):
+        return {
+            "output_file": self.output_file,
+            "packets": self.packets,
+            "bytes": self.bytes,
+            "rotations": self.rotations,
+            "buffered": len(self.__buffer),
+            "error": str(self.error) if self.error else None,
+        }
+
+    def __open(self):
+        if self.compress:
+            self.__file = gzip.open(self.output_file, "wb")
+        else:
+            self.__file = open(self.output_file, "wb", buffering=WRITE_BUFFER_SIZE)
+        started = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        header = f"# aprs-capture started {started}\n".encode()
+        self.__file.write(header)
+        self.__file_size = len(header)
+
+    def __rotate(self):
+        self.__file.close()
+        if self.backup_count:
+            for index in range(self.backup_count - 1, 0, -1):
+                source = f"{self.output_file}.{index}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.output_file}.{index + 1}")
+            os.replace(self.output_file, f"{self.output_file}.1")
+        self.rotations += 1
+        self.__open()
+
+    def __write_buffer(self):
+        buffer = self.__buffer
+        started_at = self.__started_at
+        while buffer:
+            timestamp, line = buffer.popleft()
+            if self.error:
+                continue
+            data = b"%.3f %s\n" % (timestamp - started_at, line)
+            try:
+                if self.__file_size + len(data) > self.max_bytes:
+                    self.__rotate()
+                self.__file.write(data)
+            except OSError as exp:
+                # Keep draining the buffer; the recording has failed anyway
+                logger.debug(msg=f"Cannot write to capture file: {exp}")
+                self.error = exp
+                continue
+            self.__file_size += len(data)
+            self.packets += 1
+            self.bytes += len(data)
+
+    def __run(self):
+        try:
+            while not self.__stopped.is_set():
+                self.__wakeup.wait(CAPTURE_FLUSH_INTERVAL)
+                self.__wakeup.clear()
+                self.__write_buffer()
+                if not self.error:
+                    self.__file.flush()
+            self.__write_buffer()
+        finally:
+            try:
+                self.__file.close()
+            except OSError as exp:
+                self.error = self.error or exp
+
+
+class CaptureReplayThread(threading.Thread):
+    """
+    Replays a capture file into a BoundedPacketQueue. It takes the place
+    of the background receiver, meaning that the receive keywords work
+    without any network connection. With 'speed' 1.0, the packets are
+    replayed with their original timing (2.0 = twice as fast); 'speed'
+    0 replays them as fast as the queue takes them
+    """
+
+    def __init__(
+        self, input_file: str, packet_queue: BoundedPacketQueue, speed: float = 1.0
+    ):
+        super().__init__(name="CaptureReplayThread", daemon=True)
+        if speed < 0:
+            raise ValueError("Replay speed needs to be zero or a positive number")
+        if not os.path.isfile(input_file):
+            raise ValueError(f"Capture file '{input_file}' does not exist")
+        self.input_file = input_file
+        self.packet_queue = packet_queue
+        self.speed = speed
+        self.packets = 0
+        self.error = None
+        self.__stop_event = threading.Event()
+
+    def start(self):
+        # The capture file is opened within the thread
+        load_lazy_module(gzip)
+        super().start()
+
+    def run(self):
+        started_at = time.monotonic()
+        first_timestamp = None
+        try:
+            for timestamp, line in iter_capture(self.input_file):
+                if self.__stop_event.is_set():
+                    return
+                if self.speed and timestamp is not None:
+                    if first_timestamp is None:
+                        first_timestamp = timestamp
+                    due = started_at + (timestamp - first_timestamp) / self.speed
+                    delay = due - time.monotonic()
+                    if delay > 0 and self.__stop_event.wait(delay):
+                        return
+                if not self.packet_queue.put(line):
+                    return
+                self.packets += 1
+            self.error = EOFError(f"End of capture file '{self.input_file}' reached")
+        except OSError as exp:
+            self.error = exp
+        finally:
+            # wake up everyone who is still waiting for data from us
+            self.packet_queue.close()
+
+    def stop(self, timeout: float = None):
+        self.__stop_event.set()
+        self.packet_queue.close()
+        self.join(timeout)
@@ -0,0 +1,217 @@
+#
+# Robot Framework Keyword library wrapper for
+# https://github.com/rossengeorgiev/aprs-python
+# Client-side filter for received APRS packets
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+import logging
+import re
+
+from .headers import locate_header, extract_addressee
+
+logger = logging.getLogger(__name__)
+
+# APRS data type identifiers (first byte of the packet body) for the formats
+# that aprslib returns. 'None' means that the format can show up with any
+# data type identifier, meaning that it cannot be pre-screened
+APRS_FORMAT_TYPE_IDS = {
+    "message": b":",
+    "bulletin": b":",
+    "group-bulletin": b":",
+    "announcement": b":",
+    "telemetry-message": b":",
+    "status": b">",
+    "mic-e": b"`'",
+    "object": b";",
+    "uncompressed": b"!=/@",
+    "compressed": b"!=/@",
+    "wx": b"_",
+    "thirdparty": b"}",
+    "user-defined": b"{",
+    "invalid": b",",
+    "beacon": None,
+}
+
+# aprslib also decodes position reports whose body contains a '!' within
+# its first 40 characters, regardless of the data type identifier
+POSITION_FORMATS = ("uncompressed", "compressed")
+POSITION_TYPE_ID_WINDOW = 40
+
+
+class ClientFilter:
+    """
+    Compiled client-side filter for raw APRS-IS lines. 'prescreen'
+    checks the raw bytes (source callsign, addressee, data type
+    identifier, regex) without decoding the packet, meaning that only
+    the survivors need to be parsed. 'accept' performs the exact format
+    check on the parsed packet. Callsigns ending with '*' are prefixes.
+    """
+
+    def __init__(
+        self,
+        sources: list = None,
+        addressees: list = None,
+        addressee_pattern: str = None,
+        formats: list = None,
+        pattern: str = None,
+    ):
+        if not any((sources, addressees, addressee_pattern, formats, pattern)):
+            raise ValueError("No client filter criteria have been specified")
+
+        self.__sources, self.__source_prefixes = self.__compile_callsigns(sources)
+        self.__addressees, self.__addressee_prefixes = self.__compile_callsigns(
+            addressees
+        )
+        # Addressees are case-insensitive, just like the callsigns
+        self.__addressee_pattern = self.__compile_pattern(
+            addressee_pattern, flags=re.IGNORECASE
+        )
+        self.__pattern = self.__compile_pattern(pattern)
+        self.__check_addressee = bool(
+            self.__addressees or self.__addressee_prefixes or self.__addressee_pattern
+        )
+
+        self.formats = None
+        self.__type_ids = None
+        self.__position_formats = False
+        if formats:
+            unknown = [
+                packet_format
+                for packet_format in formats
+                if packet_format not in APRS_FORMAT_TYPE_IDS
+            ]
+            if unknown:
+                raise ValueError(
+                    f"Unknown APRS format(s) {', '.join(unknown)}; valid values: {', '.join(APRS_FORMAT_TYPE_IDS)}"
+                )
+            self.formats = frozenset(formats)
+            type_ids = [
+                APRS_FORMAT_TYPE_IDS[packet_format] for packet_format in formats
+            ]
+            if None not in type_ids:
+                self.__type_ids = frozenset(b"".join(type_ids))
+                self.__position_formats = not self.formats.isdisjoint(POSITION_FORMATS)
+
+        self.checked = 0
+        self.rejected_before_parse = 0
+        self.rejected_after_parse = 0
+
+    @staticmethod
+    def __compile_callsigns(callsigns: list):
+        exact = set()
+        prefixes = []
+        for callsign in callsigns or []:
+            callsign = str(callsign).strip().upper().encode("utf-8")
+            if not callsign:
+                raise ValueError("Empty callsign in client filter")
+            if callsign.endswith(b"*"):
+                prefixes.append(callsign[:-1])
+            else:
+                exact.add(callsign)
+        return frozenset(exact), tuple(prefixes)
+
+    @staticmethod
+    def __compile_pattern(pattern: str, flags: int = 0):
+        if not pattern:
+            return None
+        try:
+            return re.compile(pattern.encode("utf-8"), flags)
+        except re.error as exp:
+            raise ValueError(f"Invalid client filter pattern '{pattern}': {exp}")
+
+    @staticmethod
+    def __matches(value: bytes, exact: frozenset, prefixes: tuple):
+        return value in exact or (prefixes and value.startswith(prefixes))
+
+    def prescreen(self, line: bytes):
+        """
+        Checks a raw APRS-IS line against the filter without parsing it
+
+        Parameters
+        ==========
+        line: 'bytes'
+            raw APRS packet (without CR/LF)
+
+        Returns
+        =======
+        passed: 'bool'
+            False if the packet can be discarded
+        """
+        self.checked += 1
+        if self.__passes(line):
+            return True
+        self.rejected_before_parse += 1
+        return False
+
+    def __passes(self, line: bytes):
+        if isinstance(line, str):
+            line = line.encode("utf-8")
+
+        location = locate_header(line)
+        if not location:
+            return False
+        source_end, header_end = location
+        body_start = header_end + 1
+
+        if self.__sources or self.__source_prefixes:
+            source = line[:source_end].upper()
+            if not self.__matches(source, self.__sources, self.__source_prefixes):
+                return False
+
+        if self.__type_ids is not None:
+            type_id = line[body_start] if body_start < len(line) else None
+            if type_id not in self.__type_ids:
+                if not self.__position_formats:
+                    return False
+                window_end = body_start + 1 + POSITION_TYPE_ID_WINDOW
+                if line.find(b"!", body_start + 1, window_end) < 0:
+                    return False
+
+        if self.__check_addressee:
+            addressee = extract_addressee(line, body_start)
+            if addressee is None:
+                return False
+            addressee = addressee.rstrip(b" ")
+            if (self.__addressees or self.__addressee_prefixes) and not self.__matches(
+                addressee.upper(), self.__addressees, self.__addressee_prefixes
+            ):
+                return False
+            if self.__addressee_pattern and not self.__addressee_pattern.search(
+                addressee
+            ):
+                return False
+
+        if self.__pattern and not self.__pattern.search(line):
+            return False
+        return True
+
+    def accept(self, packet: dict):
+        """
+        Performs the checks which require a parsed packet (currently
+        the exact APRS format)
+        """
+        if self.formats and packet.get("format") not in self.formats:
+            self.rejected_after_parse += 1
+            return False
+        return True
+
+    def statistics(self):
+        return {
+            "checked": self.checked,
+            "rejected_before_parse": self.rejected_before_parse,
+            "rejected_after_parse": self.rejected_after_parse,
+        }
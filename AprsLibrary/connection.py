@@ -0,0 +1,308 @@
+#
+# Robot Framework Keyword library wrapper for
+# https://github.com/rossengeorgiev/aprs-python
+# Named APRS-IS sessions and connection pool
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+from collections import deque
+import threading
+import logging
+import random
+import select
+import socket
+import time
+
+from .lazyimports import lazy_import
+from .metrics import METRICS
+from .sender import TokenBucket
+
+aprslib = lazy_import("aprslib")
+
+logger = logging.getLogger(__name__)
+
+# Alias which is used if the user does not specify one
+DEFAULT_ALIAS = "default"
+
+# Max number of received packets which are kept for the next receive
+# keyword after they were read (but not consumed) by another keyword
+MAX_PUSHBACK_PACKETS = 1000
+
+# Backoff settings (in seconds) for reconnect attempts. The actual delay
+# is randomized between 50% and 100% of the current backoff value
+RECONNECT_MIN_DELAY = 1.0
+RECONNECT_MAX_DELAY = 60.0
+
+
+class AprsIsSession:
+    """
+    Everything that belongs to a single APRS-IS connection: the
+    aprslib.IS object, its optional background receiver and sender
+    threads, the rate limiter for all packets which are sent through
+    it and the packets which were read but not consumed yet.
+    The session supervises its connection: 'reconnect' re-establishes
+    a dropped connection with a jittered exponential backoff and fails
+    over to the next server from the list of 'servers'
+    """
+
+    def __init__(
+        self,
+        alias: str,
+        ais: object,
+        servers: list = None,
+        auto_reconnect: bool = True,
+        max_reconnect_attempts: int = 0,
+    ):
+        self.alias = alias
+        self.ais = ais
+        self.receiver = None
+        self.sender = None
+        self.recorder = None
+        self.dispatcher = None
+        self.send_limiter = None
+        self.pushback = deque(maxlen=MAX_PUSHBACK_PACKETS)
+        self.created_at = time.monotonic()
+        self.connected_at = self.created_at
+        self.auto_reconnect = auto_reconnect
+        self.max_reconnect_attempts = max_reconnect_attempts
+        self.reconnects = 0
+        self.failed_reconnect_attempts = 0
+        self.downtime = 0.0
+
+        # The server that we are connected to always comes first
+        self.servers = [ais.server]
+        for server in servers or []:
+            if server not in self.servers:
+                self.servers.append(server)
+
+        self.__reconnect_lock = threading.Lock()
+        self.__closed = threading.Event()
+
+    def reconnect(self):
+        """
+        Re-establishes the APRS-IS connection. The servers are tried in
+        turn (starting with the current one), with a jittered exponential
+        backoff between the attempts. The APRS-IS filter is re-applied
+        as part of the login. Raises a ConnectionError if the session has
+        been closed or the max number of attempts has been exceeded
+        """
+        with self.__reconnect_lock:
+            # Another thread may have reconnected in the meantime
+            if self.is_alive():
+                return
+            self.ais.close()
+            lost_at = time.monotonic()
+            backoff = RECONNECT_MIN_DELAY
+            server_index = self.servers.index(self.ais.server)
+            attempt = 0
+            while not self.__closed.is_set():
+                host, port = self.servers[server_index]
+                self.ais.set_server(host, port)
+                try:
+                    # aprslib sends our filter along with the login
+                    self.ais.connect(blocking=False)
+                    break
+                except (aprslib.ConnectionError, aprslib.LoginError, OSError) as exp:
+                    self.ais.close()
+                    attempt += 1
+                    self.failed_reconnect_attempts += 1
+                    METRICS.inc(
+                        "aprs_reconnect_failures_total", labels=f'alias="{self.alias}"'
+                    )
+                    logger.debug(
+                        msg=f"Reconnect to {host}:{port} failed ({exp}); attempt {attempt}"
+                    )
+                    if (
+                        self.max_reconnect_attempts
+                        and attempt >= self.max_reconnect_attempts
+                    ):
+                        self.downtime += time.monotonic() - lost_at
+                        raise ConnectionError(
+                            f"Cannot reconnect to APRS-IS after {attempt} attempts"
+                        )
+                # Fail over to the next server and wait a bit
+                server_index = (server_index + 1) % len(self.servers)
+                self.__closed.wait(random.uniform(backoff / 2, backoff))
+                backoff = min(backoff * 2, RECONNECT_MAX_DELAY)
+
+            now = time.monotonic()
+            self.downtime += now - lost_at
+            if self.__closed.is_set():
+                raise ConnectionError("APRS-IS connection has been closed")
+            self.reconnects += 1
+            self.connected_at = now
+            METRICS.inc("aprs_reconnects_total", labels=f'alias="{self.alias}"')
+            logger.debug(
+                msg=f"Reconnected to APRS-IS server {host}:{port} (alias '{self.alias}')"
+            )
+
+    def set_send_rate(self, rate: float, burst: int = 1):
+        """
+        Limits all packets which are sent through this session (directly
+        or via the background sender) to 'rate' packets per second, with
+        at most 'burst' packets at once
+        """
+        if self.send_limiter:
+            self.send_limiter.configure(rate=rate, burst=burst)
+        else:
+            self.send_limiter = TokenBucket(rate=rate, burst=burst)
+        return self.send_limiter
+
+    def set_recorder(self, recorder: object):
+        """
+        Starts (or with 'None': stops) recording the received lines to a
+        capture file. This also applies to a running background receiver
+        """
+        self.recorder = recorder
+        if self.receiver:
+            self.receiver.reader.recorder = recorder
+
+    def statistics(self):
+        now = time.monotonic()
+        return {
+            "alias": self.alias,
+            "server": "%s:%s" % self.ais.server,
+            "reconnects": self.reconnects,
+            "failed_reconnect_attempts": self.failed_reconnect_attempts,
+            "downtime": self.downtime,
+            "uptime": now - self.connected_at,
+        }
+
+    def close(self, send_timeout: float = None):
+        self.__closed.set()
+        if self.recorder:
+            recorder = self.recorder
+            self.set_recorder(None)
+            recorder.stop()
+        if self.sender:
+            self.sender.stop(timeout=send_timeout)
+            self.sender = None
+        if self.receiver:
+            self.receiver.stop()
+            self.receiver = None
+        if self.ais:
+            self.ais.close()
+
+    def is_alive(self):
+        """
+        Checks if the session's socket is still connected. A socket which
+        is readable but does not return any data has been closed by the
+        server
+        """
+        if not self.ais or not self.ais._connected or not self.ais.sock:
+            return False
+        sock = self.ais.sock
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+            if readable:
+                return sock.recv(1, socket.MSG_PEEK) != b""
+        except (BlockingIOError, socket.timeout, InterruptedError):
+            return True
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def health(self):
+        peer = None
+        alive = self.is_alive()
+        if alive:
+            try:
+                peer = self.ais.sock.getpeername()
+                # Unix domain sockets (APRS-IS broker) have a path as address
+                if isinstance(peer, tuple):
+                    peer = "%s:%s" % peer[:2]
+            except OSError:
+                alive = False
+        health = {
+            "alias": self.alias,
+            "alive": alive,
+            "server": "%s:%s" % self.ais.server,
+            "peer": peer,
+            "filter": self.ais.filter,
+            "age": time.monotonic() - self.created_at,
+            "pushback": len(self.pushback),
+            "receiver_alive": None,
+            "receive_queue_size": None,
+            "send_queue_pending": None,
+        }
+        if self.receiver:
+            health["receiver_alive"] = self.receiver.is_alive()
+            health["receive_queue_size"] = len(self.receiver.packet_queue)
+        if self.sender:
+            health["send_queue_pending"] = self.sender.pending
+        return health
+
+
+class AprsIsConnectionPool:
+    """
+    Thread-safe registry of named APRS-IS sessions. One pool instance
+    is shared by all library instances of the current process, meaning
+    that open sessions can be reused across suites
+    """
+
+    def __init__(self):
+        self.__sessions = {}
+        self.__lock = threading.Lock()
+
+    def __contains__(self, alias: str):
+        return alias in self.__sessions
+
+    def get(self, alias: str):
+        return self.__sessions.get(alias)
+
+    def add(self, session: AprsIsSession):
+        with self.__lock:
+            if session.alias in self.__sessions:
+                raise ValueError(
+                    f"An APRS-IS connection with alias '{session.alias}' is still open; please close it first"
+                )
+            self.__sessions[session.alias] = session
+
+    def remove(self, alias: str):
+        with self.__lock:
+            return self.__sessions.pop(alias, None)
+
+    def aliases(self):
+        with self.__lock:
+            return list(self.__sessions)
+
+
+# Connection pool which is shared by all library instances
+CONNECTION_POOL = AprsIsConnectionPool()
+
+
+def collect_connection_gauges():
+    """
+    Returns the current queue depths of all open sessions as gauges
+    """
+    aliases = CONNECTION_POOL.aliases()
+    gauges = [("aprs_connections", "", len(aliases))]
+    for alias in aliases:
+        session = CONNECTION_POOL.get(alias)
+        if not session:
+            continue
+        labels = f'alias="{alias}"'
+        gauges.append(("aprs_pushback_size", labels, len(session.pushback)))
+        if session.receiver:
+            packet_queue = session.receiver.packet_queue
+            gauges.append(("aprs_receive_queue_size", labels, len(packet_queue)))
+            gauges.append(("aprs_receive_queue_dropped", labels, packet_queue.dropped))
+        if session.sender:
+            gauges.append(("aprs_send_queue_pending", labels, session.sender.pending))
+    return gauges
+
+
+METRICS.register_gauges(collect_connection_gauges)
@@ -0,0 +1,233 @@
+#
+# Robot Framework Keyword library wrapper for
+# https://github.com/rossengeorgiev/aprs-python
+# Packet dispatcher which routes received packets to waiting keywords
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+from collections import OrderedDict, deque
+import threading
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Packet fields that waiters can match on, most selective first. A waiter
+# is indexed by the first of these fields that it specifies
+DISPATCH_FIELDS = ("ackMsgNo", "msgNo", "addresse", "from", "format")
+
+# Fields whose values are compared case-insensitively (callsigns)
+CALLSIGN_FIELDS = ("from", "addresse")
+
+# Backlog defaults: max number of packets per key, max number of keys and
+# the time (in seconds) after which backlog packets can no longer be claimed
+DEFAULT_BACKLOG_SIZE = 100
+DEFAULT_BACKLOG_KEYS = 1000
+DEFAULT_BACKLOG_TTL = 300.0
+
+
+def normalize_value(field: str, value):
+    value = str(value)
+    return value.upper() if field in CALLSIGN_FIELDS else value
+
+
+def packet_keys(packet: dict):
+    """
+    Returns the (field, value) keys of a decoded packet for all dispatch
+    fields which are present in the packet
+    """
+    return [
+        (field, normalize_value(field, packet[field]))
+        for field in DISPATCH_FIELDS
+        if packet.get(field) is not None
+    ]
+
+
+class PacketWaiter:
+    """
+    A pending 'Wait For APRS Packet Matching' request
+    """
+
+    __slots__ = ("criteria", "key", "packet")
+
+    def __init__(self, criteria: dict):
+        self.criteria = {
+            field: normalize_value(field, value) for field, value in criteria.items()
+        }
+        # The waiter is indexed by its most selective criterion
+        field = next(field for field in DISPATCH_FIELDS if field in self.criteria)
+        self.key = (field, self.criteria[field])
+        self.packet = None
+
+    def matches(self, packet: dict):
+        for field, value in self.criteria.items():
+            packet_value = packet.get(field)
+            if packet_value is None or normalize_value(field, packet_value) != value:
+                return False
+        return True
+
+
+class PacketDispatcher:
+    """
+    Routes decoded packets to waiters via a hash index on the dispatch
+    fields (source, addressee, format, msgNo, ackMsgNo); finding the
+    waiters for a packet does not depend on the number of waiters.
+    Packets which no waiter wants are kept in a bounded backlog (per
+    key, with a TTL), meaning that a later waiter can still claim them
+    """
+
+    def __init__(
+        self,
+        backlog_size: int = DEFAULT_BACKLOG_SIZE,
+        backlog_keys: int = DEFAULT_BACKLOG_KEYS,
+        backlog_ttl: float = DEFAULT_BACKLOG_TTL,
+    ):
+        self.backlog_size = backlog_size
+        self.backlog_keys = backlog_keys
+        self.backlog_ttl = backlog_ttl
+        self.dispatched = 0
+        self.delivered = 0
+        self.backlogged = 0
+        self.claimed = 0
+        # (field, value) -> list of waiters
+        self.__waiters = {}
+        # (field, value) -> deque of [received_at, packet, claimed] entries,
+        # least recently used keys first. A packet is stored under each of
+        # its keys; the shared entry makes sure that it is claimed only once
+        self.__backlog = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def wait(self, criteria: dict, packets):
+        """
+        Returns the first packet which matches all 'criteria'. The backlog
+        is checked first; after that, the packets from 'packets' are
+        dispatched until one of them matches
+
+        Parameters
+        ==========
+        criteria: 'dict'
+            dispatch field / value pairs, e.g. {'from': 'DF1JSL-1'}
+        packets: 'iterable'
+            decoded packets; the iterable is expected to end when the
+            caller's timeout has been reached
+
+        Returns
+        =======
+        packet: 'dict'
+            matching packet or 'None' if 'packets' has ended without a match
+        """
+        if not criteria:
+            raise ValueError("Please specify at least one criterion")
+        unknown = set(criteria) - set(DISPATCH_FIELDS)
+        if unknown:
+            raise ValueError(f"Cannot match on field(s) {', '.join(sorted(unknown))}")
+
+        waiter = PacketWaiter(criteria)
+        with self.__lock:
+            packet = self.__claim_from_backlog(waiter)
+            if packet is not None:
+                return packet
+            self.__waiters.setdefault(waiter.key, []).append(waiter)
+        try:
+            for packet in packets:
+                self.dispatch(packet)
+                if waiter.packet is not None:
+                    break
+        finally:
+            with self.__lock:
+                waiters = self.__waiters.get(waiter.key)
+                if waiters is not None:
+                    waiters.remove(waiter)
+                    if not waiters:
+                        del self.__waiters[waiter.key]
+        return waiter.packet
+
+    def dispatch(self, packet: dict):
+        """
+        Hands a decoded packet to the first waiter that it matches or -
+        if there is none - adds it to the backlog
+
+        Returns
+        =======
+        delivered: 'bool'
+            True if a waiter has taken the packet
+        """
+        keys = packet_keys(packet)
+        with self.__lock:
+            self.dispatched += 1
+            for key in keys:
+                for waiter in self.__waiters.get(key, ()):
+                    if waiter.packet is None and waiter.matches(packet):
+                        waiter.packet = packet
+                        self.delivered += 1
+                        return True
+            self.__add_to_backlog(packet, keys)
+            return False
+
+    def clear(self):
+        with self.__lock:
+            self.__backlog.clear()
+
+    def statistics(self):
+        with self.__lock:
+            now = time.monotonic()
+            backlog_packets = {
+                id(entry)
+                for entries in self.__backlog.values()
+                for entry in entries
+                if not entry[2] and now - entry[0] < self.backlog_ttl
+            }
+            return {
+                "waiters": sum(len(waiters) for waiters in self.__waiters.values()),
+                "backlog_keys": len(self.__backlog),
+                "backlog_packets": len(backlog_packets),
+                "dispatched": self.dispatched,
+                "delivered": self.delivered,
+                "backlogged": self.backlogged,
+                "claimed": self.claimed,
+            }
+
+    def __add_to_backlog(self, packet: dict, keys: list):
+        if not keys:
+            return
+        entry = [time.monotonic(), packet, False]
+        backlog = self.__backlog
+        for key in keys:
+            entries = backlog.get(key)
+            if entries is None:
+                entries = backlog[key] = deque(maxlen=self.backlog_size)
+            else:
+                backlog.move_to_end(key)
+            entries.append(entry)
+        while len(backlog) > self.backlog_keys:
+            backlog.popitem(last=False)
+        self.backlogged += 1
+
+    def __claim_from_backlog(self, waiter: PacketWaiter):
+        entries = self.__backlog.get(waiter.key)
+        if not entries:
+            return None
+        expired_at = time.monotonic() - self.backlog_ttl
+        # Drop claimed and expired packets from the front; the entries are
+        # kept in the order of their arrival
+        while entries and (entries[0][2] or entries[0][0] <= expired_at):
+            entries.popleft()
+        for entry in entries:
+            if not entry[2] and entry[0] > expired_at and waiter.matches(entry[1]):
+                entry[2] = True
+                self.claimed += 1
+                return entry[1]
+        return None
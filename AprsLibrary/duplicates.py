@@ -0,0 +1,127 @@
+#
+# Robot Framework Keyword library wrapper for
+# https://github.com/rossengeorgiev/aprs-python
+# Duplicate packet suppression for received APRS packets
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+from collections import OrderedDict
+import threading
+import time
+
+from .headers import locate_header
+
+
+def duplicate_key(line: bytes):
+    """
+    Returns the key which identifies copies of the same packet: the
+    (upper case) source callsign plus the payload. The path is not part
+    of the key as APRS-IS delivers copies via different igates/digis.
+    Trailing blanks are removed from the payload
+
+    Parameters
+    ==========
+    line: 'bytes' or 'str'
+        raw APRS packet
+
+    Returns
+    =======
+    key: 'tuple'
+        (source, payload) or 'None' if the packet has no valid header
+    """
+    if isinstance(line, str):
+        line = line.encode("utf-8")
+    location = locate_header(line)
+    if not location:
+        return None
+    source_end, header_end = location
+    return line[:source_end].upper(), line[header_end + 1 :].rstrip(b" ")
+
+
+class DuplicateFilter:
+    """
+    Time-windowed cache of recently received packets. A packet whose
+    key has been seen within the last 'ttl' seconds is a duplicate.
+    The cache holds at most 'maxsize' keys; lookups, inserts and the
+    expiry of old keys are O(1) (amortized)
+    """
+
+    def __init__(self, ttl: float, maxsize: int):
+        if ttl <= 0:
+            raise ValueError("Duplicate TTL needs to be a positive value")
+        if not isinstance(maxsize, int) or maxsize < 1:
+            raise ValueError("Duplicate cache size needs to be a positive integer")
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.checked = 0
+        self.suppressed = 0
+        self.evicted = 0
+        # key -> time of first occurrence, oldest entries first
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def is_duplicate(self, line: bytes):
+        """
+        Checks whether a raw packet is a copy of a packet that has been
+        seen within the TTL window. New packets are added to the cache
+
+        Parameters
+        ==========
+        line: 'bytes' or 'str'
+            raw APRS packet
+
+        Returns
+        =======
+        duplicate: 'bool'
+            True if the packet is to be suppressed
+        """
+        key = duplicate_key(line)
+        if key is None:
+            return False
+        now = time.monotonic()
+        with self.__lock:
+            self.checked += 1
+            entries = self.__entries
+
+            # Expire old keys from the front; the entries are kept in the
+            # order of their first occurrence
+            expired_at = now - self.ttl
+            while entries:
+                oldest_key = next(iter(entries))
+                if entries[oldest_key] > expired_at:
+                    break
+                del entries[oldest_key]
+
+            if key in entries:
+                self.suppressed += 1
+                return True
+
+            entries[key] = now
+            if len(entries) > self.maxsize:
+                entries.popitem(last=False)
+                self.evicted += 1
+            return False
+
+    def statistics(self):
+        with self.__lock:
+            return {
+                "size": len(self.__entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "checked": self.checked,
+                "suppressed": self.suppressed,
+                "evicted": self.evicted,
+            }
@@ -0,0 +1,130 @@
+#
+# Robot Framework Keyword library wrapper for
+# https://github.com/rossengeorgiev/aprs-python
+# Header extraction for raw APRS packets (without full parsing)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+import re
+
+# Fields which can be extracted from a raw packet without parsing it.
+# The field names are identical to the ones that aprslib uses
+HEADER_FIELDS = ("from", "to", "path", "via", "addresse")
+
+# Max number of bytes which are inspected for finding the end of the header
+# (source + destination + up to 8 digipeaters and the q construct, plus
+# the addressee of a message)
+MAX_HEADER_LENGTH = 256
+
+# Addressee of an APRS message (':ADDRESSEE:text'); bulletins and
+# announcements ('BLN...') do not have an addressee in aprslib's terms
+ADDRESSEE_LENGTH = 9
+ADDRESSEE_PATTERN = re.compile(rb"[A-Za-z0-9_ \-]{9}")
+
+
+def locate_header(line: bytes):
+    """
+    Finds the header of a raw APRS packet ('SOURCE>DEST,PATH:body')
+
+    Parameters
+    ==========
+    line: 'bytes'
+        raw APRS packet
+
+    Returns
+    =======
+    location: 'tuple'
+        (index of '>', index of ':') or 'None' if there is no header
+    """
+    header_end = line.find(b":")
+    if header_end < 0:
+        return None
+    source_end = line.find(b">", 0, header_end)
+    if source_end < 1:
+        return None
+    return source_end, header_end
+
+
+def extract_addressee(line: bytes, body_start: int):
+    """
+    Returns the (blank-padded) addressee of a message body starting at
+    'body_start' or 'None' if the body does not look like a message
+    """
+    addressee_end = body_start + 1 + ADDRESSEE_LENGTH
+    if (
+        line[body_start : body_start + 1] != b":"
+        or line[addressee_end : addressee_end + 1] != b":"
+    ):
+        return None
+    return line[body_start + 1 : addressee_end]
+
+
+def extract_header(aprs_packet: object):
+    """
+    Extracts source, destination, path and (for messages) the addressee
+    from a raw APRS packet without decoding the whole packet. Only the
+    header is copied; the body is never touched beyond the addressee.
+    Other than aprslib, this function does not validate the callsigns
+
+    Parameters
+    ==========
+    aprs_packet: 'bytes', 'memoryview' or 'str'
+        raw APRS packet
+
+    Returns
+    =======
+    header: 'dict'
+        'from', 'to', 'path' and 'via' plus 'addresse' if the packet
+        is an APRS message
+    """
+    if isinstance(aprs_packet, memoryview):
+        line = aprs_packet[:MAX_HEADER_LENGTH].tobytes()
+    elif isinstance(aprs_packet, str):
+        line = aprs_packet[:MAX_HEADER_LENGTH].encode("utf-8")
+    else:
+        line = aprs_packet
+
+    location = locate_header(line)
+    if not location:
+        raise ValueError("This APRS packet is invalid")
+    source_end, header_end = location
+
+    hops = line[source_end + 1 : header_end].decode("utf-8", errors="replace")
+    hops = hops.split(",")
+    if not hops[0]:
+        raise ValueError("This APRS packet is invalid")
+    path = hops[1:]
+
+    # The igate follows the q construct (e.g. 'qAR') at the end of the path
+    via = ""
+    if len(path) >= 2 and len(path[-2]) == 3 and path[-2].startswith("q"):
+        via = path[-1]
+
+    header = {
+        "from": line[:source_end].decode("utf-8", errors="replace"),
+        "to": hops[0],
+        "path": path,
+        "via": via,
+    }
+
+    addressee = extract_addressee(line, header_end + 1)
+    if (
+        addressee is not None
+        and not addressee.startswith(b"BLN")
+        and ADDRESSEE_PATTERN.fullmatch(addressee)
+    ):
+        header["addresse"] = addressee.decode("ascii").rstrip(" ")
+    return header
@@ -0,0 +1,92 @@
+#
+# Robot Framework Keyword library wrapper for
+# https://github.com/rossengeorgiev/aprs-python
+# Deferred imports of aprslib, Robot Framework utilities and optional library modules
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+import importlib.util
+import sys
+import threading
+
+# importlib's LazyLoader is not thread-safe before Python 3.12: two threads
+# which access a module for the first time may both execute it. Creating
+# and loading lazy modules is therefore serialized (re-entrant, as loading
+# a module may create further lazy modules)
+_lazy_lock = threading.RLock()
+
+
+def lazy_import(name: str):
+    """
+    Returns a module object which is only loaded (executed) when one of
+    its attributes is accessed for the first time. Modules which have
+    already been imported are returned as they are
+
+    Parameters
+    ==========
+    name: 'str'
+        absolute module name, e.g. 'aprslib'
+
+    Returns
+    =======
+    module: 'module'
+        the (lazily loaded) module
+    """
+    with _lazy_lock:
+        module = sys.modules.get(name)
+        if module is not None:
+            return module
+        spec = importlib.util.find_spec(name)
+        if spec is None:
+            raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+        loader = importlib.util.LazyLoader(spec.loader)
+        spec.loader = loader
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        loader.exec_module(module)
+        return module
+
+
+def load_lazy_module(module):
+    """
+    Loads a module from 'lazy_import' (if this has not happened yet).
+    Call this before starting threads which use the module, so that
+    they never trigger the (unsynchronized) lazy load themselves
+
+    Parameters
+    ==========
+    module: 'module'
+        module from 'lazy_import'
+
+    Returns
+    =======
+    module: 'module'
+        the loaded module
+    """
+    with _lazy_lock:
+        # Accessing any attribute executes a lazy module
+        getattr(module, "__name__")
+    return module
+
+
+def timestr_to_secs(timestr):
+    """
+    Robot Framework's time string conversion ('1 min 30s' = 90.0);
+    Robot Framework is imported on first use
+    """
+    from robot.utils import timestr_to_secs as convert
+
+    return convert(timestr)
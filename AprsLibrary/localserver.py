@@ -0,0 +1,391 @@
+#
+# Robot Framework Keyword library wrapper for
+# https://github.com/rossengeorgiev/aprs-python
+# Local APRS-IS stand-in server for offline (load) testing
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+from collections import deque
+import socketserver
+import threading
+import logging
+import socket
+import time
+
+from .lazyimports import lazy_import, load_lazy_module
+from .capture import iter_capture
+from .clientfilter import ClientFilter
+from .sender import TokenBucket, MAX_WRITE_SIZE
+
+aprslib = lazy_import("aprslib")
+
+logger = logging.getLogger(__name__)
+
+# Name which the server reports in its banner and login response
+LOCAL_SERVER_NAME = "LOCAL-APRSIS"
+
+# Time (in seconds) between the login response and the first packet. aprslib
+# reads the login response with a single recv call, meaning that packets
+# which arrive together with the response would get lost
+LOGIN_GRACE_PERIOD = 0.2
+
+# Max time (in seconds) that a client has for sending its login line
+LOGIN_TIMEOUT = 10.0
+
+# Max number of pending connections (socket listen backlog)
+LISTEN_BACKLOG = 1024
+
+# Max number of packets from clients which are kept for inspection
+MAX_RECEIVED_PACKETS = 10000
+
+# APRS-IS type filter ('t/...') characters and the aprslib formats they stand for
+APRSIS_TYPE_FILTER_FORMATS = {
+    "m": ["message"],
+    "p": ["uncompressed", "compressed", "mic-e"],
+    "o": ["object"],
+    "s": ["status"],
+    "w": ["wx"],
+}
+
+
+def compile_aprsis_filter(aprsis_filter: str):
+    """
+    Translates the basic APRS-IS server filters into client filters.
+    Supported are budlist ('b/'), prefix ('p/'), group message ('g/')
+    and type ('t/') filters. Other filters are ignored
+
+    Parameters
+    ==========
+    aprsis_filter: 'str'
+        APRS-IS filter string, e.g. 'b/DF1JSL* t/m'
+
+    Returns
+    =======
+    client_filters: 'list'
+        list of ClientFilter objects (a packet passes if any of them
+        matches) or 'None' if all packets are to be delivered
+    """
+    client_filters = []
+    for term in (aprsis_filter or "").split():
+        kind, _, values = term.partition("/")
+        values = [value for value in values.split("/") if value]
+        if not values:
+            continue
+        kind = kind.lower()
+        if kind == "b":
+            client_filters.append(ClientFilter(sources=values))
+        elif kind == "p":
+            client_filters.append(
+                ClientFilter(sources=[f"{value}*" for value in values])
+            )
+        elif kind == "g":
+            client_filters.append(ClientFilter(addressees=values))
+        elif kind == "t":
+            formats = []
+            for type_char in values[0].lower():
+                formats.extend(APRSIS_TYPE_FILTER_FORMATS.get(type_char, []))
+            if formats:
+                client_filters.append(ClientFilter(formats=formats))
+        else:
+            logger.debug(msg=f"Ignoring unsupported APRS-IS filter '{term}'")
+    return client_filters or None
+
+
+class LocalAprsIsClient:
+    """
+    A client which is connected to the local APRS-IS server
+    """
+
+    def __init__(self, sock: socket.socket, address: tuple):
+        self.sock = sock
+        self.address = address
+        self.callsign = None
+        self.verified = False
+        self.filters = None
+        self.__lock = threading.Lock()
+
+    def set_filter(self, aprsis_filter: str):
+        self.filters = compile_aprsis_filter(aprsis_filter)
+
+    def wants(self, line: bytes):
+        if not self.filters:
+            return True
+        return any(client_filter.prescreen(line) for client_filter in self.filters)
+
+    def send(self, payload: bytes):
+        with self.__lock:
+            self.sock.sendall(payload)
+
+
+class LocalAprsIsRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        self.server.aprsis_server.handle_client(self.request, self.client_address)
+
+
+class LocalAprsIsTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    # Load tests connect hundreds of clients at once
+    request_queue_size = LISTEN_BACKLOG
+
+
+class LocalAprsIsServer:
+    """
+    Minimal APRS-IS stand-in: speaks the login handshake (including the
+    passcode check), honors basic server filters, replays a capture
+    file to every client after its login and echoes packets from
+    verified clients to all other connected clients. Just like APRS-IS,
+    the server never sends a packet back to its sender and drops the
+    packets from unverified (read-only) clients. Recorded
+    captures (with timestamps) can be replayed with their original
+    timing, scaled by 'speed'
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        capture_file: str = None,
+        rate: float = None,
+        echo: bool = True,
+        speed: float = None,
+    ):
+        if rate is not None and rate <= 0:
+            raise ValueError("Replay rate needs to be a positive number")
+        if speed is not None and speed <= 0:
+            raise ValueError("Replay speed needs to be a positive number")
+        if rate and speed:
+            raise ValueError("Replay rate and replay speed are mutually exclusive")
+        self.host = host
+        self.port = port
+        self.capture_file = capture_file
+        self.rate = rate
+        self.speed = speed
+        self.echo = echo
+        self.received = deque(maxlen=MAX_RECEIVED_PACKETS)
+        self.__clients = set()
+        self.__lock = threading.Lock()
+        self.__statistics = {
+            "connections": 0,
+            "logins": 0,
+            "packets_received": 0,
+            "packets_dropped": 0,
+            "packets_delivered": 0,
+        }
+        self.__server = None
+        self.__thread = None
+        self.__replay_threads = set()
+        self.__stop_event = threading.Event()
+
+    def start(self):
+        """
+        Starts the server in a background thread
+
+        Returns
+        =======
+        port: 'int'
+            TCP port that the server listens on
+        """
+        if self.__server:
+            raise ValueError("Local APRS-IS server is already running")
+        # The client threads check the passcodes with aprslib
+        load_lazy_module(aprslib)
+        self.__server = LocalAprsIsTCPServer(
+            (self.host, self.port), LocalAprsIsRequestHandler
+        )
+        self.__server.aprsis_server = self
+        self.__stop_event.clear()
+        self.port = self.__server.server_address[1]
+        self.__thread = threading.Thread(
+            target=self.__server.serve_forever,
+            name="LocalAprsIsServer",
+            daemon=True,
+        )
+        self.__thread.start()
+        logger.debug(msg=f"Local APRS-IS server listens on {self.host}:{self.port}")
+        return self.port
+
+    def stop(self):
+        if not self.__server:
+            return
+        self.__stop_event.set()
+        self.__server.shutdown()
+        self.__server.server_close()
+        with self.__lock:
+            clients = list(self.__clients)
+            replay_threads = list(self.__replay_threads)
+        for client in clients:
+            try:
+                client.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        for replay_thread in replay_threads:
+            replay_thread.join()
+        self.__thread.join()
+        self.__server = None
+        self.__thread = None
+
+    @property
+    def running(self):
+        return self.__server is not None
+
+    def statistics(self):
+        with self.__lock:
+            statistics = dict(self.__statistics)
+            statistics["clients"] = len(self.__clients)
+        statistics["port"] = self.port
+        return statistics
+
+    def __count(self, counter: str, value: int = 1):
+        with self.__lock:
+            self.__statistics[counter] += value
+
+    def handle_client(self, sock: socket.socket, address: tuple):
+        client = LocalAprsIsClient(sock=sock, address=address)
+        self.__count("connections")
+        try:
+            reader = sock.makefile("rb")
+            client.send(f"# {LOCAL_SERVER_NAME} stand-in server\r\n".encode())
+            if not self.__login(client, reader):
+                return
+            with self.__lock:
+                self.__clients.add(client)
+
+            if self.capture_file:
+                replay_thread = threading.Thread(
+                    target=self.__replay,
+                    args=(client,),
+                    name="LocalAprsIsReplay",
+                    daemon=True,
+                )
+                with self.__lock:
+                    self.__replay_threads.add(replay_thread)
+                replay_thread.start()
+
+            for line in reader:
+                line = line.rstrip(b"\r\n")
+                if not line:
+                    continue
+                if line[0:1] == b"#":
+                    # The only server command that we support is a filter change
+                    command = line[1:].decode("utf-8", errors="replace").strip()
+                    if command.lower().startswith("filter"):
+                        client.set_filter(command[6:].strip())
+                    continue
+                self.__process_packet(client, line)
+        except OSError as exp:
+            logger.debug(msg=f"Local APRS-IS client {address} dropped: {exp}")
+        finally:
+            with self.__lock:
+                self.__clients.discard(client)
+            sock.close()
+
+    def __login(self, client: LocalAprsIsClient, reader):
+        client.sock.settimeout(LOGIN_TIMEOUT)
+        login = reader.readline().decode("utf-8", errors="replace").split()
+        client.sock.settimeout(None)
+
+        # user CALLSIGN pass PASSCODE vers SOFTWARE VERSION filter ...
+        if len(login) < 4 or login[0].lower() != "user":
+            client.send(b"# invalid login\r\n")
+            return False
+        client.callsign = login[1].upper()
+        passcode = login[3] if login[2].lower() == "pass" else "-1"
+        client.verified = passcode == str(aprslib.passcode(client.callsign))
+        if "filter" in login:
+            client.set_filter(" ".join(login[login.index("filter") + 1 :]))
+
+        status = "verified" if client.verified else "unverified"
+        client.send(
+            f"# logresp {client.callsign} {status}, server {LOCAL_SERVER_NAME}\r\n".encode()
+        )
+        self.__count("logins")
+        time.sleep(LOGIN_GRACE_PERIOD)
+        return True
+
+    def __process_packet(self, client: LocalAprsIsClient, line: bytes):
+        if not client.verified:
+            self.__count("packets_dropped")
+            return
+        self.__count("packets_received")
+        self.received.append(line)
+        if self.echo:
+            self.broadcast(line, sender=client)
+
+    def broadcast(self, line: bytes, sender: LocalAprsIsClient = None):
+        """
+        Sends a packet to all connected clients whose filter matches,
+        except for its sender
+        """
+        with self.__lock:
+            clients = list(self.__clients)
+        payload = line + b"\r\n"
+        for client in clients:
+            if client is sender or not client.wants(line):
+                continue
+            try:
+                client.send(payload)
+                self.__count("packets_delivered")
+            except OSError:
+                pass
+
+    def __replay(self, client: LocalAprsIsClient):
+        bucket = TokenBucket(rate=self.rate) if self.rate else None
+        started_at = time.monotonic()
+        first_timestamp = None
+        buffer = []
+        size = 0
+        count = 0
+        stop_event = self.__stop_event
+        try:
+            for timestamp, line in iter_capture(self.capture_file):
+                if stop_event.is_set():
+                    return
+                if not client.wants(line):
+                    continue
+                if self.speed and timestamp is not None:
+                    # Original timing of a recorded capture
+                    if first_timestamp is None:
+                        first_timestamp = timestamp
+                    delay = (
+                        started_at
+                        + (timestamp - first_timestamp) / self.speed
+                        - time.monotonic()
+                    )
+                    if delay > 0 and stop_event.wait(delay):
+                        return
+                if bucket:
+                    bucket.take(1)
+                if bucket or self.speed:
+                    client.send(line + b"\r\n")
+                    self.__count("packets_delivered")
+                    continue
+                # Without rate limit, the packets are sent in large chunks
+                buffer.append(line)
+                size += len(line) + 2
+                count += 1
+                if size >= MAX_WRITE_SIZE:
+                    client.send(b"\r\n".join(buffer) + b"\r\n")
+                    self.__count("packets_delivered", count)
+                    buffer, size, count = [], 0, 0
+            if buffer:
+                client.send(b"\r\n".join(buffer) + b"\r\n")
+                self.__count("packets_delivered", count)
+        except OSError as exp:
+            logger.debug(msg=f"Replay to {client.address} aborted: {exp}")
+        finally:
+            with self.__lock:
+                self.__replay_threads.discard(threading.current_thread())
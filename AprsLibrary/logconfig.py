@@ -0,0 +1,189 @@
+#
+# Robot Framework Keyword library wrapper for
+# https://github.com/rossengeorgiev/aprs-python
+# Logging configuration: levels, per-packet sampling and async handler
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+import itertools
+import threading
+import logging
+import atexit
+import queue
+
+# Loggers whose level is controlled by the library: our own package and aprslib
+LIBRARY_LOGGER_NAME = "AprsLibrary"
+APRSLIB_LOGGER_NAME = "aprslib"
+
+# Logger for messages which are written once per packet (send/receive/parse).
+# These are the only messages which are subject to sampling
+PACKET_LOGGER_NAME = f"{LIBRARY_LOGGER_NAME}.packets"
+
+# Format which is used if the library is asked to configure the root logger
+ROOT_LOG_FORMAT = "%(asctime)s %(module)s -%(levelname)s- %(message)s"
+
+packet_logger = logging.getLogger(PACKET_LOGGER_NAME)
+
+
+class PacketSamplingFilter(logging.Filter):
+    """
+    Lets every 'sample_rate'-th record pass (1 = all records). Warnings
+    and errors always pass
+    """
+
+    def __init__(self, sample_rate: int):
+        super().__init__()
+        if not isinstance(sample_rate, int) or sample_rate < 1:
+            raise ValueError("Log sample rate needs to be a positive integer")
+        self.sample_rate = sample_rate
+        # itertools.count is atomic in CPython, meaning that no lock is needed
+        self.__counter = itertools.count()
+
+    def filter(self, record: logging.LogRecord):
+        if record.levelno >= logging.WARNING:
+            return True
+        return next(self.__counter) % self.sample_rate == 0
+
+
+class DeferredQueueHandler(logging.Handler):
+    """
+    Minimal logging.handlers.QueueHandler which does not format the record
+    before queueing it, meaning that the message is only formatted by the
+    listener thread (logging.handlers is only imported if the queue is used)
+    """
+
+    def __init__(self, log_queue: queue.SimpleQueue):
+        super().__init__()
+        self.queue = log_queue
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except Exception:
+            self.handleError(record)
+
+
+class ForwardingHandler(logging.Handler):
+    """
+    Used by the queue listener: hands the dequeued records over to the
+    handlers of the logger hierarchy above the library's logger
+    """
+
+    def __init__(self, parent: logging.Logger):
+        super().__init__()
+        self.parent = parent
+
+    def emit(self, record: logging.LogRecord):
+        self.parent.callHandlers(record)
+
+
+# Current sampling filter and queue handler/listener (process-wide)
+_lock = threading.Lock()
+_sampling_filter = None
+_queue_handler = None
+_queue_listener = None
+_exit_handler_registered = False
+
+
+def _stop_queue_listener():
+    global _queue_handler, _queue_listener
+    library_logger = logging.getLogger(LIBRARY_LOGGER_NAME)
+    if _queue_listener:
+        _queue_listener.stop()
+        _queue_listener = None
+    if _queue_handler:
+        library_logger.removeHandler(_queue_handler)
+        library_logger.propagate = True
+        _queue_handler = None
+
+
+def configure_logging(
+    level: str = None,
+    sample_rate: int = 1,
+    use_queue: bool = False,
+    configure_root: bool = False,
+):
+    """
+    Configures the library's logging. The library's loggers are left
+    alone unless a setting is provided, and the root logger is only
+    touched if 'configure_root' is set
+
+    Parameters
+    ==========
+    level: 'str'
+        log level for the library and aprslib loggers (e.g. 'INFO');
+        'None' keeps the current level
+    sample_rate: 'int'
+        only every n-th per-packet debug message is logged (1 = all)
+    use_queue: 'bool'
+        hand the library's log records to a background thread (via a
+        QueueHandler) instead of formatting/writing them in the caller
+    configure_root: 'bool'
+        attach a stream handler to the root logger (logging.basicConfig)
+    """
+    global _sampling_filter, _queue_handler, _queue_listener
+    global _exit_handler_registered
+
+    numeric_level = None
+    if level is not None:
+        numeric_level = logging.getLevelName(str(level).upper())
+        if not isinstance(numeric_level, int):
+            raise ValueError(f"Invalid log level '{level}'")
+
+    with _lock:
+        library_logger = logging.getLogger(LIBRARY_LOGGER_NAME)
+        if numeric_level is not None:
+            library_logger.setLevel(numeric_level)
+            logging.getLogger(APRSLIB_LOGGER_NAME).setLevel(numeric_level)
+
+        if _sampling_filter:
+            packet_logger.removeFilter(_sampling_filter)
+            _sampling_filter = None
+        if sample_rate != 1:
+            _sampling_filter = PacketSamplingFilter(sample_rate)
+            packet_logger.addFilter(_sampling_filter)
+
+        _stop_queue_listener()
+        if use_queue:
+            from logging.handlers import QueueListener
+
+            if not _exit_handler_registered:
+                atexit.register(flush_logging)
+                _exit_handler_registered = True
+            # Records are only formatted by the listener thread; the logger
+            # no longer propagates as the listener forwards the records
+            log_queue = queue.SimpleQueue()
+            _queue_handler = DeferredQueueHandler(log_queue)
+            _queue_listener = QueueListener(
+                log_queue, ForwardingHandler(library_logger.parent)
+            )
+            library_logger.addHandler(_queue_handler)
+            library_logger.propagate = False
+            _queue_listener.start()
+
+        if configure_root:
+            logging.basicConfig(
+                level=numeric_level if numeric_level is not None else logging.DEBUG,
+                format=ROOT_LOG_FORMAT,
+            )
+
+
+def flush_logging():
+    """
+    Stops the queue listener (if any); pending records are written first
+    """
+    with _lock:
+        _stop_queue_listener()
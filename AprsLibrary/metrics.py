@@ -0,0 +1,324 @@
+#
+# Robot Framework Keyword library wrapper for
+# https://github.com/rossengeorgiev/aprs-python
+# Counters, latency histograms and file exporter for library metrics
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+from bisect import bisect_left
+import threading
+import weakref
+import logging
+import json
+import os
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (in seconds) of the latency histogram buckets
+DEFAULT_LATENCY_BUCKETS = (
+    0.00001,
+    0.00005,
+    0.0001,
+    0.0005,
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.5,
+    1.0,
+    5.0,
+)
+
+# Supported export file formats
+EXPORT_FORMAT_PROMETHEUS = "prometheus"
+EXPORT_FORMAT_JSON = "json"
+EXPORT_FORMATS = (EXPORT_FORMAT_PROMETHEUS, EXPORT_FORMAT_JSON)
+
+
+class MetricsShard:
+    """
+    Counters and histograms of a single thread. Only the owning thread
+    writes to a shard, meaning that updates do not need a lock
+    """
+
+    __slots__ = ("counters", "histograms")
+
+    def __init__(self):
+        self.counters = {}
+        # key -> [bucket counts..., +Inf count, sum]
+        self.histograms = {}
+
+    def merge(self, shard: "MetricsShard"):
+        """
+        Adds the values of another shard to this shard
+        """
+        counters = self.counters
+        for key, value in dict(shard.counters).items():
+            counters[key] = counters.get(key, 0) + value
+        histograms = self.histograms
+        for key, histogram in dict(shard.histograms).items():
+            total = histograms.get(key)
+            if total is None:
+                histograms[key] = list(histogram)
+            else:
+                histograms[key] = [a + b for a, b in zip(total, histogram)]
+
+
+class ShardHolder:
+    """
+    Thread-local reference to a thread's shard. It is released when its
+    thread ends, which in turn retires the shard
+    """
+
+    __slots__ = ("shard", "generation", "__weakref__")
+
+    def __init__(self, shard: MetricsShard, generation: int):
+        self.shard = shard
+        self.generation = generation
+
+
+def metric_key(name: str, labels: str):
+    return f"{name}{{{labels}}}" if labels else name
+
+
+class Metrics:
+    """
+    Process-wide metrics registry. Every thread updates its own shard
+    (no locks on the hot path); the shards are only summed up when
+    somebody asks for a snapshot. Once a thread has ended, its shard is
+    folded into a single shard for the retired threads. Gauges (e.g. queue depths) are not
+    stored but collected from callbacks when the snapshot is taken
+    """
+
+    def __init__(self, buckets: tuple = DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.__local = threading.local()
+        self.__shards = set()
+        # Values of the threads which have ended since the last reset
+        self.__retired = MetricsShard()
+        # Incremented by 'reset'; shards of an older generation are replaced
+        self.__generation = 0
+        self.__gauge_callbacks = []
+        self.__lock = threading.Lock()
+
+    def __shard(self):
+        holder = getattr(self.__local, "holder", None)
+        if holder is not None and holder.generation == self.__generation:
+            return holder.shard
+        shard = MetricsShard()
+        with self.__lock:
+            self.__shards.add(shard)
+            holder = ShardHolder(shard, self.__generation)
+        weakref.finalize(holder, self.__retire, shard)
+        self.__local.holder = holder
+        return shard
+
+    def __retire(self, shard: MetricsShard):
+        # Called once the owning thread has ended (or has replaced its
+        # shard after a reset); nobody writes to the shard anymore
+        with self.__lock:
+            if shard in self.__shards:
+                self.__shards.discard(shard)
+                self.__retired.merge(shard)
+
+    def inc(self, name: str, value: int = 1, labels: str = ""):
+        counters = self.__shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, labels: str = ""):
+        histograms = self.__shard().histograms
+        key = (name, labels)
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        histogram[bisect_left(self.buckets, value)] += 1
+        histogram[-1] += value
+
+    def register_gauges(self, callback):
+        """
+        Registers a function which returns a list of (name, labels, value)
+        tuples for the current gauge values
+        """
+        with self.__lock:
+            self.__gauge_callbacks.append(callback)
+
+    def reset(self):
+        # The shards are owned by their threads and are not modified here;
+        # every thread starts a new shard with its next update instead
+        with self.__lock:
+            self.__generation += 1
+            self.__shards = set()
+            self.__retired = MetricsShard()
+
+    def snapshot(self):
+        """
+        Sums up all shards and collects the current gauge values
+
+        Returns
+        =======
+        snapshot: 'dict'
+            'counters', 'gauges' and 'histograms' (count, sum and the
+            cumulative bucket counts), keyed by 'name{labels}'
+        """
+        total = MetricsShard()
+        with self.__lock:
+            shards = list(self.__shards)
+            total.merge(self.__retired)
+            gauge_callbacks = list(self.__gauge_callbacks)
+
+        # merge takes its copies in one go as the owner may update the shard
+        for shard in shards:
+            total.merge(shard)
+        counters = total.counters
+        histograms = total.histograms
+
+        gauges = {}
+        for callback in gauge_callbacks:
+            for name, labels, value in callback():
+                gauges[(name, labels)] = value
+
+        return {
+            "counters": {
+                metric_key(*key): value for key, value in sorted(counters.items())
+            },
+            "gauges": {
+                metric_key(*key): value for key, value in sorted(gauges.items())
+            },
+            "histograms": {
+                metric_key(*key): self.__histogram_summary(histogram)
+                for key, histogram in sorted(histograms.items())
+            },
+        }
+
+    def __histogram_summary(self, histogram: list):
+        buckets = {}
+        cumulative = 0
+        for bound, count in zip(self.buckets, histogram):
+            cumulative += count
+            buckets[repr(bound)] = cumulative
+        count = cumulative + histogram[len(self.buckets)]
+        buckets["+Inf"] = count
+        return {"count": count, "sum": histogram[-1], "buckets": buckets}
+
+
+def format_prometheus(snapshot: dict):
+    """
+    Renders a metrics snapshot in the Prometheus text exposition format
+    """
+    lines = []
+    typed = set()
+
+    def split_key(key: str):
+        name, _, labels = key.partition("{")
+        return name, labels.rstrip("}")
+
+    def add_type(name: str, metric_type: str):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} {metric_type}")
+
+    for key, value in snapshot["counters"].items():
+        add_type(split_key(key)[0], "counter")
+        lines.append(f"{key} {value}")
+    for key, value in snapshot["gauges"].items():
+        add_type(split_key(key)[0], "gauge")
+        lines.append(f"{key} {value}")
+    for key, histogram in snapshot["histograms"].items():
+        name, labels = split_key(key)
+        add_type(name, "histogram")
+        separator = "," if labels else ""
+        for bound, count in histogram["buckets"].items():
+            lines.append(f'{name}_bucket{{{labels}{separator}le="{bound}"}} {count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {histogram['sum']}")
+        lines.append(f"{name}_count{suffix} {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def export_metrics(
+    metrics: Metrics, output_file: str, file_format: str = EXPORT_FORMAT_PROMETHEUS
+):
+    """
+    Writes a metrics snapshot to a file. The file is replaced atomically,
+    meaning that readers (e.g. a node exporter) never see partial content
+
+    Parameters
+    ==========
+    metrics: 'Metrics'
+        metrics registry
+    output_file: 'str'
+        path to the output file
+    file_format: 'str'
+        'prometheus' (text exposition format) or 'json'
+    """
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(
+            f"Invalid export format '{file_format}'; valid values: {', '.join(EXPORT_FORMATS)}"
+        )
+    snapshot = metrics.snapshot()
+    if file_format == EXPORT_FORMAT_JSON:
+        content = json.dumps(snapshot, indent=2)
+    else:
+        content = format_prometheus(snapshot)
+
+    temp_file = f"{output_file}.tmp"
+    with open(temp_file, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(temp_file, output_file)
+
+
+class MetricsExporterThread(threading.Thread):
+    """
+    Background thread which exports the metrics to a file every
+    'interval' seconds (and once more when it is stopped)
+    """
+
+    def __init__(
+        self, metrics: Metrics, output_file: str, file_format: str, interval: float
+    ):
+        super().__init__(name="MetricsExporterThread", daemon=True)
+        if file_format not in EXPORT_FORMATS:
+            raise ValueError(
+                f"Invalid export format '{file_format}'; valid values: {', '.join(EXPORT_FORMATS)}"
+            )
+        if interval <= 0:
+            raise ValueError("Export interval needs to be a positive value")
+        self.metrics = metrics
+        self.output_file = output_file
+        self.file_format = file_format
+        self.interval = interval
+        self.__stop_event = threading.Event()
+
+    def __export(self):
+        try:
+            export_metrics(self.metrics, self.output_file, self.file_format)
+        except OSError as exp:
+            logger.debug(msg=f"Cannot export metrics to '{self.output_file}': {exp}")
+
+    def run(self):
+        while not self.__stop_event.wait(self.interval):
+            self.__export()
+        self.__export()
+
+    def stop(self):
+        self.__stop_event.set()
+        self.join()
+
+
+# Metrics registry which is shared by all library instances
+METRICS = Metrics()
@@ -0,0 +1,265 @@
+#
+# Robot Framework Keyword library wrapper for
+# https://github.com/rossengeorgiev/aprs-python
+# Thread-safe allocator for APRS message numbers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+import threading
+import logging
+import json
+import os
+
+logger = logging.getLogger(__name__)
+
+# Predefined msgno alphabets. 'alpha' with a length of 2 (AA..ZZ) is the
+# library's classic replyack-compatible counter
+MSGNO_ALPHABETS = {
+    "alpha": "ABCDEFGHIJKLMNOPQRSTUVWXYZ",
+    "numeric": "0123456789",
+    "base36": "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ",
+}
+DEFAULT_MSGNO_ALPHABET = "alpha"
+DEFAULT_MSGNO_LENGTH = 2
+
+# The APRS spec permits up to 5 alphanumeric characters per msgno
+MAX_MSGNO_LENGTH = 5
+
+# Number of msgnos which are reserved per state file write. After a
+# restart, the allocator continues behind the reserved block, meaning
+# that a counter which has not been written yet is never reused
+STATE_FILE_RESERVE = 100
+
+
+def resolve_alphabet(alphabet: str):
+    """
+    Returns the characters of a predefined alphabet ('alpha', 'numeric',
+    'base36') or validates a custom one (e.g. 'ABCDEF')
+    """
+    characters = MSGNO_ALPHABETS.get(str(alphabet).lower(), str(alphabet))
+    if len(characters) < 2:
+        raise ValueError("A msgno alphabet needs to consist of at least 2 characters")
+    if len(set(characters)) != len(characters):
+        raise ValueError(f"Msgno alphabet '{characters}' contains duplicate characters")
+    if not characters.isascii() or not characters.isalnum():
+        raise ValueError(
+            f"Msgno alphabet '{characters}' may only contain the characters A-Z, a-z and 0-9"
+        )
+    return characters
+
+
+def format_msgno(counter: int, alphabet: str, length: int):
+    """
+    Converts a numeric counter into a fixed-length msgno, e.g.
+    counter 27 with alphabet 'A..Z' and length 2 = 'BB'
+
+    Parameters
+    ==========
+    counter: 'int'
+        numeric counter (0 <= counter < len(alphabet) ** length)
+    alphabet: 'str'
+        msgno characters, lowest digit value first
+    length: 'int'
+        number of characters of the msgno
+
+    Returns
+    =======
+    msgno: 'str'
+        the msgno for the counter
+    """
+    base = len(alphabet)
+    characters = []
+    for _ in range(length):
+        counter, digit = divmod(counter, base)
+        characters.append(alphabet[digit])
+    return "".join(reversed(characters))
+
+
+class MsgNoAllocator:
+    """
+    Hands out APRS message numbers. Allocation is atomic, meaning that
+    concurrent senders never get the same msgno. The counter wraps after
+    len(alphabet) ** length values; msgnos which are still awaiting an
+    ack (see 'pending') are skipped. If a state file is given, the counter
+    survives restarts of the library
+    """
+
+    def __init__(
+        self,
+        alphabet: str = DEFAULT_MSGNO_ALPHABET,
+        length: int = DEFAULT_MSGNO_LENGTH,
+        counter: int = 0,
+        state_file: str = None,
+        pending=None,
+    ):
+        """
+        Parameters
+        ==========
+        alphabet: 'str'
+            'alpha', 'numeric', 'base36' or a custom set of characters
+        length: 'int'
+            number of characters per msgno (1..5)
+        counter: 'int'
+            current (= most recently allocated) counter value
+        state_file: 'str'
+            optional JSON file for persisting the counter; an existing
+            file takes precedence over 'counter'
+        pending: 'callable'
+            optional function which returns the set of msgnos that are
+            still awaiting an ack
+        """
+        if not isinstance(length, int) or not 1 <= length <= MAX_MSGNO_LENGTH:
+            raise ValueError(
+                f"Msgno length needs to be an integer between 1 and {MAX_MSGNO_LENGTH}"
+            )
+        self.alphabet = resolve_alphabet(alphabet)
+        self.length = length
+        self.size = len(self.alphabet) ** length
+        self.state_file = state_file
+        self.pending = pending
+        self.__lock = threading.Lock()
+        self.__counter = 0
+        # Counter value up to which the state file has reserved the msgnos
+        self.__reserved_until = None
+        # Small sequences get a smaller reservation; otherwise a restart
+        # would wrap the counter right back to the recently used msgnos
+        self.__reserve = max(min(STATE_FILE_RESERVE, self.size // 4), 1)
+        if not (state_file and self.__load_state()):
+            self.set_counter(counter)
+
+    @property
+    def counter(self):
+        return self.__counter
+
+    @property
+    def msgno(self):
+        return format_msgno(self.__counter, self.alphabet, self.length)
+
+    def set_counter(self, counter: int):
+        if not isinstance(counter, int):
+            raise ValueError(
+                "This function only accepts numeric values for the APRS-IS MsgNo"
+            )
+        if not 0 <= counter < self.size:
+            raise ValueError(f"MsgNo needs to be between 0 and {self.size - 1}")
+        with self.__lock:
+            self.__counter = counter
+            if self.state_file:
+                self.__save_state(counter)
+
+    def allocate(self, count: int = 1):
+        """
+        Allocates the next 'count' msgnos in a single atomic step
+
+        Returns
+        =======
+        msgnos: 'list'
+            the allocated msgnos; the counter points to the last of them
+        """
+        return [msgno for _, msgno in self.__allocate(count)]
+
+    def increment(self):
+        """
+        Allocates the next msgno and returns its numeric counter value
+        """
+        return self.__allocate(1)[0][0]
+
+    def __allocate(self, count: int):
+        # Returns a list of (counter, msgno) tuples
+        if not isinstance(count, int) or count < 1:
+            raise ValueError("Number of msgnos needs to be a positive integer")
+        pending = self.pending() if self.pending else ()
+        if count + len(pending) > self.size:
+            raise ValueError(
+                f"Cannot allocate {count} msgno(s); only {self.size - len(pending)} of {self.size} are available"
+            )
+        msgnos = []
+        with self.__lock:
+            counter = self.__counter
+            while len(msgnos) < count:
+                counter = (counter + 1) % self.size
+                msgno = format_msgno(counter, self.alphabet, self.length)
+                if msgno in pending:
+                    continue
+                msgnos.append((counter, msgno))
+            if counter < self.__counter:
+                logger.debug(msg=f"MsgNo counter has wrapped after {self.size} values")
+            self.__counter = counter
+            if self.state_file and not self.__is_reserved(counter):
+                self.__save_state(counter)
+        return msgnos
+
+    def state(self):
+        return {
+            "alphabet": self.alphabet,
+            "length": self.length,
+            "size": self.size,
+            "counter": self.__counter,
+            "msgno": self.msgno,
+            "state_file": self.state_file,
+        }
+
+    def __is_reserved(self, counter: int):
+        # The reservation is a window of reserved values which may
+        # wrap around the end of the sequence
+        if self.__reserved_until is None:
+            return False
+        distance = (self.__reserved_until - counter) % self.size
+        return 0 < distance <= self.__reserve
+
+    def __load_state(self):
+        # Returns True if the counter has been taken from the state file
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as exp:
+            raise ValueError(f"Cannot read msgno state file '{self.state_file}': {exp}")
+        if state.get("alphabet") != self.alphabet or state.get("length") != self.length:
+            logger.debug(
+                msg=f"Msgno state file '{self.state_file}' was written for a different alphabet/length; ignoring it"
+            )
+            return False
+        counter = state.get("reserved_until")
+        if not isinstance(counter, int) or not 0 <= counter < self.size:
+            raise ValueError(f"Invalid counter in msgno state file '{self.state_file}'")
+        # Continue behind the reserved block; msgnos up to 'reserved_until'
+        # may have been used before the restart
+        with self.__lock:
+            self.__counter = counter
+            self.__save_state(counter)
+        return True
+
+    def __save_state(self, counter: int):
+        reserved_until = (counter + self.__reserve) % self.size
+        state = {
+            "alphabet": self.alphabet,
+            "length": self.length,
+            "reserved_until": reserved_until,
+        }
+        # Write to a temporary file first, meaning that a crash never
+        # leaves a truncated state file behind
+        temp_file = f"{self.state_file}.tmp"
+        try:
+            with open(temp_file, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(temp_file, self.state_file)
+        except OSError as exp:
+            raise ValueError(
+                f"Cannot write msgno state file '{self.state_file}': {exp}"
+            )
+        self.__reserved_until = reserved_until
@@ -0,0 +1,133 @@
+#
+# Robot Framework Keyword library wrapper for
+# https://github.com/rossengeorgiev/aprs-python
+# LRU cache for parsed APRS packets
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+from collections import OrderedDict
+import threading
+
+# Mutable containers which aprslib creates in its parsed packets (e.g. the
+# path list or the weather and telemetry dictionaries)
+MUTABLE_CONTAINERS = (dict, list)
+
+
+def copy_packet(value):
+    """
+    Copies a parsed packet (or a single value of it) for handing it out
+    to the user. Other than copy.deepcopy, only the dictionaries and lists
+    are copied; all other values that aprslib creates are immutable and
+    can be shared with the cache entry
+
+    Parameters
+    ==========
+    value: 'dict', 'list' or any other value of a parsed packet
+
+    Returns
+    =======
+    value: a copy of dictionaries and lists, otherwise 'value' itself
+    """
+    if type(value) not in MUTABLE_CONTAINERS:
+        return value
+    copied = value.copy()
+    items = value.items() if type(value) is dict else enumerate(value)
+    for key, item in items:
+        if type(item) in MUTABLE_CONTAINERS:
+            copied[key] = copy_packet(item)
+    return copied
+
+
+class ParsedPacketCache:
+    """
+    Thread-safe LRU cache for parsed APRS packets, keyed by the raw
+    packet (str or bytes). The cached dictionaries are shared between
+    all callers; callers which hand them out to the user need to copy
+    them first (see 'copy_packet'). A cache size of zero disables caching.
+    """
+
+    def __init__(self, maxsize: int):
+        if not isinstance(maxsize, int) or maxsize < 0:
+            raise ValueError("Cache size needs to be a non-negative integer")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def get(self, aprs_packet, parse_function):
+        """
+        Returns the parsed packet from the cache. On a cache miss, the
+        packet is parsed with 'parse_function' and added to the cache.
+        Exceptions raised by 'parse_function' are not cached.
+
+        Parameters
+        ==========
+        aprs_packet: 'str' or 'bytes'
+            raw APRS packet
+        parse_function: 'function'
+            function which parses the raw packet and returns a dict
+
+        Returns
+        =======
+        packet: 'dict'
+            parsed APRS packet (shared cache entry - do not modify)
+        """
+        with self.__lock:
+            packet = self.__entries.get(aprs_packet)
+            if packet is not None:
+                self.__entries.move_to_end(aprs_packet)
+                self.hits += 1
+                return packet
+            self.misses += 1
+
+        # Parse outside of the lock; in the worst case, two threads
+        # parse the same packet at the same time
+        packet = parse_function(aprs_packet)
+
+        if self.maxsize:
+            with self.__lock:
+                self.__entries[aprs_packet] = packet
+                self.__entries.move_to_end(aprs_packet)
+                while len(self.__entries) > self.maxsize:
+                    self.__entries.popitem(last=False)
+        return packet
+
+    def resize(self, maxsize: int):
+        if not isinstance(maxsize, int) or maxsize < 0:
+            raise ValueError("Cache size needs to be a non-negative integer")
+        with self.__lock:
+            self.maxsize = maxsize
+            while len(self.__entries) > self.maxsize:
+                self.__entries.popitem(last=False)
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def statistics(self):
+        with self.__lock:
+            return {
+                "size": len(self.__entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
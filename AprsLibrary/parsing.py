@@ -0,0 +1,47 @@
+#
+# Robot Framework Keyword library wrapper for
+# https://github.com/rossengeorgiev/aprs-python
+# Shared APRS packet parsing helpers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+from .lazyimports import lazy_import
+
+aprslib = lazy_import("aprslib")
+
+
+def parse_packet(aprs_packet):
+    """
+    Parses a raw APRS packet with aprslib and maps aprslib's
+    parser exceptions to ValueError
+
+    Parameters
+    ==========
+    aprs_packet: 'str' or 'bytes'
+        raw APRS packet
+
+    Returns
+    =======
+    packet: 'dict'
+        the parsed APRS packet
+    """
+    try:
+        packet = aprslib.parse(aprs_packet)
+    except aprslib.ParseError:
+        raise ValueError("This APRS packet is invalid")
+    except aprslib.UnknownFormat:
+        raise ValueError("Unknown APRS format")
+    return packet
@@ -0,0 +1,249 @@
+#
+# Robot Framework Keyword library wrapper for
+# https://github.com/rossengeorgiev/aprs-python
+# Background receiver and packet queue for APRS-IS connections
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+from collections import deque
+import threading
+import logging
+import select
+import socket
+import time
+import queue
+
+from .lazyimports import lazy_import, load_lazy_module
+from .metrics import METRICS
+
+aprslib = lazy_import("aprslib")
+
+logger = logging.getLogger(__name__)
+
+# Overflow policies for the bounded packet queue
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_DROP_NEWEST = "drop_newest"
+OVERFLOW_BLOCK = "block"
+OVERFLOW_POLICIES = (OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST, OVERFLOW_BLOCK)
+
+# Poll interval (in seconds) for the background thread. This is the maximum
+# time the thread needs for noticing that it is supposed to terminate
+RECEIVER_POLL_INTERVAL = 0.5
+
+# Line separator used by APRS-IS
+APRSIS_NEWLINE = b"\r\n"
+
+
+class AprsIsLineReader:
+    """
+    Reads raw lines from an aprslib.IS connection object
+
+    Other than aprslib's consumer, this reader honors a deadline and
+    does not need a callback. It shares its receive buffer with the
+    aprslib.IS object, meaning that lines which have not been consumed
+    yet will survive the reader and can be picked up later on.
+    Server-generated comment lines (starting with '#') are skipped.
+    If a capture recorder is set, every line is handed to it.
+    """
+
+    def __init__(self, ais: object, recorder: object = None):
+        self.ais = ais
+        self.recorder = recorder
+
+    def read_lines(self, timeout: float = None):
+        """
+        Generator for complete raw lines from the APRS-IS server
+
+        Parameters
+        ==========
+        timeout: 'float'
+            Max time in seconds for waiting on new data. 'None' waits
+            forever, '0' only returns what has already been received
+
+        Returns
+        =======
+        line: 'bytes'
+            raw APRS-IS line (without CR/LF)
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            # Serve what we already have in our buffer
+            while APRSIS_NEWLINE in self.ais.buf:
+                line, self.ais.buf = self.ais.buf.split(APRSIS_NEWLINE, 1)
+                if line[0:1] == b"#":
+                    logger.debug("Server: %s", line)
+                    continue
+                if line:
+                    METRICS.inc("aprs_received_lines_total")
+                    if self.recorder:
+                        self.recorder.record(line)
+                    yield line
+
+            # Once our deadline has passed, we still poll the socket (without
+            # waiting) for data that may already have arrived
+            wait_time = None
+            if deadline is not None:
+                wait_time = max(deadline - time.monotonic(), 0)
+
+            sock = self.ais.sock
+            if not sock or not self.ais._connected:
+                raise aprslib.ConnectionDrop("connection dropped")
+
+            try:
+                readable, _, _ = select.select([sock], [], [], wait_time)
+                if not readable:
+                    return
+                short_buf = sock.recv(4096)
+            except (BlockingIOError, socket.timeout, InterruptedError):
+                continue
+            except (OSError, ValueError) as exp:
+                raise aprslib.ConnectionDrop(f"connection dropped: {exp}")
+
+            # sock.recv returns empty if the connection drops
+            if not short_buf:
+                raise aprslib.ConnectionDrop("connection dropped")
+            METRICS.inc("aprs_received_bytes_total", len(short_buf))
+            self.ais.buf += short_buf
+
+
+class BoundedPacketQueue:
+    """
+    Thread-safe FIFO queue with a fixed capacity and a configurable
+    overflow policy. Both 'put' and 'get' are O(1) operations.
+    """
+
+    def __init__(self, maxsize: int, overflow_policy: str = OVERFLOW_DROP_OLDEST):
+        if not isinstance(maxsize, int) or maxsize < 1:
+            raise ValueError("Queue size needs to be a positive integer")
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"Invalid overflow policy '{overflow_policy}'; valid values: {', '.join(OVERFLOW_POLICIES)}"
+            )
+        self.maxsize = maxsize
+        self.overflow_policy = overflow_policy
+        self.dropped = 0
+        self.closed = False
+        self.__items = deque()
+        self.__condition = threading.Condition()
+
+    def __len__(self):
+        return len(self.__items)
+
+    def put(self, item):
+        with self.__condition:
+            while len(self.__items) >= self.maxsize and not self.closed:
+                if self.overflow_policy == OVERFLOW_DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+                if self.overflow_policy == OVERFLOW_DROP_OLDEST:
+                    self.__items.popleft()
+                    self.dropped += 1
+                    break
+                # OVERFLOW_BLOCK: wait until the consumer has made some room
+                self.__condition.wait(RECEIVER_POLL_INTERVAL)
+            if self.closed:
+                return False
+            self.__items.append(item)
+            self.__condition.notify_all()
+            return True
+
+    def get(self, timeout: float = None):
+        """
+        Returns the oldest item from the queue. Raises queue.Empty if
+        no item has arrived within the given time frame or if the queue
+        has been closed and there is nothing left to consume.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.__condition:
+            while not self.__items:
+                if self.closed:
+                    raise queue.Empty
+                if deadline is None:
+                    self.__condition.wait()
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise queue.Empty
+                    self.__condition.wait(remaining)
+            item = self.__items.popleft()
+            self.__condition.notify_all()
+            return item
+
+    def close(self):
+        with self.__condition:
+            self.closed = True
+            self.__condition.notify_all()
+
+
+class AprsReceiverThread(threading.Thread):
+    """
+    Background thread which continuously reads raw lines from the
+    APRS-IS connection and stores them in a BoundedPacketQueue. If the
+    connection drops, the thread calls 'reconnect' (if 'immortal' is set)
+    """
+
+    def __init__(
+        self,
+        ais: object,
+        packet_queue: BoundedPacketQueue,
+        immortal: bool,
+        reconnect: object = None,
+        recorder: object = None,
+    ):
+        super().__init__(name="AprsReceiverThread", daemon=True)
+        self.ais = ais
+        self.reader = AprsIsLineReader(ais, recorder=recorder)
+        self.packet_queue = packet_queue
+        self.immortal = immortal
+        self.reconnect = reconnect
+        self.error = None
+        self.__stop_event = threading.Event()
+
+    def start(self):
+        # aprslib's exceptions are used within the thread
+        load_lazy_module(aprslib)
+        super().start()
+
+    def run(self):
+        reader = self.reader
+        try:
+            while not self.__stop_event.is_set():
+                try:
+                    for line in reader.read_lines(timeout=RECEIVER_POLL_INTERVAL):
+                        self.packet_queue.put(line)
+                        if self.__stop_event.is_set():
+                            break
+                except (aprslib.ConnectionDrop, aprslib.ConnectionError) as exp:
+                    if self.__stop_event.is_set():
+                        break
+                    if not self.immortal or not self.reconnect:
+                        self.error = exp
+                        break
+                    logger.debug(msg=f"Lost APRS-IS connection ({exp}); reconnecting")
+                    try:
+                        self.reconnect()
+                    except ConnectionError as reconnect_exp:
+                        self.error = reconnect_exp
+                        break
+        finally:
+            # wake up everyone who is still waiting for data from us
+            self.packet_queue.close()
+
+    def stop(self, timeout: float = None):
+        self.__stop_event.set()
+        self.packet_queue.close()
+        self.join(timeout)
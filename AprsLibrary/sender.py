@@ -0,0 +1,307 @@
+#
+# Robot Framework Keyword library wrapper for
+# https://github.com/rossengeorgiev/aprs-python
+# Batched and rate-limited sending of APRS packets
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+from collections import deque
+import threading
+import logging
+import time
+
+from .metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# Max number of bytes which are coalesced into a single socket write
+MAX_WRITE_SIZE = 16384
+
+
+class TokenBucket:
+    """
+    Simple token bucket rate limiter. 'rate' tokens are added per
+    second, up to a maximum of 'burst' tokens. The bucket can be shared
+    by several threads (e.g. keywords and the background sender)
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.__lock = threading.Lock()
+        self.tokens = float(burst)
+        self.timestamp = time.monotonic()
+        self.configure(rate=rate, burst=burst)
+
+    def configure(self, rate: float, burst: int = 1):
+        """
+        Changes the rate and burst size; the tokens which are currently
+        in the bucket are kept (but never exceed the new burst size)
+        """
+        if rate <= 0:
+            raise ValueError("Rate needs to be a positive number")
+        if burst < 1:
+            raise ValueError("Burst needs to be a positive integer")
+        with self.__lock:
+            self.rate = rate
+            self.burst = burst
+            self.tokens = min(self.burst, self.tokens)
+
+    def __refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.timestamp) * self.rate)
+        self.timestamp = now
+
+    def take(self, count: int):
+        """
+        Takes up to 'count' tokens from the bucket. Waits until at least
+        one token is available
+
+        Parameters
+        ==========
+        count: 'int'
+            max number of tokens that the caller wants to take
+
+        Returns
+        =======
+        granted: 'int'
+            number of tokens which were taken (1...count)
+        """
+        # Waiting with the lock held makes sure that the threads which share
+        # this bucket get their tokens one after the other
+        with self.__lock:
+            self.__refill()
+            if self.tokens < 1:
+                time.sleep((1 - self.tokens) / self.rate)
+                self.__refill()
+            granted = max(min(count, int(self.tokens)), 1)
+            self.tokens -= granted
+            return granted
+
+    def give_back(self, count: int):
+        """
+        Returns 'count' tokens which were taken but not needed (the
+        bucket never exceeds its burst size)
+        """
+        with self.__lock:
+            self.tokens = min(self.burst, self.tokens + count)
+
+
+def coalesce_packets(
+    packets: list, max_count: int, max_write_size: int = MAX_WRITE_SIZE
+):
+    """
+    Takes up to 'max_count' packets from the beginning of 'packets' and
+    joins them into one APRS-IS payload of (roughly) max 'max_write_size'
+    bytes. At least one packet is always taken
+
+    Parameters
+    ==========
+    packets: 'list'
+        list of APRS packets (str, without CR/LF)
+    max_count: 'int'
+        max number of packets for this payload
+
+    Returns
+    =======
+    count: 'int'
+        number of packets in this payload
+    payload: 'str'
+        CR/LF-separated packets
+    """
+    count = 0
+    size = 0
+    for packet in packets[:max_count]:
+        size += len(packet) + 2
+        if count and size > max_write_size:
+            break
+        count += 1
+    return count, "\r\n".join(packets[:count])
+
+
+def new_send_report():
+    return {"packets": 0, "bytes": 0, "writes": 0, "seconds": 0.0}
+
+
+def send_packets(
+    ais: object,
+    packets: list,
+    bucket: TokenBucket = None,
+    report: dict = None,
+):
+    """
+    Sends a list of APRS packets to APRS-IS with as few socket writes as
+    possible. If a token bucket is specified, it limits the number of
+    packets that are sent per write. The progress is
+    kept in 'report', which is updated after every successful write. If a
+    write fails, passing the same 'report' (and packets) again resumes
+    with the first packet which has not been written yet
+
+    Parameters
+    ==========
+    ais: 'aprslib.IS'
+        APRS-IS connection object
+    packets: 'list'
+        list of APRS packets (str)
+    bucket: 'TokenBucket'
+        optional rate limiter, usually the one of the APRS-IS session
+    report: 'dict'
+        optional report of an earlier, failed call (see 'new_send_report')
+
+    Returns
+    =======
+    report: 'dict'
+        number of packets, bytes and socket writes plus the time spent
+    """
+    packets = [packet.rstrip("\r\n") for packet in packets if packet]
+    packets = [packet for packet in packets if packet]
+    if report is None:
+        report = new_send_report()
+    start_time = time.monotonic()
+
+    try:
+        while report["packets"] < len(packets):
+            remaining = packets[report["packets"] :]
+            max_count = bucket.take(len(remaining)) if bucket else len(remaining)
+            count, payload = coalesce_packets(remaining, max_count=max_count)
+            if bucket and count < max_count:
+                # return the tokens that we did not need for this write
+                bucket.give_back(max_count - count)
+            write_start = time.perf_counter()
+            ais.sendall(payload)
+            METRICS.observe(
+                "aprs_send_write_seconds", time.perf_counter() - write_start
+            )
+            size = len(payload.encode("utf-8")) + 2
+            METRICS.inc("aprs_sent_packets_total", count)
+            METRICS.inc("aprs_sent_bytes_total", size)
+            report["packets"] += count
+            report["bytes"] += size
+            report["writes"] += 1
+    finally:
+        report["seconds"] += time.monotonic() - start_time
+
+    return report
+
+
+class AprsSenderThread(threading.Thread):
+    """
+    Background thread which writes queued APRS packets to APRS-IS.
+    Packets which are queued while the thread is busy are coalesced
+    into a single write. If a write fails, the thread calls 'reconnect'
+    (if present) and retries the packets which have not been written. Write errors are collected
+    and can be picked up by the caller after flushing the queue
+    """
+
+    def __init__(self, ais: object, reconnect: object = None):
+        super().__init__(name="AprsSenderThread", daemon=True)
+        self.ais = ais
+        self.reconnect = reconnect
+        self.errors = []
+        self.__jobs = deque()
+        self.__pending = 0
+        self.__stopping = False
+        self.__condition = threading.Condition()
+
+    @property
+    def pending(self):
+        return self.__pending
+
+    def enqueue(self, packets: list, bucket: TokenBucket = None):
+        with self.__condition:
+            if self.__stopping:
+                raise ConnectionError("APRS-IS send queue has been closed")
+            self.__jobs.append((list(packets), bucket))
+            self.__pending += len(packets)
+            self.__condition.notify_all()
+
+    def run(self):
+        while True:
+            with self.__condition:
+                while not self.__jobs and not self.__stopping:
+                    self.__condition.wait()
+                if not self.__jobs:
+                    return
+                packets, bucket = self.__jobs.popleft()
+                # Jobs with the same rate limiter (or none) can be merged
+                while self.__jobs and self.__jobs[0][1] is bucket:
+                    packets.extend(self.__jobs.popleft()[0])
+            # The retry only writes the packets which have not been written yet
+            report = new_send_report()
+            try:
+                try:
+                    send_packets(
+                        ais=self.ais,
+                        packets=packets,
+                        bucket=bucket,
+                        report=report,
+                    )
+                except (ValueError, TypeError):
+                    raise
+                except Exception:
+                    if not self.reconnect or self.__stopping:
+                        raise
+                    self.reconnect()
+                    send_packets(
+                        ais=self.ais,
+                        packets=packets,
+                        bucket=bucket,
+                        report=report,
+                    )
+            except Exception as exp:
+                logger.debug(msg=f"Error while sending packets to APRS-IS: {exp}")
+                with self.__condition:
+                    self.errors.append(exp)
+            with self.__condition:
+                self.__pending -= len(packets)
+                self.__condition.notify_all()
+
+    def flush(self, timeout: float = None):
+        """
+        Waits until all queued packets have been written
+
+        Parameters
+        ==========
+        timeout: 'float'
+            max time in seconds to wait; 'None' waits forever
+
+        Returns
+        =======
+        success: 'bool'
+            True if the queue has been flushed within the given time frame
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.__condition:
+            while self.__pending:
+                if deadline is None:
+                    self.__condition.wait()
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self.__condition.wait(remaining)
+            return True
+
+    def take_errors(self):
+        with self.__condition:
+            errors = self.errors
+            self.errors = []
+            return errors
+
+    def stop(self, timeout: float = None):
+        # Pending packets are still written before the thread terminates
+        with self.__condition:
+            self.__stopping = True
+            self.__condition.notify_all()
+        self.join(timeout)
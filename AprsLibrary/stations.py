@@ -0,0 +1,378 @@
+#
+# Robot Framework Keyword library wrapper for
+# https://github.com/rossengeorgiev/aprs-python
+# Station index: last packet, position and heard time per station
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+from collections import OrderedDict
+import threading
+import logging
+import math
+import time
+
+logger = logging.getLogger(__name__)
+
+# Defaults: time (in seconds) after which a station that has not been heard
+# is removed, max number of stations and the size (in degrees) of a cell of
+# the spatial grid
+DEFAULT_STATION_TTL = 3600.0
+DEFAULT_MAX_STATIONS = 100000
+DEFAULT_GRID_CELL_SIZE = 0.5
+
+# Mean earth radius (km) and the length of one degree of latitude (km)
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180
+
+
+def distance_km(
+    latitude1: float, longitude1: float, latitude2: float, longitude2: float
+):
+    """
+    Great-circle distance (haversine) between two positions in km
+    """
+    phi1 = math.radians(latitude1)
+    phi2 = math.radians(latitude2)
+    delta_phi = phi2 - phi1
+    delta_lambda = math.radians(longitude2 - longitude1)
+    a = (
+        math.sin(delta_phi / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def station_name(packet: dict):
+    """
+    Returns the name under which a decoded packet is indexed: the object
+    name for objects, the source callsign for everything else
+    """
+    object_name = packet.get("object_name")
+    if object_name and object_name.strip():
+        return object_name.strip().upper()
+    source = packet.get("from")
+    return source.upper() if source else None
+
+
+class StationRecord:
+    """
+    Compact state of a single station. Only the raw packet is kept;
+    it is decoded again (via the parse cache) if it is asked for
+    """
+
+    __slots__ = (
+        "name",
+        "source",
+        "raw",
+        "format",
+        "heard_at",
+        "last_heard",
+        "packets",
+        "latitude",
+        "longitude",
+        "position_heard",
+        "status",
+        "cell",
+    )
+
+    def __init__(self, name: str):
+        self.name = name
+        self.source = None
+        self.raw = None
+        self.format = None
+        # monotonic clock (for the TTL) and epoch time (for the user)
+        self.heard_at = 0.0
+        self.last_heard = 0.0
+        self.packets = 0
+        self.latitude = None
+        self.longitude = None
+        self.position_heard = None
+        self.status = None
+        self.cell = None
+
+    def as_dict(self):
+        return {
+            "station": self.name,
+            "from": self.source,
+            "format": self.format,
+            "last_heard": self.last_heard,
+            "packets": self.packets,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "position_heard": self.position_heard,
+            "status": self.status,
+            "raw": self.raw,
+        }
+
+
+class StationIndex:
+    """
+    In-memory index of the stations which have been heard on the receive
+    path: the last packet, the last position, the last status and the
+    time when a station has been heard last. Stations are looked up by
+    name in O(1); their positions are kept in a grid of 'cell_size'
+    degree cells, meaning that radius and bounding box queries only look
+    at the cells which overlap the query area. Stations which have not
+    been heard for 'ttl' seconds are removed
+    """
+
+    def __init__(
+        self,
+        ttl: float = DEFAULT_STATION_TTL,
+        max_stations: int = DEFAULT_MAX_STATIONS,
+        cell_size: float = DEFAULT_GRID_CELL_SIZE,
+    ):
+        if ttl <= 0:
+            raise ValueError("Station TTL needs to be a positive value")
+        if not isinstance(max_stations, int) or max_stations < 1:
+            raise ValueError("Max number of stations needs to be a positive integer")
+        if not 0 < cell_size <= 90:
+            raise ValueError("Grid cell size needs to be between 0 and 90 degrees")
+        self.ttl = ttl
+        self.max_stations = max_stations
+        self.cell_size = cell_size
+        self.columns = math.ceil(360 / cell_size)
+        self.updates = 0
+        self.expired = 0
+        self.evicted = 0
+        # name -> StationRecord, least recently heard stations first
+        self.__stations = OrderedDict()
+        # (row, column) -> set of station names
+        self.__grid = {}
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__stations)
+
+    def update(self, packet: dict):
+        """
+        Updates the index with a decoded packet. Killed objects are removed
+        """
+        name = station_name(packet)
+        if not name:
+            return
+        now = time.monotonic()
+        with self.__lock:
+            self.updates += 1
+            self.__expire(now)
+            stations = self.__stations
+            record = stations.get(name)
+            if packet.get("alive") is False:
+                if record:
+                    self.__remove(record)
+                return
+            if record is None:
+                record = stations[name] = StationRecord(name)
+                if len(stations) > self.max_stations:
+                    self.__remove(next(iter(stations.values())))
+                    self.evicted += 1
+            else:
+                stations.move_to_end(name)
+            record.source = packet.get("from")
+            record.raw = packet.get("raw")
+            record.format = packet.get("format")
+            record.heard_at = now
+            record.last_heard = time.time()
+            record.packets += 1
+            if packet.get("status") is not None:
+                record.status = packet["status"]
+            latitude = packet.get("latitude")
+            longitude = packet.get("longitude")
+            if latitude is not None and longitude is not None:
+                record.latitude = latitude
+                record.longitude = longitude
+                record.position_heard = record.last_heard
+                self.__move(record, self.__cell(latitude, longitude))
+
+    def get(self, name: str):
+        """
+        Returns the StationRecord for a station name (or 'None')
+        """
+        with self.__lock:
+            record = self.__stations.get(name.upper())
+            if record is None or record.heard_at <= time.monotonic() - self.ttl:
+                return None
+            return record
+
+    def within_radius(self, latitude: float, longitude: float, radius_km: float):
+        """
+        Returns the stations whose last position is within 'radius_km' of
+        the given position, nearest first
+
+        Returns
+        =======
+        stations: 'list'
+            (distance in km, StationRecord) tuples
+        """
+        if radius_km < 0:
+            raise ValueError("Radius cannot be negative")
+        self.__check_position(latitude, longitude)
+        delta_latitude = radius_km / KM_PER_DEGREE
+        min_latitude = latitude - delta_latitude
+        max_latitude = latitude + delta_latitude
+        # The longitude span of the circle depends on its latitude; near the
+        # poles (or for huge radiuses), all longitudes are candidates
+        widest = max(abs(min_latitude), abs(max_latitude))
+        if widest >= 90:
+            delta_longitude = 180
+        else:
+            delta_longitude = min(delta_latitude / math.cos(math.radians(widest)), 180)
+        results = []
+        for record in self.__candidates(
+            max(min_latitude, -90),
+            longitude - delta_longitude,
+            min(max_latitude, 90),
+            longitude + delta_longitude,
+        ):
+            distance = distance_km(
+                latitude, longitude, record.latitude, record.longitude
+            )
+            if distance <= radius_km:
+                results.append((distance, record))
+        results.sort(key=lambda result: result[0])
+        return results
+
+    def within_bounding_box(
+        self,
+        min_latitude: float,
+        min_longitude: float,
+        max_latitude: float,
+        max_longitude: float,
+    ):
+        """
+        Returns the stations whose last position is within the bounding
+        box. If 'min_longitude' is greater than 'max_longitude', the box
+        crosses the 180th meridian
+        """
+        self.__check_position(min_latitude, min_longitude)
+        self.__check_position(max_latitude, max_longitude)
+        if min_latitude > max_latitude:
+            raise ValueError("Min latitude needs to be less than max latitude")
+        if min_longitude > max_longitude:
+            max_longitude += 360
+        results = []
+        for record in self.__candidates(
+            min_latitude, min_longitude, max_latitude, max_longitude
+        ):
+            record_longitude = record.longitude
+            if record_longitude < min_longitude:
+                record_longitude += 360
+            if (
+                min_latitude <= record.latitude <= max_latitude
+                and record_longitude <= max_longitude
+            ):
+                results.append(record)
+        return results
+
+    def clear(self):
+        with self.__lock:
+            self.__stations.clear()
+            self.__grid.clear()
+
+    def statistics(self):
+        with self.__lock:
+            self.__expire(time.monotonic())
+            return {
+                "stations": len(self.__stations),
+                "positions": sum(len(names) for names in self.__grid.values()),
+                "grid_cells": len(self.__grid),
+                "max_stations": self.max_stations,
+                "ttl": self.ttl,
+                "updates": self.updates,
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
+
+    def __candidates(
+        self,
+        min_latitude: float,
+        min_longitude: float,
+        max_latitude: float,
+        max_longitude: float,
+    ):
+        # Records in all grid cells which overlap the area. Longitudes may
+        # exceed +/-180 (areas which cross the 180th meridian)
+        with self.__lock:
+            self.__expire(time.monotonic())
+            first_row, first_column = self.__cell(min_latitude, min_longitude)
+            last_row = self.__cell(max_latitude, min_longitude)[0]
+            columns = min(
+                math.floor((max_longitude - min_longitude) / self.cell_size) + 2,
+                self.columns,
+            )
+            rows = range(first_row, last_row + 1)
+            grid = self.__grid
+            stations = self.__stations
+            # Huge areas: checking the occupied cells is cheaper
+            if len(rows) * columns > len(grid):
+                cells = [
+                    cell
+                    for cell in grid
+                    if first_row <= cell[0] <= last_row
+                    and (cell[1] - first_column) % self.columns < columns
+                ]
+            else:
+                cells = [
+                    (row, (first_column + offset) % self.columns)
+                    for row in rows
+                    for offset in range(columns)
+                ]
+            return [stations[name] for cell in cells for name in grid.get(cell, ())]
+
+    def __cell(self, latitude: float, longitude: float):
+        row = int((latitude + 90) // self.cell_size)
+        column = int(((longitude + 180) % 360) // self.cell_size)
+        return row, column
+
+    def __move(self, record: StationRecord, cell: tuple):
+        if record.cell == cell:
+            return
+        if record.cell is not None:
+            self.__unlink(record)
+        self.__grid.setdefault(cell, set()).add(record.name)
+        record.cell = cell
+
+    def __unlink(self, record: StationRecord):
+        names = self.__grid.get(record.cell)
+        if names is not None:
+            names.discard(record.name)
+            if not names:
+                del self.__grid[record.cell]
+        record.cell = None
+
+    def __remove(self, record: StationRecord):
+        if record.cell is not None:
+            self.__unlink(record)
+        del self.__stations[record.name]
+
+    def __expire(self, now: float):
+        # The stations are kept in the order in which they have been heard,
+        # meaning that only the front of the list needs to be checked
+        stations = self.__stations
+        expired_at = now - self.ttl
+        while stations:
+            record = next(iter(stations.values()))
+            if record.heard_at > expired_at:
+                break
+            self.__remove(record)
+            self.expired += 1
+
+    @staticmethod
+    def __check_position(latitude: float, longitude: float):
+        if not -90 <= latitude <= 90:
+            raise ValueError(f"Invalid latitude {latitude}")
+        if not -180 <= longitude <= 180:
+            raise ValueError(f"Invalid longitude {longitude}")
@@ -0,0 +1,32 @@
+#
+# Helper library for the example robots: Robot Framework runs its keywords
+# one after the other, meaning that thread-safety can only be tested by
+# calling the library's methods from several threads at once
+#
+# https://www.github.com/joergschultzelutter/robotframework/aprslib
+#
+
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+from robot.libraries.BuiltIn import BuiltIn
+
+
+def call_library_method_concurrently(
+    library: str, method: str, threads: int = 4, calls_per_thread: int = 100
+):
+    """
+    Calls 'method' of the library instance 'library' 'calls_per_thread'
+    times from each of 'threads' threads and returns all results
+    """
+    function = getattr(BuiltIn().get_library_instance(library), method)
+    # All threads start calling at the same time
+    barrier = threading.Barrier(threads)
+
+    def call():
+        barrier.wait()
+        return [function() for _ in range(calls_per_thread)]
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        futures = [executor.submit(call) for _ in range(threads)]
+        return [result for future in futures for result in future.result()]
@@ -0,0 +1,26 @@
+#
+# Helper library for the example robots: lets a single socket write of an
+# APRS-IS connection fail, e.g. for checking what is sent again after the
+# library has reconnected
+#
+# https://www.github.com/joergschultzelutter/robotframework/aprslib
+#
+
+
+def fail_next_aprsis_write(ais: object, successful_writes: int = 0):
+    """
+    Lets the write of the 'aprslib.IS' object 'ais' which follows the next
+    'successful_writes' writes fail once. The connection itself stays open
+    """
+    sendall = ais.sendall
+    writes = 0
+
+    def failing_sendall(line):
+        nonlocal writes
+        writes += 1
+        if writes == successful_writes + 1:
+            del ais.sendall
+            raise ConnectionError("Simulated APRS-IS write error")
+        return sendall(line)
+
+    ais.sendall = failing_sendall